@@ -0,0 +1,17 @@
+"""Realtime ECG acquisition from PC80B-BLE"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .api import Samples, Status, stream
+
+__all__ = ["Samples", "Status", "stream"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported on first use, so that running the tools of the package as
+    # modules (python -m pc80b_bleak.syn) does not import them twice.
+    if name in __all__:
+        return getattr(import_module(".api", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,6 +4,7 @@ from getopt import getopt  # pylint: disable=deprecated-module
 from sys import argv
 
 # pylint: disable=relative-beyond-top-level  # Why is it complaining?...
+from .cfg import Params
 from .gui import App
 
 
@@ -12,8 +13,12 @@ def main() -> None:
     This is silly, but to use pyproject's "scripts", entry point has to be
     a function. So there.
     """
-    topts, args = getopt(argv[1:], "vt")
+    topts, args = getopt(argv[1:], "vtaxkg:e:r:s:b:o:p:m:l:S:")
     opts = dict(topts)
+    try:
+        Params.from_opts(opts)  # Report bad values before the GUI starts
+    except ValueError as err:
+        raise SystemExit(f"{argv[0]}: {err}") from err
     app = App(*args, **opts)
     try:
         app.run()
@@ -0,0 +1,170 @@
+"""Alerts raised by conditions in the received data"""
+
+from collections import deque
+from sys import stderr
+from threading import Lock
+from time import monotonic_ns
+from typing import Callable, Deque, Dict, List, NamedTuple, Tuple
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("GLib", "2.0")
+# pylint: disable=wrong-import-position
+from gi.repository import GLib  # type: ignore [import-untyped]
+
+from .cfg import VALS_PER_SEC
+
+# pylint: disable=missing-function-docstring
+
+LEADOFF_SECS = 5
+NODATA_SECS = 5
+HR_RANGE = (40, 150)
+HR_SECS = 10  # Heart rate out of range for so long is an alert
+LOW_BATTERY = 0  # Level reported in the heartbeat, 0 to 3
+CRC_BURST = 5  # This many checksum errors
+CRC_SECS = 10  # within this many seconds is an alert
+
+
+class Alert(NamedTuple):
+    """Condition that was raised, or cleared"""
+
+    name: str
+    message: str
+    active: bool
+
+
+class Alerts:  # pylint: disable=too-many-instance-attributes
+    """
+    Rules evaluated on the events as they come, each at a fixed cost.
+    Conditions of the signal that must last for some time remember the
+    sample when they started, so that their duration is that of the
+    signal, however late or bunched up the packets are processed.
+    Checksum errors are timed when their frames were received. Absence
+    of data is detected by a watchdog timer that is armed by the data,
+    fires at most once per NODATA_SECS, and re-arms itself for the
+    remaining time if data came in the meanwhile.
+    Changes go to the log and to the subscribed callbacks, and active
+    alerts are shown on the picture.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        leadoff_secs: int = LEADOFF_SECS,
+        nodata_secs: int = NODATA_SECS,
+        hr_range: Tuple[int, int] = HR_RANGE,
+        hr_secs: int = HR_SECS,
+        low_battery: int = LOW_BATTERY,
+        crc_burst: int = CRC_BURST,
+        crc_secs: int = CRC_SECS,
+    ) -> None:
+        self.leadoff_len = leadoff_secs * VALS_PER_SEC  # Samples
+        self.nodata_ns = nodata_secs * 1_000_000_000
+        self.hr_range = hr_range
+        self.hr_len = hr_secs * VALS_PER_SEC
+        self.low_battery = low_battery
+        self.crc_ns = crc_secs * 1_000_000_000
+        self.crcs: Deque[int] = deque(maxlen=crc_burst)
+        self.since: Dict[str, int] = {}  # Sample where conditions began
+        self.active: Dict[str, str] = {}  # Replaced, not modified
+        self.callbacks: List[Callable[[Alert], None]] = []
+        self.lock = Lock()  # Events and the watchdog come in two threads
+        self.last_data = 0
+        self.watchdog = 0
+
+    def subscribe(self, callback: Callable[[Alert], None]) -> None:
+        self.callbacks.append(callback)
+
+    def messages(self) -> Tuple[str, ...]:
+        return tuple(self.active.values())
+
+    def set(self, name: str, message: str) -> None:
+        with self.lock:
+            if name in self.active:
+                return
+            self.active = {**self.active, name: message}
+        print("ALERT", message, file=stderr)
+        for callback in self.callbacks:
+            callback(Alert(name, message, True))
+
+    def clear(self, name: str) -> None:
+        with self.lock:
+            if name not in self.active:
+                return
+            active = self.active.copy()
+            message = active.pop(name)
+            self.active = active
+        print("ALERT CLEARED", message, file=stderr)
+        for callback in self.callbacks:
+            callback(Alert(name, message, False))
+
+    def lasting(
+        self, name: str, cond: bool, now: int, limit: int, message: str
+    ) -> None:
+        if not cond:
+            self.since.pop(name, None)
+            self.clear(name)
+        elif now - self.since.setdefault(name, now) >= limit:
+            self.set(name, message)
+
+    def data(self, leadoff: bool, hr: int, nsamp: int, rxtime: int) -> None:
+        """
+        Evaluate on a data packet, that ends with sample number nsamp of
+        the acquisition and was received at rxtime (monotonic_ns())
+        """
+        self.last_data = monotonic_ns()
+        self.clear("nodata")
+        with self.lock:
+            if not self.watchdog:
+                self.watchdog = GLib.timeout_add(
+                    self.nodata_ns // 1_000_000, self.check_nodata
+                )
+        self.lasting("leadoff", leadoff, nsamp, self.leadoff_len, "Lead off")
+        lo, hi = self.hr_range
+        self.lasting(
+            "hr",
+            bool(hr) and not lo <= hr <= hi,
+            nsamp,
+            self.hr_len,
+            f"Heart rate {hr}",
+        )
+        if self.crcs and rxtime - self.crcs[-1] > self.crc_ns:
+            self.crcs.clear()
+            self.clear("crc")
+
+    def battery(self, level: int) -> None:
+        """Evaluate on a heartbeat"""
+        if level <= self.low_battery:
+            self.set("battery", "Low battery")
+        else:
+            self.clear("battery")
+
+    def crc_error(self, rxtime: int) -> None:
+        self.crcs.append(rxtime)
+        if len(self.crcs) == self.crcs.maxlen and (
+            rxtime - self.crcs[0] <= self.crc_ns
+        ):
+            self.set("crc", "Checksum errors")
+
+    def check_nodata(self) -> bool:
+        idle = monotonic_ns() - self.last_data
+        with self.lock:
+            self.watchdog = 0
+            if idle < self.nodata_ns:
+                self.watchdog = GLib.timeout_add(
+                    (self.nodata_ns - idle) // 1_000_000 + 1,
+                    self.check_nodata,
+                )
+        if idle >= self.nodata_ns:
+            self.set("nodata", "No data")
+        return False  # Re-armed explicitly
+
+    def idle(self) -> None:
+        """Acquisition is over, conditions of the data do not apply"""
+        with self.lock:
+            if self.watchdog:
+                GLib.source_remove(self.watchdog)
+                self.watchdog = 0
+        self.since.clear()
+        for name in ("nodata", "leadoff", "hr"):
+            self.clear(name)
@@ -0,0 +1,175 @@
+"""Asynchronous interface for using the receiver as a library"""
+
+from __future__ import annotations
+from asyncio import CancelledError, Event as AEvent, Task, create_task
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    List,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+import numpy as np
+import numpy.typing as npt
+
+from .ble import BleSrc
+from .cfg import VALS_PER_SEC
+from .datatypes import Event, EventPc80bContData, EventPc80bFastData
+from .tst import TestSrc
+
+# pylint: disable=missing-function-docstring
+
+MAXSAMPLES = 60 * VALS_PER_SEC  # Undelivered samples kept for a slow reader
+
+
+class Status(NamedTuple):
+    """Change of the state of acquisition"""
+
+    receiving: bool
+    details: str
+
+
+class Samples(NamedTuple):
+    """Block of consecutive samples, from one or more data packets"""
+
+    vals: npt.NDArray[np.float64]  # mV
+    first: int  # Number of the first sample since the start of the stream
+    leadoff: bool  # In any of the packets
+    hr: int  # As reported in the last packet
+    rxtime: int  # monotonic_ns() when the last packet was received
+
+
+Item = Union[Status, Samples, Event]
+Packet = Union[EventPc80bContData, EventPc80bFastData]
+
+
+class Feed:
+    """
+    Consumer that the source reports to, from the same event loop. It
+    never blocks the source: consecutive data packets are merged into
+    one block while the reader is busy, so a slow reader gets fewer,
+    bigger blocks. Beyond `maxsamples` undelivered samples the oldest
+    are dropped, and the gap is visible in `Samples.first`.
+    """
+
+    def __init__(self, maxsamples: int = MAXSAMPLES) -> None:
+        self.maxsamples = maxsamples
+        self.items: Deque[Union[Status, Event, List[Packet]]] = deque()
+        self.pending = 0  # Samples in the queued items
+        self.nsamp = 0  # Samples reported since the start
+        self.dropped = 0
+        self.ready = AEvent()
+        self.finished = False  # The source will report nothing more
+
+    def report_status(self, receiving: bool, details: str) -> None:
+        self.items.append(Status(receiving, details))
+        self.ready.set()
+
+    def report_data(self, event: Event) -> None:
+        if isinstance(event, (EventPc80bContData, EventPc80bFastData)):
+            if not event.ecgFloats:
+                return
+            if self.items and isinstance(self.items[-1], list):
+                self.items[-1].append(event)
+            else:
+                self.items.append([event])
+            self.pending += len(event.ecgFloats)
+            self.nsamp += len(event.ecgFloats)
+            self.trim()
+        else:
+            self.items.append(event)
+        self.ready.set()
+
+    def finish(self, _task: Optional[Task[Any]] = None) -> None:
+        """Wake the reader up for good, the source has ended"""
+        self.finished = True
+        self.ready.set()
+
+    def trim(self) -> None:
+        """Drop the oldest data packets while over the limit"""
+        while self.pending > self.maxsamples:
+            block = next(i for i in self.items if isinstance(i, list))
+            event = block.pop(0)
+            if not block:
+                self.items.remove(block)
+            self.pending -= len(event.ecgFloats)
+            self.dropped += len(event.ecgFloats)
+
+    def samples(self, block: List[Packet]) -> Samples:
+        vals = np.array(
+            [v for ev in block for v in ev.ecgFloats], dtype=np.float64
+        )
+        self.pending -= len(vals)
+        return Samples(
+            vals=vals,
+            first=self.nsamp - self.pending - len(vals),
+            leadoff=any(ev.leadoff for ev in block),
+            hr=block[-1].hr,
+            rxtime=block[-1].rxtime,
+        )
+
+    async def get(self, batch: int = 0) -> Optional[Item]:
+        """
+        Next item. Data is held back until there are at least `batch`
+        samples, or something else comes after it, or the source ends.
+        None when the source has ended and everything was delivered.
+        """
+        while not self.finished and (
+            not self.items
+            or (
+                len(self.items) == 1
+                and isinstance(self.items[0], list)
+                and self.pending < batch
+            )
+        ):
+            self.ready.clear()
+            await self.ready.wait()
+        if not self.items:
+            return None
+        item = self.items.popleft()
+        if isinstance(item, list):
+            return self.samples(item)
+        return item
+
+
+async def stream(
+    device: Optional[str] = None,
+    *,
+    test: bool = False,
+    batch: int = 0,
+    maxsamples: int = MAXSAMPLES,
+) -> AsyncIterator[Item]:
+    """
+    Acquire from a PC80B-BLE in the running event loop, without threads
+    and without GTK:
+
+        async for item in stream():
+            if isinstance(item, Samples): ...
+
+    `device` is the address or the name of the device to connect to,
+    by default the first one named "PC80B-BLE". With `test`, the test
+    signal is produced instead. Blocks of samples are `Samples`, changes
+    of the state are `Status`, other events from the device (heartbeat,
+    time, checksum errors) are passed as they are. Acquisition stops
+    when the iteration does. If acquisition fails, the iteration raises
+    its exception once everything received before has been delivered.
+    """
+    feed = Feed(maxsamples)
+    src = TestSrc(feed) if test else BleSrc(feed, device=device)
+    task = create_task(src.acquire())
+    task.add_done_callback(feed.finish)
+    try:
+        while (item := await feed.get(batch)) is not None:
+            yield item
+        task.result()  # Raise what ended the source, if anything
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except CancelledError:
+                pass
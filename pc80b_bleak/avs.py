@@ -0,0 +1,88 @@
+"""Audio delay following the measured latency of the video path"""
+
+from typing import Any, Callable, Dict
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("Gst", "1.0")
+# pylint: disable=wrong-import-position
+from gi.repository import GLib, Gst  # type: ignore [import-untyped]
+
+from .prb import LatencyTracer
+
+# pylint: disable=missing-function-docstring
+
+INITIAL = 800_000_000  # ns, audio delay until there are measurements
+PERIOD = 1  # Seconds between adjustments
+STEP = 20_000_000  # ns, largest single adjustment, not audible as a skip
+DEADBAND = 10_000_000  # ns, do not chase the jitter
+SMOOTH = 0.25  # Weight of the latest measurement in the estimate
+# Stages of the video path, measured from capture, reported alongside
+STAGES = ("render", "videoconvert", "x264enc", "sink")
+
+
+class AvSync:  # pylint: disable=too-many-instance-attributes
+    """
+    Keep the offset of the audio pad equal to the lag of the picture.
+    A frame is timestamped ahead of the capture of its newest sample
+    (by the render time and its position in the packet). That lead,
+    smoothed, is followed by the audio offset in steps of at most STEP,
+    so that lip sync holds when the load changes. Only the lead is
+    followed, on purpose: time spent in the queue, converter and
+    encoder delays the buffer but not its PTS, and the muxer interleaves
+    by PTS, so it does not shift the picture against the sound. Those
+    stage latencies are reported in the stats next to the lead, to show
+    where the time goes, but they do not move the audio offset.
+    """
+
+    def __init__(
+        self,
+        tracer: LatencyTracer,
+        pad: Gst.Pad,
+        on_change: Callable[[int], None],
+    ) -> None:
+        self.tracer = tracer
+        self.pad = pad
+        self.on_change = on_change
+        self.delay = INITIAL
+        self.estimate = 0.0
+        self.lead = 0.0
+        self.stages: Dict[str, float] = {}  # Mean latency from capture
+        self.adjustments = 0
+        pad.set_offset(self.delay)
+        GLib.timeout_add_seconds(PERIOD, self.adjust)
+
+    def adjust(self) -> bool:
+        for stage in STAGES:
+            if (hist := self.tracer.window(stage)).count:
+                self.stages[stage] = hist.mean
+        lead = self.tracer.window("timestamp")
+        if not lead.count:
+            return True  # Not receiving
+        self.lead = lead.mean
+        measured = self.lead
+        if self.estimate:
+            self.estimate += SMOOTH * (measured - self.estimate)
+        else:
+            self.estimate = measured
+        diff = self.estimate - self.delay
+        if abs(diff) > DEADBAND:
+            self.delay += int(max(-STEP, min(STEP, diff)))
+            self.adjustments += 1
+            # Offset is applied to running time of the buffers that
+            # follow, no need to stop or relink anything.
+            self.pad.set_offset(self.delay)
+            self.on_change(self.delay // 1_000_000)
+        return True  # Keep the timer running
+
+    def stats(self) -> Dict[str, Any]:
+        """Current calibration, in milliseconds"""
+        return {
+            "delay": self.delay / 1e6,
+            "estimate": self.estimate / 1e6,
+            "follows": "timestamp lead",
+            "lead": self.lead / 1e6,
+            # Not followed, see the class docstring
+            "stages": {k: v / 1e6 for k, v in self.stages.items()},
+            "adjustments": self.adjustments,
+        }
@@ -5,23 +5,23 @@ import asyncio
 from asyncio.exceptions import CancelledError
 from sys import stderr
 from struct import pack, unpack
-from time import time
-from typing import Any, Optional, TYPE_CHECKING
+from time import monotonic_ns, time
+from typing import Optional
 
 from bleak import BleakScanner, BleakClient
+from bleak.backends.device import BLEDevice
 from bleak.backends.characteristic import BleakGATTCharacteristic
 from crcmod import predefined  # type: ignore [import-untyped]
 
+from .bus import Consumer
 from .datatypes import (
     mkEv,
+    EventCrcError,
     EventPc80bContData,
     EventPc80bFastData,
     EventPc80bTransmode,
 )
 
-if TYPE_CHECKING:
-    from .sgn import Signal
-
 # pylint: disable=missing-function-docstring
 
 DELAY = 3
@@ -40,7 +40,7 @@ verbose = False
 class Receiver:  # pylint: disable=too-few-public-methods
     """Container for BLE receive async function"""
 
-    def __init__(self, client: BleakClient, signal: Signal) -> None:
+    def __init__(self, client: BleakClient, signal: Consumer) -> None:
         self.length = 0
         self.buffer = b""
         self.clientref = client
@@ -49,6 +49,7 @@ class Receiver:  # pylint: disable=too-few-public-methods
         self.standby = True
 
     async def receive(self, _ch: BleakGATTCharacteristic, val: bytes) -> None:
+        rxtime = monotonic_ns()
         self.buffer += val
         while len(self.buffer) > self.length:
             if len(self.buffer) < 3:
@@ -65,10 +66,12 @@ class Receiver:  # pylint: disable=too-few-public-methods
             crc = int.from_bytes(frame[-1:])
             if crc != crc8(data):
                 print("CRC MISMATCH", data.hex(), crc, file=stderr)
+                self.signal.report_data(EventCrcError(None, rxtime=rxtime))
             st, evt = unpack("BB", data[:2])
             if st != 0xA5:
                 print("BAD START", data.hex(), file=stderr)
             ev = mkEv(evt, data[3:])
+            ev.rxtime = rxtime
             if isinstance(ev, (EventPc80bContData, EventPc80bFastData)):
                 if ev.fin:
                     self.standby = True
@@ -111,19 +114,23 @@ class Receiver:  # pylint: disable=too-few-public-methods
 
 
 class BleSrc:
-    """Wrapper for cancellable async task"""
+    """BLE acquisition, run as a cancellable async task"""
 
-    def __init__(self, signal: Signal) -> None:
+    def __init__(self, signal: Consumer, device: Optional[str] = None) -> None:
         self.signal = signal
-        self.task: Optional[asyncio.Task[Any]] = None
+        self.device = device  # Address or name, None for any PC80B-BLE
         self.disconnect = asyncio.Event()
 
     def on_disconnect(self, client: BleakClient) -> None:
         print("Disconnect callback", client)
         self.disconnect.set()
 
-    async def _task(self) -> None:
-        self.task = asyncio.current_task()
+    def matches(self, dev: BLEDevice) -> bool:
+        if self.device is None:
+            return dev.name == "PC80B-BLE"
+        return self.device in (dev.name, dev.address)
+
+    async def acquire(self) -> None:
         try:
             while True:
                 self.signal.report_status(False, "Scanning")
@@ -135,7 +142,7 @@ class BleSrc:
                     )
                     async for dev, _data in bscanner.advertisement_data():
                         # print(dev, "\n", _data, "\n", file=stderr)
-                        if dev.name == "PC80B-BLE":
+                        if self.matches(dev):
                             # if PC80B_SRV in data.service_uuids:
                             break
                 self.signal.report_status(False, f"Found {dev}")
@@ -212,19 +219,4 @@ class BleSrc:
                     print("Timeout connecting, retry", file=stderr)
         except CancelledError:
             print("Async task got cancelled", file=stderr)
-            self.task = None
         self.signal.report_status(False, "Acquisition stopped")
-
-    # pylint: disable=duplicate-code
-
-    def run(self) -> None:
-        if self.task is None:
-            asyncio.run(self._task())
-        else:
-            print("Async task already running")
-
-    def stop(self) -> None:
-        if self.task is not None:
-            self.task.cancel()
-        else:
-            print("Trying to cancel non-running task")
@@ -0,0 +1,49 @@
+"""Benchmark rendering cost at different output geometries and rates"""
+
+from sys import argv
+from time import process_time_ns
+from cairo import (  # pylint: disable=no-name-in-module
+    Context,
+    ImageSurface,
+    FORMAT_ARGB32,
+)
+
+from .cfg import Params, SIZES, VALS_PER_SEC, parse_size
+from .drw import Drw, FrameMeta
+from .syn import Ecg
+
+# pylint: disable=missing-function-docstring
+
+NFRAMES = 300
+
+
+def render_cost(params: Params, nframes: int = NFRAMES) -> float:
+    """CPU time to render one frame, in milliseconds"""
+    drw = Drw(params)
+    data, _ = Ecg().take(params.vals_on_screen)
+    fmeta = FrameMeta(leadoff=False)
+    image = ImageSurface(FORMAT_ARGB32, params.crt_w, params.crt_h)
+    c = Context(image)
+    start = process_time_ns()
+    for i in range(nframes):
+        drw.drawcurve(c, fmeta, data, i * VALS_PER_SEC // params.fps)
+    image.flush()
+    return (process_time_ns() - start) / nframes / 1e6
+
+
+def main() -> None:
+    """
+    Print table of rendering cost, the part of per-frame work that
+    happens in Python. Converter and encoder cost per frame is reported
+    by Pipe.stats() when the application exits.
+    """
+    print(f"{'geometry':>10} {'fps':>4} {'ms/frame':>9} {'% of core':>10}")
+    for name in argv[1:] or SIZES:
+        crt_w, crt_h = parse_size(name)
+        for fps in (30, 60):
+            ms = render_cost(Params(crt_w=crt_w, crt_h=crt_h, fps=fps))
+            print(f"{name:>10} {fps:>4} {ms:>9.2f} {ms * fps / 10:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Distribution of events from the sources to several consumers"""
+
+from __future__ import annotations
+from collections import deque
+from enum import Enum
+from threading import Condition, Thread
+from time import monotonic_ns
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+)
+
+from .datatypes import Event, EventPc80bHeartbeat
+
+# pylint: disable=missing-function-docstring
+
+MAXSIZE = 64  # Queued items per subscriber, ~10 seconds of data packets
+
+
+class Consumer(Protocol):
+    """What sources report to, and what subscribers implement"""
+
+    def report_status(self, receiving: bool, details: str) -> None: ...
+
+    def report_data(self, event: Event) -> None: ...
+
+
+class Subscriber(Consumer, Protocol):
+    """Consumer that is told where its queue dropped events"""
+
+    def report_gap(self, dropped: int) -> None: ...
+
+
+class Overflow(Enum):
+    """What to do when the queue of a subscriber is full"""
+
+    drop_oldest = 0  # Slow consumer skips ahead to the recent events
+    drop_newest = 1  # Slow consumer sees everything up to a gap
+
+
+# Kinds of queued items, and what comes with them
+STATUS = 0  # (receiving, details)
+DATA = 1  # event
+GAP = 2  # [number of data events dropped here]
+TICK = 3  # event that only tells the device is there, dropped silently
+
+# Time queued, kind, what
+Item = Tuple[int, int, Any]
+
+
+class Subscription(Thread):  # pylint: disable=too-many-instance-attributes
+    """Queue of events for one consumer, and the thread that delivers them"""
+
+    def __init__(
+        self,
+        name: str,
+        consumer: Subscriber,
+        maxsize: int,
+        overflow: Overflow,
+    ) -> None:
+        super().__init__(name=f"bus-{name}", daemon=True)
+        self.consumer = consumer
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queue: Deque[Item] = deque()
+        self.cond = Condition()
+        self.closed = False
+        self.busy = False  # Delivering an item
+        self.delivered = 0
+        self.dropped = 0
+        self.maxdepth = 0
+        self.lag = 0  # ns the last delivered item spent in the queue
+        self.maxlag = 0
+
+    def gap(self, i: int) -> None:
+        """Mark dropped data event at position i of the queue"""
+        for j in (i - 1, i):
+            if 0 <= j < len(self.queue) and self.queue[j][1] == GAP:
+                self.queue[j][2][0] += 1
+                return
+        gap: List[int] = [1]
+        self.queue.insert(i, (monotonic_ns(), GAP, gap))
+
+    def shed(self) -> bool:
+        """
+        Drop one item to make room, heartbeats first, then data, from
+        the end that the overflow policy gives up. False if only status
+        changes and gaps are left.
+        """
+        order = range(len(self.queue))
+        if self.overflow is Overflow.drop_newest:
+            order = order[::-1]
+        for kind in (TICK, DATA):
+            for i in order:
+                if self.queue[i][1] == kind:
+                    del self.queue[i]
+                    if kind == DATA:
+                        self.dropped += 1
+                        self.gap(i)
+                    return True
+        return False
+
+    def put(self, item: Item) -> None:
+        """
+        Never blocks the source. Every item, gap markers included, takes
+        a place in the queue, so it holds at most maxsize of them, unless
+        it is all status changes: these are never dropped. Where data was
+        dropped, the consumer is told with report_gap().
+        """
+        with self.cond:
+            if (
+                len(self.queue) >= self.maxsize
+                and self.overflow is Overflow.drop_newest
+            ):
+                if item[1] == TICK:
+                    return
+                # Data dropped here, unless a heartbeat can make room
+                if item[1] == DATA and all(i[1] != TICK for i in self.queue):
+                    self.dropped += 1
+                    if self.queue and self.queue[-1][1] == GAP:
+                        self.queue[-1][2][0] += 1
+                        return
+                    gap: List[int] = [1]
+                    item = (monotonic_ns(), GAP, gap)
+            while (
+                len(self.queue) >= self.maxsize
+                and not (item[1] == GAP and self.queue[-1][1] == GAP)
+                and self.shed()
+            ):
+                pass
+            if item[1] == GAP and self.queue[-1][1] == GAP:
+                self.queue[-1][2][0] += 1  # Shedding left one at the end
+                return
+            self.queue.append(item)
+            self.maxdepth = max(self.maxdepth, len(self.queue))
+            self.cond.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if not self.queue:
+                    return  # Closed and drained
+                queued, kind, what = self.queue.popleft()
+                self.busy = True
+            self.lag = monotonic_ns() - queued
+            self.maxlag = max(self.maxlag, self.lag)
+            if kind in (DATA, TICK):
+                self.consumer.report_data(what)
+            elif kind == STATUS:
+                self.consumer.report_status(*what)
+            else:
+                self.consumer.report_gap(what[0])
+            self.delivered += 1
+
+    def flush(self) -> None:
+        """Discard queued items, and wait for the one being delivered"""
+        with self.cond:
+            self.queue.clear()
+            while self.busy:
+                self.cond.wait()
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            depth = len(self.queue)
+            oldest = monotonic_ns() - self.queue[0][0] if depth else 0
+        return {
+            "depth": depth,
+            "maxdepth": self.maxdepth,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            # Lag of the consumer: how long the oldest undelivered event
+            # has been waiting, or the wait of the last delivered one.
+            "lag_ms": max(oldest, self.lag) / 1e6,
+            "maxlag_ms": self.maxlag / 1e6,
+        }
+
+
+class Inline:
+    """
+    Subscription without a queue: the consumer is called by the source,
+    in its thread. For a source that runs in the thread of the consumer
+    anyway, i.e. in the GLib main loop.
+    """
+
+    def __init__(self, consumer: Subscriber) -> None:
+        self.consumer = consumer
+        self.delivered = 0
+
+    def start(self) -> None:
+        pass
+
+    def put(self, item: Item) -> None:
+        _, kind, what = item
+        if kind in (DATA, TICK):
+            self.consumer.report_data(what)
+        else:
+            self.consumer.report_status(*what)
+        self.delivered += 1
+
+    def flush(self) -> None:
+        pass  # Nothing is ever pending
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inline": True, "delivered": self.delivered}
+
+
+class Bus:
+    """
+    Takes reports from a source, the same way that Signal used to, and
+    queues them to each of the subscribers. Every subscriber has its own
+    bounded queue and thread, so a slow one (e.g. writing to disk) does
+    not hold back the source or the others. Subscriptions are replaced,
+    not modified, so that the source thread can iterate them.
+    """
+
+    def __init__(self) -> None:
+        self.subs: Dict[str, Union[Subscription, Inline]] = {}
+
+    def subscribe(
+        self,
+        name: str,
+        consumer: Subscriber,
+        *,
+        maxsize: int = MAXSIZE,
+        overflow: Overflow = Overflow.drop_oldest,
+        inline: bool = False,
+    ) -> None:
+        self.unsubscribe(name)
+        sub: Union[Subscription, Inline] = (
+            Inline(consumer)
+            if inline
+            else Subscription(name, consumer, maxsize, overflow)
+        )
+        sub.start()
+        self.subs = {**self.subs, name: sub}
+
+    def unsubscribe(self, name: str) -> None:
+        subs = self.subs.copy()
+        sub: Optional[Union[Subscription, Inline]] = subs.pop(name, None)
+        self.subs = subs
+        if sub is not None:
+            sub.close()
+
+    def flush(self, name: str) -> None:
+        """
+        Forget what the subscriber has not got yet, and return when it is
+        not handling an event. Called when the source is stopped, so that
+        nothing of the old session reaches the subscriber after that.
+        """
+        if (sub := self.subs.get(name)) is not None:
+            sub.flush()
+
+    def close(self) -> None:
+        for name in self.subs:
+            self.unsubscribe(name)
+
+    def report_status(self, receiving: bool, details: str) -> None:
+        item = (monotonic_ns(), STATUS, (receiving, details))
+        for sub in self.subs.values():
+            sub.put(item)
+
+    def report_data(self, event: Event) -> None:
+        kind = TICK if isinstance(event, EventPc80bHeartbeat) else DATA
+        item = (monotonic_ns(), kind, event)
+        for sub in self.subs.values():
+            sub.put(item)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: sub.stats() for name, sub in self.subs.items()}
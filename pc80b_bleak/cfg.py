@@ -0,0 +1,146 @@
+"""Runtime parameters of the video output"""
+
+from typing import Any, Dict, NamedTuple, Tuple
+
+# pylint: disable=missing-function-docstring
+
+VALS_PER_SEC = 150  # Sampling rate of the device, not configurable
+PACKET = 25  # Samples in one data packet from the device
+
+SIZES = {
+    "480p": (720, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+# Encoder profiles, in the order of stepping down when the encoder does
+# not keep up. "auto" starts in the middle and steps down as needed.
+ENCODER_PROFILES = ("quality", "balanced", "low-cpu")
+
+
+def parse_size(spec: str) -> Tuple[int, int]:
+    """Parse geometry like "1280x720" or a short name like "720p" """
+    if spec in SIZES:
+        return SIZES[spec]
+    w, _, h = spec.partition("x")
+    return int(w), int(h)
+
+
+class Stress(NamedTuple):
+    """Load produced by the test source, real time by default"""
+
+    rate: float = 1.0  # Multiple of real time
+    packet: int = PACKET  # Samples per packet
+    devices: int = 1  # Emulated devices sending in parallel
+
+
+def parse_stress(spec: str) -> Stress:
+    """Parse "RATE[,PACKET[,DEVICES]]" like "4" or "10,50,3" """
+    rate, packet, devices = (spec.split(",") + ["", ""])[:3]
+    stress = Stress(float(rate), int(packet or PACKET), int(devices or 1))
+    if stress.rate <= 0 or stress.packet < 1 or stress.devices < 1:
+        raise ValueError(
+            f"stress {spec!r}: rate must be positive,"
+            " packet and devices at least 1"
+        )
+    return stress
+
+
+class Params(NamedTuple):
+    """Geometry, rate and encoding of the video"""
+
+    crt_w: int = 720
+    crt_h: int = 480
+    fps: int = 30
+    secs_on_screen: int = 3
+    enc_w: int = 0  # Encoded geometry, zero for same as rendered
+    enc_h: int = 0
+    latency: int = 500  # Budget for video in flight, milliseconds
+    profile: str = "balanced"  # Encoder profile, or "auto"
+    mains: int = 50  # Hz, frequency to notch out, zero for none
+    lowpass: float = 0.0  # Hz, cutoff of the low-pass filter, zero for none
+    autorange: bool = False  # Vertical scale follows the amplitude
+    process: bool = False  # Acquire in a child process
+    stress: Stress = Stress()  # Load of the test source
+    skip: bool = False  # Broadcast resumes from the latest keyframe
+
+    @classmethod
+    def from_opts(cls, opts: Dict[str, str]) -> "Params":
+        """
+        Build from command line options: -g WxH rendered geometry,
+        -e WxH encoded geometry, -r frames per second, -s seconds of
+        trace on screen, -b latency budget in milliseconds, -p encoder
+        profile: low-cpu, balanced, quality or auto, -m mains frequency,
+        -l low-pass cutoff frequency, -a automatic vertical scale,
+        -x acquisition in a separate process, -S RATE[,PACKET[,DEVICES]]
+        stress load of the test source, -k broadcast skips what was not
+        sent during an outage.
+        """
+        kwargs: Dict[str, Any] = {}
+        if "-g" in opts:
+            kwargs["crt_w"], kwargs["crt_h"] = parse_size(opts["-g"])
+        if "-e" in opts:
+            kwargs["enc_w"], kwargs["enc_h"] = parse_size(opts["-e"])
+        if "-r" in opts:
+            kwargs["fps"] = int(opts["-r"])
+        if "-s" in opts:
+            kwargs["secs_on_screen"] = int(opts["-s"])
+        if "-b" in opts:
+            kwargs["latency"] = int(opts["-b"])
+        if "-p" in opts:
+            if opts["-p"] not in ENCODER_PROFILES + ("auto",):
+                raise ValueError(
+                    f"encoder profile {opts['-p']!r}: must be one of"
+                    f" {', '.join(ENCODER_PROFILES)} or auto"
+                )
+            kwargs["profile"] = opts["-p"]
+        if "-m" in opts:
+            kwargs["mains"] = int(opts["-m"])
+        for flag, name in (
+            ("-a", "autorange"),
+            ("-x", "process"),
+            ("-k", "skip"),
+        ):
+            if flag in opts:
+                kwargs[name] = True
+        if "-S" in opts:
+            kwargs["stress"] = parse_stress(opts["-S"])
+        if "-l" in opts:
+            kwargs["lowpass"] = float(opts["-l"])
+        return cls(**kwargs)
+
+    @property
+    def scaled(self) -> bool:
+        return bool(self.enc_w and self.enc_h) and (
+            (self.enc_w, self.enc_h) != (self.crt_w, self.crt_h)
+        )
+
+    @property
+    def enc_size(self) -> Tuple[int, int]:
+        if self.scaled:
+            return self.enc_w, self.enc_h
+        return self.crt_w, self.crt_h
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.crt_w * self.crt_h * 4  # for FORMAT_ARGB32
+
+    @property
+    def vals_on_screen(self) -> int:
+        return VALS_PER_SEC * self.secs_on_screen
+
+    @property
+    def framedur(self) -> int:
+        return 1_000_000_000 // self.fps
+
+    @property
+    def sampdur(self) -> int:
+        return 1_000_000_000 // VALS_PER_SEC
+
+    def frames_until(self, nsamp: int) -> int:
+        """Number of whole frames covering the first nsamp samples"""
+        return nsamp * self.fps // VALS_PER_SEC
+
+    def samples_until(self, nframes: int) -> int:
+        """Number of samples needed to complete first nframes frames"""
+        return -(-nframes * VALS_PER_SEC // self.fps)
@@ -34,6 +34,8 @@ class MStage(Enum):
 class Event:
     ev: ClassVar[int]
     data: Optional[bytes] = None
+    rxtime: int = 0  # time.monotonic_ns() when received, for latency trace
+    device: int = 0  # Which of the emulated devices sent it, in stress test
 
     def __init__(self, data: Optional[bytes], **kwargs: Any) -> None:
         self.data = data
@@ -200,6 +202,12 @@ def mkEv(ev: int, data: bytes) -> Event:
     raise RuntimeError(f"EventPc80b???(0x{ev:02x}:{data.hex()} )")
 
 
+class EventCrcError(Event):
+    """Not from the device: a frame was received with bad checksum"""
+
+    ev = 0x00
+
+
 class TestData(Event):
     def __init__(self, ecgFloats: List[float]) -> None:
         super().__init__(b"")
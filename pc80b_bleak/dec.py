@@ -0,0 +1,47 @@
+"""Reduce the trace to at most two points per pixel column"""
+
+from typing import Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+# pylint: disable=missing-function-docstring
+
+
+class MinMax:
+    """
+    Envelope of the ring of samples, minimum and maximum per pixel
+    column. It is updated for the columns that received new samples.
+    Drawn as a zigzag between the extremes of successive columns, it
+    keeps every peak, however many samples share a column.
+    """
+
+    def __init__(self, nsamp: int, ncols: int) -> None:
+        self.col = np.arange(nsamp) * ncols // nsamp  # of every sample
+        self.starts = np.searchsorted(self.col, np.arange(ncols))
+        self.lo = np.zeros(ncols)
+        self.hi = np.zeros(ncols)
+
+    def update(
+        self, data: npt.NDArray[np.float64], start: int, end: int
+    ) -> Tuple[int, int]:
+        """
+        Recompute columns of samples from start to end (not wrapping),
+        return the range of columns. In the last column, samples after
+        the end are left from the previous sweep, and are not counted.
+        """
+        c0 = int(self.col[start])
+        c1 = int(self.col[end - 1]) + 1
+        seg = data[self.starts[c0] : end]
+        idx = self.starts[c0:c1] - self.starts[c0]
+        self.lo[c0:c1] = np.minimum.reduceat(seg, idx)
+        self.hi[c0:c1] = np.maximum.reduceat(seg, idx)
+        return c0, c1
+
+    def vertices(
+        self, c0: int, c1: int
+    ) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """Column numbers and values, two for every column"""
+        cols = np.repeat(np.arange(c0, c1, dtype=np.float64), 2)
+        vals = np.column_stack((self.hi[c0:c1], self.lo[c0:c1])).ravel()
+        return cols, vals
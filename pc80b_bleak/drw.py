@@ -4,19 +4,32 @@
 
 from __future__ import annotations
 from datetime import datetime, timezone
-from collections import deque
-from typing import Iterable, NamedTuple
+from typing import NamedTuple, Optional, Tuple
 from cairo import (
     # ColorMode,
     Context,
     ImageSurface,
-    # FORMAT_ARGB32,
+    FORMAT_ARGB32,
     FONT_SLANT_NORMAL,
     FONT_WEIGHT_BOLD,
     FONT_WEIGHT_NORMAL,
+    LINE_CAP_ROUND,
+    LINE_JOIN_ROUND,
+    OPERATOR_CLEAR,
+    OPERATOR_OVER,
 )
+import numpy as np
+import numpy.typing as npt
 
+from .cfg import Params, VALS_PER_SEC
 from .datatypes import Channel, MMode, MStage
+from .dec import MinMax
+from .hrv import Summary
+from .rng import DEFAULT
+
+HUD_H = 480  # Indicators are laid out for this height and scaled
+TRACE_W = 4  # Line width of the trace
+ERASE = 3 * TRACE_W  # Blank band ahead of the running edge, pixels
 
 
 class FrameMeta(NamedTuple):
@@ -32,74 +45,91 @@ class FrameMeta(NamedTuple):
     mmode: MMode = MMode.detecting
     mstage: MStage = MStage.detecting
     datatype: int = 0
+    beat: bool = False
+    hrv: Tuple[Summary, ...] = ()
+    alerts: Tuple[str, ...] = ()
 
 
-def drawtext(
-    c: Context[ImageSurface], x: int, y: int, text: str, fsize: int = 16
+def drawtext(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    c: Context[ImageSurface],
+    x: float,
+    y: float,
+    text: str,
+    fsize: int = 16,
+    color: Tuple[float, float, float] = (1.0, 1.0, 1.0),
 ) -> None:
     c.select_font_face("sans-serif", FONT_SLANT_NORMAL, FONT_WEIGHT_NORMAL)
     c.set_font_size(fsize)
     c.move_to(x, y)
-    c.set_source_rgb(1.0, 1.0, 1.0)
+    c.set_source_rgb(*color)
     c.show_text(text)
 
 
 class Drw:  # pylint: disable=too-many-instance-attributes
     """Drawer class with geometry of the display and drawing methods"""
 
-    def __init__(
-        self,
-        crt_w: int,
-        crt_h: int,
-        vals_on_screen: int,
-        vals_per_sec: int,
-    ) -> None:
-        self.crt_w = crt_w
-        self.crt_h = crt_h
-        self.vals_on_screen = vals_on_screen
+    def __init__(self, params: Params) -> None:
+        self.crt_w = params.crt_w
+        self.crt_h = params.crt_h
+        self.vals_on_screen = vals_on_screen = params.vals_on_screen
+        self.hudscale = self.crt_h / HUD_H
+        self.hud_w = self.crt_w / self.hudscale
+        self.lblsize = round(16 * self.hudscale)
         self.xscale = self.crt_w / self.vals_on_screen
         self.ymid = self.crt_h // 2
-        self.yscale = self.ymid / 2.5  # div by max y value - +/- 2.5 mV
+        self.range = DEFAULT  # mV from the middle to the edge
+        self.yscale = self.ymid / self.range
         # Big square width .2 sec, small square .04 sec
         # Big square hight .5 mV, small square .1 mV
-        self.xtick_step = (  # big square - 200 msec
-            self.crt_w // (vals_on_screen // vals_per_sec) // 5
+        self.xtick_step = max(  # big square - 200 msec
+            self.crt_w // (vals_on_screen // VALS_PER_SEC) // 5, 1
         )
         self.xtick_max = self.crt_w // self.xtick_step
-        self.ytick_step = self.ymid // 5  # big squate - .5 mV
+        self.ytick_step = self.ymid // 5  # big square - a fifth of range
         self.ytick_max = self.crt_h // self.ytick_step
+        # Screen column of every position in the ring of samples
+        self.xs: npt.NDArray[np.float64] = (
+            np.arange(vals_on_screen, dtype=np.float64) * self.xscale
+        )
+        # With more samples than pixels, draw the envelope per column
+        self.minmax: Optional[MinMax] = None
+        if vals_on_screen > self.crt_w:
+            self.minmax = MinMax(vals_on_screen, self.crt_w)
+        # Grid does not change, and the trace changes only ahead of the
+        # running edge. Both are kept as layers, and the frame is made
+        # by painting them and the HUD on top.
+        self.background = ImageSurface(FORMAT_ARGB32, self.crt_w, self.crt_h)
+        self.drawgrid(Context(self.background))
+        self.background.flush()
+        self.trace = ImageSurface(FORMAT_ARGB32, self.crt_w, self.crt_h)
+        self.drawn: Optional[int] = None  # Samples stored when last drawn
 
     def clearscreen(self, c: Context[ImageSurface], text: str) -> None:
         c.set_source_rgb(0.0, 0.0, 0.0)
         c.rectangle(0, 0, self.crt_w, self.crt_h)
         c.fill()
         c.select_font_face("sans-serif", FONT_SLANT_NORMAL, FONT_WEIGHT_BOLD)
-        c.set_font_size(36)
-        (_x, _y, w, h, _dx, _dy) = c.text_extents(text)
+        c.set_font_size(36 * self.hudscale)
+        _x, _y, w, h, _dx, _dy = c.text_extents(text)
         c.move_to((self.crt_w - w) / 2.0, (self.crt_h - h) / 2.0)
         c.set_source_rgb(1.0, 1.0, 1.0)
         c.show_text(text)
 
-    def drawcurve(  # pylint: disable=too-many-branches,too-many-statements
-        self,
-        c: Context[ImageSurface],
-        fmeta: FrameMeta,
-        data: Iterable[float],
-        samppos: int,
-    ) -> None:
-        """
-        Visualize data as a curve in the draw context
-        """
+    def drawgrid(self, c: Context[ImageSurface]) -> None:
         # Black background
         c.set_source_rgb(0.0, 0.0, 0.0)
         c.rectangle(0, 0, self.crt_w, self.crt_h)
         c.fill()
         # Grid labels
-        for y, l in zip(
-            range(self.ytick_max // 2), ("+2", "+1", "+0", "-1", "-2")
-        ):
-            drawtext(c, 5, (2 * y + 1) * self.ytick_step + 6, l)
-        drawtext(c, 5, 20, "mV")
+        for y in range(self.ytick_max // 2):
+            drawtext(
+                c,
+                5,
+                (2 * y + 1) * self.ytick_step + self.lblsize * 3 // 8,
+                f"{(4 - 2 * y) * self.range / 5:+g}",
+                self.lblsize,
+            )
+        drawtext(c, 5, self.lblsize * 5 // 4, "mV", self.lblsize)
         # Grid
         c.set_source_rgb(0.4, 0.4, 0.4)
         c.set_line_width(2)
@@ -110,51 +140,128 @@ class Drw:  # pylint: disable=too-many-instance-attributes
             c.move_to(25 if y % 2 else 0, y * self.ytick_step)
             c.line_to(self.crt_w, y * self.ytick_step)
         c.stroke()
-        # Green signal trace
+
+    def span(
+        self, data: npt.NDArray[np.float64], a: int, b: int, cont: bool
+    ) -> Tuple[float, npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """
+        Where the samples from a to b start on screen, and coordinates
+        of the points to draw them, preceded by the previously drawn
+        point if the trace continues from it.
+        """
+        if self.minmax is None:
+            p = a - 1 if cont and a else a
+            return float(self.xs[a]), self.xs[p:b], data[p:b]
+        c0, c1 = self.minmax.update(data, a, b)
+        xs, vs = self.minmax.vertices(c0 - 1 if cont and c0 else c0, c1)
+        return float(c0), xs, vs
+
+    def set_range(self, mv: float) -> None:
+        """Change vertical scale, the grid and the whole trace follow"""
+        self.range = mv
+        self.yscale = self.ymid / mv
+        self.drawgrid(Context(self.background))
+        self.background.flush()
+        self.redraw()
+
+    def redraw(self) -> None:
+        """Draw the whole trace anew with the next frame"""
+        self.drawn = None
+
+    def drawtrace(  # pylint: disable=too-many-locals
+        self, data: npt.NDArray[np.float64], stored: int
+    ) -> None:
+        """
+        Bring the trace layer up to date with the ring of samples, that
+        `stored` samples have been put in. Only the samples that came
+        since the previous call are drawn, so the work does not depend on
+        the number of samples on screen. If a screenful or more came, or
+        the ring was cleared, all is drawn.
+        """
+        n = self.vals_on_screen
+        c = Context(self.trace)
+        cont = self.drawn is not None and 0 <= stored - self.drawn < n
+        if cont:
+            assert self.drawn is not None
+            start, count = self.drawn % n, stored - self.drawn
+        else:  # Everything, starting from the oldest
+            c.set_operator(OPERATOR_CLEAR)
+            c.paint()
+            start, count = stored % n, n
+        self.drawn = stored
         c.set_source_rgb(0.0, 1.0, 0.0)
-        c.set_line_width(4)
-        last5: deque[float] = deque(maxlen=5)
-        for x, val in enumerate(data):
-            last5.append(val)
-            xpos = (samppos + x) % self.vals_on_screen * self.xscale
-            if xpos:
-                c.line_to(xpos, self.ymid - val * self.yscale)
-            else:  # Point zero - move to the left edge
-                c.move_to(xpos, self.ymid - val * self.yscale)
-        c.stroke()
+        c.set_line_width(TRACE_W)
+        c.set_line_cap(LINE_CAP_ROUND)
+        c.set_line_join(LINE_JOIN_ROUND)
+        end = start + count
+        # The trace is not continued across the right edge
+        for a, b in ((start, min(end, n)), (0, end - n)):
+            if a >= b:
+                continue
+            x0, xs, vs = self.span(data, a, b, cont and a == start)
+            c.set_operator(OPERATOR_CLEAR)
+            x1 = xs[-1] + ERASE
+            c.rectangle(x0, 0, x1 - x0, self.crt_h)
+            if x1 > self.crt_w:
+                c.rectangle(0, 0, x1 - self.crt_w, self.crt_h)
+            c.fill()
+            c.set_operator(OPERATOR_OVER)
+            ys = self.ymid - vs * self.yscale
+            c.move_to(xs[0], ys[0])
+            for x, y in zip(xs[1:].tolist(), ys[1:].tolist()):
+                c.line_to(x, y)
+            c.stroke()
+        del c
+        self.trace.flush()
+
+    def drawcurve(  # pylint: disable=too-many-statements
+        self,
+        c: Context[ImageSurface],
+        fmeta: FrameMeta,
+        data: npt.NDArray[np.float64],
+        stored: int,
+    ) -> None:
+        """
+        Visualize data as a curve in the draw context. Data is a ring
+        that `stored` samples have been put in, the oldest one is at
+        position `stored` modulo its length.
+        """
+        c.set_source_surface(self.background)
+        c.paint()
+        self.drawtrace(data, stored)
+        c.set_source_surface(self.trace)
+        c.paint()
         # Running edge
         c.set_source_rgb(0.2, 0.2, 0.2)
-        xpos = samppos * self.xscale
+        xpos = stored % self.vals_on_screen * self.xscale
         c.move_to(xpos, 0)
         c.line_to(xpos, self.crt_h)
         c.stroke()
 
+        # Indicators, laid out for HUD_H high screen
+        c.save()
+        c.scale(self.hudscale, self.hudscale)
         # Blinking icon
-        prev = 0.0
-        act = 0.0
-        for val in last5:
-            act += abs(val - prev)
-            prev = val
         c.select_font_face(
             # "Noto Color Emoji", FONT_SLANT_NORMAL, FONT_WEIGHT_NORMAL
             "Symbola",
             FONT_SLANT_NORMAL,
             FONT_WEIGHT_NORMAL,
         )
-        c.set_source_rgb(0.0, 0.0, 1.0)
-        if act > 0.5:
+        c.set_source_rgb(1.0, 0.0, 0.0)
+        if fmeta.beat:
             c.set_font_size(36)
             c.move_to(55, 35)
             # fo = c.get_font_options()
             # fo.set_color_mode(ColorMode.COLOR)
             # c.set_font_options(fo)
-            c.show_text("\u2665")  # WHY on earch is it BLUE?!
+            c.show_text("\u2665")
             # ("\U0001f498\U0001f499\U0001f49a\U0001f49b\U0001f49c")
         # Lead off
         c.set_font_size(28)
         c.move_to(105, 35)
         if fmeta.leadoff:
-            c.set_source_rgb(0.0, 0.0, 1.0)
+            c.set_source_rgb(1.0, 0.0, 0.0)
             c.show_text("\u268b")
         else:
             c.set_source_rgb(0.0, 1.0, 0.0)
@@ -188,7 +295,7 @@ class Drw:  # pylint: disable=too-many-instance-attributes
             MStage.measuring: ((0.0, 1.0, 0.0), "\u24c2"),
             MStage.analyzing: ((0.0, 1.0, 0.0), "\u24b6"),
             MStage.result: ((0.0, 1.0, 0.0), "\u24c7"),
-            MStage.stop: ((0.0, 0.0, 1.0), "\u24c8"),
+            MStage.stop: ((1.0, 0.0, 0.0), "\u24c8"),
         }.get(fmeta.mstage, ((0.5, 0.5, 0.5), "\u2753"))
         c.set_source_rgb(*clr)
         c.show_text(sym)
@@ -200,7 +307,7 @@ class Drw:  # pylint: disable=too-many-instance-attributes
         drawtext(
             c,
             20,
-            self.crt_h - 15,
+            HUD_H - 15,
             fmeta.dtime.astimezone(timezone.utc).strftime(
                 "%Y-%m-%d %H:%M:%S UTC"
             ),
@@ -209,15 +316,29 @@ class Drw:  # pylint: disable=too-many-instance-attributes
         # Heart rate
         drawtext(
             c,
-            self.crt_w - 100,
+            self.hud_w - 100,
             60,
             str(fmeta.hr) if fmeta.hr else "---",
             fsize=48,
         )
+        # Alerts
+        for i, alert in enumerate(fmeta.alerts):
+            drawtext(c, 20, 80 + 28 * i, alert, 24, (1.0, 0.0, 0.0))
+        # Heart rate variability, 1 and 5 minute windows
+        for i, hrv in enumerate(fmeta.hrv[:2]):
+            if hrv.beats:
+                drawtext(
+                    c,
+                    340,
+                    HUD_H - 35 + 20 * i,
+                    f"{hrv.window // 60}m SDNN {hrv.sdnn:.0f}"
+                    f" RMSSD {hrv.rmssd:.0f} pNN50 {hrv.pnn50:.0f}%",
+                )
         # Battery level
         c.set_source_rgb(0.0, 1.0, 0.0)
         c.set_line_width(2)
-        c.rectangle(self.crt_w - 80, self.crt_h - 35, 60, 20)
+        c.rectangle(self.hud_w - 80, HUD_H - 35, 60, 20)
         c.stroke()
-        c.rectangle(self.crt_w - 80, self.crt_h - 35, fmeta.battery * 20, 20)
+        c.rectangle(self.hud_w - 80, HUD_H - 35, fmeta.battery * 20, 20)
         c.fill()
+        c.restore()
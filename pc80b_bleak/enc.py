@@ -0,0 +1,75 @@
+"""Video encoder profiles"""
+
+from typing import Any, Dict, Tuple
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("Gst", "1.0")
+# pylint: disable=wrong-import-position
+from gi.repository import Gst  # type: ignore [import-untyped]
+
+from .cfg import ENCODER_PROFILES, Params
+
+# pylint: disable=missing-function-docstring
+
+# Bitrates are for 720x480 at 30 fps, and are scaled by the pixel rate.
+# ECG picture is mostly static graphics, it compresses well.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "low-cpu": {
+        "speed-preset": 1,  # ultrafast
+        "bitrate": 800,  # kbit/s
+        "vbv-buf-capacity": 1000,  # ms
+        "keyint": 4,  # seconds
+        "threads": 1,
+        "cabac": False,
+        "ref": 1,
+    },
+    "balanced": {
+        "speed-preset": 3,  # veryfast
+        "bitrate": 1500,
+        "vbv-buf-capacity": 1000,
+        "keyint": 2,
+        "threads": 2,
+        "cabac": True,
+        "ref": 1,
+    },
+    "quality": {
+        "speed-preset": 5,  # fast
+        "bitrate": 3000,
+        "vbv-buf-capacity": 2000,
+        "keyint": 2,
+        "threads": 0,  # automatic
+        "cabac": True,
+        "ref": 3,
+    },
+}
+STEPS: Tuple[str, ...] = ENCODER_PROFILES
+AUTO_START = "balanced"
+REF_PIXRATE = 720 * 480 * 30
+MIN_BITRATE = 300
+
+
+def make_encoder(profile: str, params: Params) -> Gst.Element:
+    """Create x264enc configured according to the profile"""
+    prof = PROFILES[profile]
+    pixrate = params.enc_size[0] * params.enc_size[1] * params.fps
+    x264 = Gst.ElementFactory.make("x264enc", None)
+    x264.set_property("tune", "zerolatency")
+    x264.set_property("bframes", 0)
+    x264.set_property("speed-preset", prof["speed-preset"])
+    x264.set_property(
+        "bitrate",
+        max(prof["bitrate"] * pixrate // REF_PIXRATE, MIN_BITRATE),
+    )
+    x264.set_property("vbv-buf-capacity", prof["vbv-buf-capacity"])
+    x264.set_property("key-int-max", prof["keyint"] * params.fps)
+    x264.set_property("threads", prof["threads"])
+    x264.set_property("cabac", prof["cabac"])
+    x264.set_property("ref", prof["ref"])
+    return x264
+
+
+def step_down(profile: str) -> str:
+    """Next cheaper profile, or the same if there is none"""
+    i = STEPS.index(profile)
+    return STEPS[min(i + 1, len(STEPS) - 1)]
@@ -0,0 +1,156 @@
+"""Streaming filter of the ECG: baseline wander, mains hum, noise"""
+
+from __future__ import annotations
+from math import cos, pi, sin, sqrt
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .cfg import VALS_PER_SEC, Params
+
+# pylint: disable=missing-function-docstring
+
+HIGHPASS = 0.5  # Hz, removes baseline drift, keeps ST segment usable
+NOTCH_Q = 30.0  # Narrow enough to leave QRS alone
+BLOCK = 32  # Longer input is filtered in blocks of this many samples
+
+Biquad = Tuple[Tuple[float, float, float], Tuple[float, float]]
+Array = npt.NDArray[np.float64]
+
+
+def highpass(f0: float, fs: float = VALS_PER_SEC) -> Biquad:
+    """Second order Butterworth high-pass"""
+    w0 = 2 * pi * f0 / fs
+    alpha = sin(w0) / (2 / sqrt(2))
+    a0 = 1 + alpha
+    k = (1 + cos(w0)) / 2 / a0
+    return (k, -2 * k, k), (-2 * cos(w0) / a0, (1 - alpha) / a0)
+
+
+def lowpass(f0: float, fs: float = VALS_PER_SEC) -> Biquad:
+    """Second order Butterworth low-pass"""
+    w0 = 2 * pi * f0 / fs
+    alpha = sin(w0) / (2 / sqrt(2))
+    a0 = 1 + alpha
+    k = (1 - cos(w0)) / 2 / a0
+    return (k, 2 * k, k), (-2 * cos(w0) / a0, (1 - alpha) / a0)
+
+
+def notch(f0: float, fs: float = VALS_PER_SEC, q: float = NOTCH_Q) -> Biquad:
+    w0 = 2 * pi * f0 / fs
+    alpha = sin(w0) / (2 * q)
+    a0 = 1 + alpha
+    k = 1 / a0
+    return (k, -2 * cos(w0) * k, k), (-2 * cos(w0) * k, (1 - alpha) * k)
+
+
+class StateSpace(NamedTuple):
+    """x' = A x + B u, y = C x + D u"""
+
+    A: Array
+    B: Array
+    C: Array
+    D: float
+
+    @classmethod
+    def of(cls, sections: List[Biquad]) -> StateSpace:
+        """Cascade of biquads in transposed direct form II"""
+        ss = cls(np.zeros((0, 0)), np.zeros(0), np.zeros(0), 1.0)
+        for (b0, b1, b2), (a1, a2) in sections:
+            ss = ss.then(
+                cls(
+                    np.array([[-a1, 1.0], [-a2, 0.0]]),
+                    np.array([b1 - a1 * b0, b2 - a2 * b0]),
+                    np.array([1.0, 0.0]),
+                    b0,
+                )
+            )
+        return ss
+
+    def then(self, nxt: StateSpace) -> StateSpace:
+        """Output of this system fed to the input of the next one"""
+        n, m = len(self.B), len(nxt.B)
+        a = np.zeros((n + m, n + m))
+        a[:n, :n] = self.A
+        a[n:, :n] = np.outer(nxt.B, self.C)
+        a[n:, n:] = nxt.A
+        return StateSpace(
+            a,
+            np.concatenate((self.B, nxt.B * self.D)),
+            np.concatenate((nxt.D * self.C, nxt.C)),
+            nxt.D * self.D,
+        )
+
+
+class Block(NamedTuple):
+    """
+    The system unrolled over a block of samples: for the state x and
+    input u, output is O x + T u, and the next state is P x + Q u
+    """
+
+    O: Array
+    T: Array
+    P: Array
+    Q: Array
+
+    @classmethod
+    def of(cls, ss: StateSpace, length: int) -> Block:
+        n = len(ss.B)
+        powers = [np.eye(n)]
+        for _ in range(length):
+            powers.append(ss.A @ powers[-1])
+        # Impulse response: D, then C A^(k-1) B
+        h = np.array([ss.D] + [ss.C @ p @ ss.B for p in powers[:-2]])
+        t = np.zeros((length, length))
+        for k in range(length):
+            t[k:, k] = h[: length - k]
+        return cls(
+            np.array([ss.C @ p for p in powers[:-1]]),
+            t,
+            powers[-1],
+            np.array([p @ ss.B for p in reversed(powers[:-1])]).T,
+        )
+
+
+class Filter:
+    """
+    IIR filter processing a packet at a time as a few matrix products,
+    carrying the state between packets. Keep one per stream.
+    """
+
+    def __init__(self, sections: List[Biquad]) -> None:
+        self.ss = StateSpace.of(sections)
+        self.blocks: Dict[int, Block] = {}
+        self.state = np.zeros(len(self.ss.B))
+        self.primed = False
+
+    def reset(self) -> None:
+        """Next input is a new stream, unrelated to the previous one"""
+        self.primed = False
+
+    def __call__(self, u: Array) -> Array:
+        if not self.ss.B.size or not u.size:
+            return u
+        if not self.primed:  # Steady state for the first value
+            eye = np.eye(len(self.ss.B))
+            self.state = np.linalg.solve(eye - self.ss.A, self.ss.B) * u[0]
+            self.primed = True
+        out = np.empty(len(u))
+        for i in range(0, len(u), BLOCK):
+            chunk = u[i : i + BLOCK]
+            if len(chunk) not in self.blocks:
+                self.blocks[len(chunk)] = Block.of(self.ss, len(chunk))
+            blk = self.blocks[len(chunk)]
+            out[i : i + BLOCK] = blk.O @ self.state + blk.T @ chunk
+            self.state = blk.P @ self.state + blk.Q @ chunk
+        return out
+
+
+def make_filter(params: Params) -> Filter:
+    sections = [highpass(HIGHPASS)]
+    if params.mains:
+        sections.append(notch(params.mains))
+    if params.lowpass:
+        sections.append(lowpass(params.lowpass))
+    return Filter(sections)
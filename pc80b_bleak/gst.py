@@ -6,12 +6,16 @@
 # https://stackoverflow.com/questions/27905606/gstreamer-how-recover-from-rtmpsink-error
 
 from __future__ import annotations
-from contextlib import ExitStack
-from time import time_ns
+from contextlib import ExitStack, contextmanager
+from sys import byteorder
+from threading import Event as TEvent
+from time import monotonic_ns, time_ns
 from typing import (
     Any,
     Callable,
     ContextManager,
+    Dict,
+    Iterator,
     Literal,
     Optional,
     Tuple,
@@ -22,58 +26,267 @@ import gi  # type: ignore [import-untyped]
 
 gi.require_version("Gst", "1.0")
 # pylint: disable=wrong-import-position
-from gi.repository import Gst  # type: ignore [import-untyped]
+from gi.repository import GLib, Gst  # type: ignore [import-untyped]
+
+from .avs import AvSync
+from .cfg import PACKET, Params
+from .enc import AUTO_START, make_encoder, step_down
+from .out import Output, RtmpOut, is_flv_video
+from .prb import GapMeter, LatencyTracer, StageTimer
 
 if TYPE_CHECKING:
     from .sgn import Signal
 
 # pylint: disable=missing-function-docstring
 
-POOLSIZE = 128
-
-ADELAY = 800_000_000
-
+POOLGROW = 4  # Pool may grow up to this many times the latency budget
+RESIZE_SECS = 30  # How often to consider shrinking the pool
+INFLIGHT = 2  # Frames held by encoder and sinks, not seen in queue levels
+AUTO_PERIOD = 5  # Seconds between checks of encoder time in "auto" mode
+IDLE_FPS = 2  # Repeat rate of a still frame, to keep the outputs alive
+DRAIN_SECS = 2  # Time for a replaced encoder to give out what it holds
+KEYUNIT = "GstForceKeyUnit,all-headers=(boolean)true"
+
+# Cairo FORMAT_ARGB32 is a native endian 32 bit word, so in memory it is
+# BGRA on little endian and ARGB on big endian machines. We always paint
+# opaque background, so the alpha byte can be declared as padding. Then
+# the local GL sink uploads the frames as they are, and only the encoder
+# branch needs conversion (to planar I420).
+PIXFMT = "BGRx" if byteorder == "little" else "xRGB"
 CAPS = (
-    "video/x-raw,format=RGBA,bpp=32,depth=32,width={crt_w},height={crt_h}"
-    ",red_mask=-16777216,green_mask=16711680,blue_mask=65280"
-    ",alpha_mask=255,endianness=4321,framerate=30/1"
+    "video/x-raw,format=" + PIXFMT + ",width={crt_w},height={crt_h}"
+    ",framerate={fps}/1"
 )
+ENCCAPS = "video/x-raw,format=I420"
+SCALECAPS = ENCCAPS + ",width={enc_w},height={enc_h}"
 
 Gst.init()
 
 
-class PoolBuf(ContextManager[Tuple[memoryview, Callable[[int, int], None]]]):
+@contextmanager
+def mapped(buf: Gst.Buffer) -> Iterator[memoryview]:
+    """Memory of the buffer, writable, unmapped on exit"""
+    minf = buf.map(Gst.MapFlags.READ | Gst.MapFlags.WRITE)
+    if hasattr(minf, "__enter__"):  # in newer python3-gst it is a CM
+        with minf:
+            yield minf.data
+    else:
+        try:
+            yield minf.data
+        finally:
+            buf.unmap(minf)
+
+
+def still_frame(size: int, paint: Callable[[memoryview], None]) -> Gst.Buffer:
+    """Buffer outside of the pool, to be pushed repeatedly"""
+    buf = Gst.Buffer.new_allocate(None, size, None)
+    with mapped(buf) as data:
+        paint(data)
+    return buf
+
+
+def add_branch(
+    pl: Gst.Pipeline, tee: Gst.Element, branch: Gst.Element
+) -> None:
+    """Attach element (or bin) to a tee in the running pipeline"""
+    pl.add(branch)
+    branch.sync_state_with_parent()
+    tee.link(branch)
+
+
+def drop_branch(
+    pl: Gst.Pipeline, tee: Gst.Element, branch: Gst.Element
+) -> None:
+    """
+    Detach element (or bin) from a tee without stopping the flow on
+    the other tee pads. Unlink happens in the streaming thread when
+    the tee pad is idle, shutdown of the branch in the main loop.
+    """
+    sinkpad = branch.get_static_pad("sink")
+    teepad = sinkpad.get_peer()
+    if teepad is None:
+        return
+
+    def shutdown() -> bool:
+        branch.set_state(Gst.State.NULL)
+        pl.remove(branch)
+        return False  # Do not repeat
+
+    def unlink(pad: Gst.Pad, _info: Gst.PadProbeInfo) -> Any:
+        pad.unlink(sinkpad)
+        tee.release_request_pad(pad)
+        GLib.idle_add(shutdown)
+        return Gst.PadProbeReturn.REMOVE
+
+    teepad.add_probe(Gst.PadProbeType.IDLE, unlink)
+
+
+def swap_encoder(
+    pl: Gst.Pipeline,
+    old: Gst.Element,
+    new: Gst.Element,
+    done: Callable[[], None],
+) -> None:
+    """
+    Replace the encoder in the running pipeline. The input of the old
+    one is blocked, and EOS sent through it makes it give out the frames
+    that it holds. The EOS is dropped on its output, so that the stream
+    goes on. The new encoder is linked in its place, asked for a
+    keyframe, and done() is called, all in the streaming thread.
+
+    The new encoder comes with its own codec data in the caps. flvmux
+    accepts new caps on a running pad and puts a new AVC sequence header
+    in the stream before the next frame, which players and servers take
+    as a change of decoder configuration. test/test_gst.py checks that.
+    """
+    sinkpad = old.get_static_pad("sink")
+    srcpad = old.get_static_pad("src")
+    upstream = sinkpad.get_peer()
+    downstream = srcpad.get_peer()
+    drained = TEvent()
+
+    def drop_eos(_pad: Gst.Pad, info: Gst.PadProbeInfo) -> Any:
+        if info.get_event().type != Gst.EventType.EOS:
+            return Gst.PadProbeReturn.OK
+        drained.set()
+        return Gst.PadProbeReturn.DROP
+
+    def swap(pad: Gst.Pad, _info: Gst.PadProbeInfo) -> Any:
+        srcpad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, drop_eos)
+        sinkpad.send_event(Gst.Event.new_eos())
+        if not drained.wait(DRAIN_SECS):
+            print("Encoder did not drain, frames are lost")
+        pad.unlink(sinkpad)
+        srcpad.unlink(downstream)
+        old.set_state(Gst.State.NULL)
+        pl.remove(old)
+        pl.add(new)
+        new.get_static_pad("src").link(downstream)
+        pad.link(new.get_static_pad("sink"))
+        new.sync_state_with_parent()
+        downstream.push_event(
+            Gst.Event.new_custom(
+                Gst.EventType.CUSTOM_UPSTREAM,
+                Gst.Structure.new_from_string(KEYUNIT),
+            )
+        )
+        done()
+        return Gst.PadProbeReturn.REMOVE
+
+    upstream.add_probe(Gst.PadProbeType.BLOCK_DOWNSTREAM, swap)
+
+
+class Pool:  # pylint: disable=too-many-instance-attributes
+    """
+    Buffer pool sized from the latency budget and the frame rate.
+    When exhausted, it is replaced by a bigger one (up to POOLGROW times
+    the budget), and when occupancy observed over RESIZE_SECS stays low,
+    by a smaller one (down to one packet worth of frames). Buffers of the
+    replaced pool are freed as they come back from downstream.
+    """
+
+    def __init__(self, params: Params, occupancy: Callable[[], int]) -> None:
+        self.bufsize = params.frame_bytes
+        self.occupancy = occupancy
+        self.budget = max(-(-params.latency * params.fps // 1000), 1)
+        self.lo = params.frames_until(PACKET) + 1
+        self.hi = POOLGROW * max(self.budget, self.lo)
+        self.period = RESIZE_SECS * params.fps
+        self.nowait = Gst.BufferPoolAcquireParams()
+        self.nowait.flags = Gst.BufferPoolAcquireFlags.DONTWAIT
+        self.acquired = 0
+        self.hwm = 0  # Occupancy high-water mark in this check period
+        self.peak = 0  # and for the whole run
+        self.grows = 0
+        self.shrinks = 0
+        self.waits = 0
+        self.size = max(self.budget, self.lo)
+        self.pool = self.mkpool(self.size)
+
+    def mkpool(self, size: int) -> Gst.BufferPool:
+        pool = Gst.BufferPool()
+        bpconf = pool.get_config()
+        Gst.BufferPool.config_set_params(
+            bpconf, None, self.bufsize, self.lo, size
+        )
+        pool.set_config(bpconf)
+        if not pool.set_active(True):
+            raise RuntimeError("Could not activate buffer pool")
+        return pool
+
+    def resize(self, size: int) -> None:
+        old = self.pool
+        self.pool = self.mkpool(size)
+        self.size = size
+        old.set_active(False)
+
+    def acquire(self) -> Tuple[Gst.BufferPool, Gst.Buffer]:
+        """Get a buffer, and the pool that it has to be released to"""
+        level = self.occupancy()
+        self.hwm = max(self.hwm, level)
+        self.peak = max(self.peak, level)
+        self.acquired += 1
+        if self.acquired % self.period == 0:
+            want = max(self.lo, 2 * self.hwm)
+            if self.size > self.lo and want <= self.size // 2:
+                self.shrinks += 1
+                self.resize(want)
+            self.hwm = 0  # A burst long ago does not hold the pool big
+        res, buf = self.pool.acquire_buffer(self.nowait)
+        if res == Gst.FlowReturn.EOS and self.size < self.hi:
+            self.grows += 1
+            self.resize(min(2 * self.size, self.hi))
+            res, buf = self.pool.acquire_buffer(self.nowait)
+        if res == Gst.FlowReturn.EOS:  # At the upper bound, have to wait
+            self.waits += 1
+            res, buf = self.pool.acquire_buffer(None)
+        if res != Gst.FlowReturn.OK:
+            raise RuntimeError(f"buffer acquisition {res}")
+        return self.pool, buf
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "bounds": (self.lo, self.hi),
+            "highwater": self.peak,
+            "mbytes": self.size * self.bufsize // 1_000_000,
+            "grows": self.grows,
+            "shrinks": self.shrinks,
+            "waits": self.waits,
+        }
+
+
+class PoolBuf(ContextManager[Tuple[memoryview, Callable[..., None]]]):
     """Context manager to acquire a buffer from the pool and submit on exit"""
 
+    # pylint: disable=too-many-instance-attributes
+
     def __init__(
         self,
-        pool: Gst.BufferPool,
+        pool: Pool,
         lst: Gst.BufferList,
-        sclk: int,
+        sclk: Tuple[int, int],
+        tracer: LatencyTracer,
     ) -> None:
         self.pool = pool
         self.lst = lst
-        self.sclk = sclk
+        # Start of the list on the pipeline and on the monotonic clock
+        self.sclk, self.smono = sclk
+        self.tracer = tracer
+        self.captured = 0
 
-    def __enter__(self) -> Tuple[memoryview, Callable[[int, int], None]]:
+    def __enter__(self) -> Tuple[memoryview, Callable[..., None]]:
         # pylint: disable=attribute-defined-outside-init
-        res, self.buffer = self.pool.acquire_buffer()
-        if res != Gst.FlowReturn.OK:
-            raise RuntimeError(f"buffer acquisition {res}")
-        minf = self.buffer.map(Gst.MapFlags.READ | Gst.MapFlags.WRITE)
-        if hasattr(minf, "__enter__"):  # in newer python3-gst it is a CM
-            _mm = minf.__enter__()
-            self.mmstack = minf
-        else:  # provide our own stack
-            with ExitStack() as mmctx:
-                _mm = mmctx.enter_context(minf)
-                self.mmstack = mmctx.pop_all()
-        return minf.data, self.setstamp
-
-    def setstamp(self, dur: int, ts: int) -> None:
+        self.gstpool, self.buffer = self.pool.acquire()
+        self.mmstack = ExitStack()
+        data = self.mmstack.enter_context(mapped(self.buffer))
+        return data, self.setstamp
+
+    def setstamp(self, dur: int, ts: int, captured: int = 0) -> None:
         # pylint: disable=attribute-defined-outside-init
         self.dur = dur
         self.ts = ts
+        self.captured = captured
 
     def __exit__(self, ec: Any, *_: Any) -> Literal[False]:
         with self.mmstack:
@@ -82,9 +295,13 @@ class PoolBuf(ContextManager[Tuple[memoryview, Callable[[int, int], None]]]):
             # print("timestamping buffer", self.dur, self.ts - sclk)
             self.buffer.duration = self.dur
             self.buffer.pts = self.sclk + self.ts
+            if self.captured:
+                self.tracer.stamp(
+                    self.buffer, self.captured, self.smono + self.ts
+                )
             self.lst.insert(-1, self.buffer)  # "-1" will append to the end
         else:
-            self.pool.release_buffer(self.buffer)
+            self.gstpool.release_buffer(self.buffer)
         return False
 
 
@@ -93,12 +310,15 @@ class BufList(ContextManager[Callable[[], PoolBuf]]):
 
     def __init__(
         self,
-        pool: Gst.BufferPool,
+        pool: Pool,
         src: Gst.Element,
+        tracer: LatencyTracer,
     ) -> None:
         self.pool = pool
         self.src = src
+        self.tracer = tracer
         self.sclk = src.get_current_clock_time()
+        self.smono = monotonic_ns()
 
     def __enter__(self) -> Callable[[], PoolBuf]:
         # pylint: disable=attribute-defined-outside-init
@@ -106,45 +326,45 @@ class BufList(ContextManager[Callable[[], PoolBuf]]):
         return self.bufmaker
 
     def __exit__(self, ex: Any, *_: Any) -> Literal[False]:
-        if ex is None:
+        if ex is None and self.lst.length():  # All frames may be dropped
             self.src.emit("push-buffer-list", self.lst)
         return False
 
     def bufmaker(self) -> PoolBuf:
-        return PoolBuf(self.pool, self.lst, self.sclk)
+        return PoolBuf(
+            self.pool, self.lst, (self.sclk, self.smono), self.tracer
+        )
 
 
 class Pipe:
     """GST pipeline object"""
 
     # pylint: disable=too-many-statements,too-many-locals
-    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-instance-attributes,too-many-public-methods
 
     def __init__(
         self,
-        crt_w: int,
-        crt_h: int,
+        params: Params,
         *,
         on_level: Callable[..., None],
         on_error: Callable[..., None],
+        on_output: Callable[[str, str], None],
+        on_adelay: Callable[[int], None],
     ) -> None:
+        self.params = params
         self.on_level_gui = on_level
         self.on_error_gui = on_error
+        self.on_output_gui = on_output
+        # Replaced, not modified, so that streaming thread can iterate
+        self.outputs: Dict[str, Output] = {}
         # The following must be set by register_data_callbacks()
         self.on_need_data_sgn = lambda: None
         self.on_enough_data_sgn = lambda: None
         self.signal: Optional[Signal] = None
-        self.adelay = ADELAY
+        self.still: Optional[Gst.Buffer] = None
 
-        self.pool = Gst.BufferPool()
-        bufsize = crt_w * crt_h * 4  # for FORMAT_ARGB32
-        bpconf = self.pool.get_config()
-        Gst.BufferPool.config_set_params(
-            bpconf, None, bufsize, POOLSIZE, POOLSIZE
-        )
-        self.pool.set_config(bpconf)
-        if not self.pool.set_active(True):
-            raise RuntimeError("Could not activate buffer pool")
+        self.pool = Pool(params, self.occupancy)
+        self.tracer = LatencyTracer()
 
         self.pl = Gst.Pipeline.new()
         bus = self.pl.get_bus()
@@ -156,28 +376,67 @@ class Pipe:
         self.pl.add(self.fakevsnk)
         self.fakevsnk.set_property("sync", True)
         # terminal element
-        self.rtmp = Gst.ElementFactory.make("rtmpsink", None)
+        # Encoded stream is handed over to the outputs, each of them
+        # running its own pipeline, so that a failing network connection
+        # does not disturb the encoder.
+        self.flvsnk = Gst.ElementFactory.make("appsink", None)
+        self.pl.add(self.flvsnk)
+        self.flvsnk.set_property("sync", False)
+        self.flvsnk.set_property("emit-signals", True)
+        self.flvsnk.connect("new-sample", self.on_flv_sample)
         # terminal element
+        self.pl.add(flvque := Gst.ElementFactory.make("queue", None))
+        flvque.link(self.flvsnk)
+        self.tracer.watch(
+            "sink", self.flvsnk.get_static_pad("sink"), is_flv_video
+        )
 
         self.rtee = Gst.ElementFactory.make("tee", None)
         self.pl.add(self.rtee)
+        self.outgaps = GapMeter(self.rtee.get_static_pad("sink"))
         self.rtee.link(self.fakevsnk)
+        self.rtee.link(flvque)
         self.pl.add(flvm := Gst.ElementFactory.make("flvmux", None))
         flvm.set_property("streamable", True)
         flvm.link(self.rtee)
-        self.pl.add(x264 := Gst.ElementFactory.make("x264enc", None))
-        x264.set_property("cabac", 1)
-        x264.set_property("bframes", 2)
-        x264.set_property("ref", 1)
-        x264.set_property("key-int-max", 100)
-        x264.set_property("tune", "zerolatency")
+        self.autoenc = params.profile == "auto"
+        self.encprofile = AUTO_START if self.autoenc else params.profile
+        self.stepdowns = 0
+        self.x264 = x264 = make_encoder(self.encprofile, params)
+        self.pl.add(x264)
         x264.link(flvm)
+        if self.autoenc:
+            GLib.timeout_add_seconds(AUTO_PERIOD, self.check_encoder)
         self.pl.add(vconv := Gst.ElementFactory.make("videoconvert", None))
-        vconv.link(x264)
+        vconv.set_property("n-threads", 0)  # As many as there are CPUs
+        vconv.set_property("dither", 0)  # None, the picture is synthetic
+        self.timers: Dict[str, StageTimer] = {
+            "videoconvert": StageTimer(vconv),
+            "x264enc": StageTimer(x264),
+        }
+        self.tracer.watch("videoconvert", vconv.get_static_pad("src"))
+        self.tracer.watch("x264enc", x264.get_static_pad("src"))
+        if params.scaled:
+            # Render small, convert while small, and scale planar picture
+            self.pl.add(vscale := Gst.ElementFactory.make("videoscale", None))
+            vscale.set_property("n-threads", 0)
+            vconv.link_filtered(vscale, Gst.Caps.from_string(ENCCAPS))
+            vscale.link_filtered(
+                x264,
+                Gst.Caps.from_string(SCALECAPS.format(**params._asdict())),
+            )
+            self.timers["videoscale"] = StageTimer(vscale)
+        else:
+            vconv.link_filtered(x264, Gst.Caps.from_string(ENCCAPS))
         self.pl.add(rvque := Gst.ElementFactory.make("queue", None))
-        rvque.set_property("max-size-time", 0)
+        # Bounded by the latency budget and not leaky: when the encoder
+        # or the uplink falls behind, the queue fills, the tee blocks,
+        # and appsrc reaches its limit and says "enough-data", so that
+        # frames are dropped before rendering, not piled up here.
+        rvque.set_property("max-size-time", params.latency * 1_000_000)
         rvque.set_property("max-size-bytes", 0)
         rvque.set_property("max-size-buffers", 0)
+        rvque.set_property("leaky", 0)  # No, block upstream
         rvque.link(vconv)
 
         # self.pl.add(aacenc := Gst.ElementFactory.make("voaacenc", None))
@@ -197,6 +456,7 @@ class Pipe:
         lvsnk.set_property("sink", gtksink)
         lvsnk.set_property("sync", True)
         self.pl.add(lvque := Gst.ElementFactory.make("queue", None))
+        self.vqueues = (lvque, rvque)
         # lvque.set_property("max-size-time", 0)
         # lvque.set_property("max-size-bytes", 0)
         # lvque.set_property("max-size-buffers", 0)
@@ -211,7 +471,7 @@ class Pipe:
         appsrc.set_property("format", Gst.Format.TIME)
         appsrc.set_property("stream-type", 0)
         appsrc.set_property("is-live", True)
-        appsrc.set_property("max-bytes", 11_059_200)  # Eight buffers
+        appsrc.set_property("max-bytes", self.pool.budget * params.frame_bytes)
         appsrc.set_property("min-percent", 5)
         # appsrc.set_property("emit-signals", True)
         # 2 below is for GstApp.AppStreamType.DOWNSTREAM
@@ -220,7 +480,7 @@ class Pipe:
         appsrc.connect("enough-data", self.on_enough_data)
         appsrc.link_filtered(
             lvtee,
-            Gst.Caps.from_string(CAPS.format(crt_w=crt_w, crt_h=crt_h)),
+            Gst.Caps.from_string(CAPS.format(**params._asdict())),
         )
 
         # Local audio sink
@@ -243,8 +503,9 @@ class Pipe:
         self.alvl = Gst.ElementFactory.make("level", None)
         self.pl.add(self.alvl)
         self.alvl.link(self.latee)
-        self.delay_pad = self.alvl.get_static_pad("sink")
-        self.delay_pad.set_offset(self.adelay)
+        self.avsync = AvSync(
+            self.tracer, self.alvl.get_static_pad("sink"), on_adelay
+        )
         self.delayq = Gst.ElementFactory.make("queue", None)
         self.pl.add(self.delayq)
         self.delayq.link(self.alvl)
@@ -256,6 +517,7 @@ class Pipe:
         asrc.link(acnv)
         bus.add_signal_watch()
         bus.connect("message::element", self.on_level)
+        GLib.timeout_add(1000 // IDLE_FPS, self.keepalive)
 
     def start_broadcast(self, url: str, key: str) -> None:
         print("start broadcast", url, key)
@@ -263,58 +525,97 @@ class Pipe:
             durl = url + "/" + key
         else:
             durl = url
-        self.rtmp.set_property("location", f"{durl} live=1")
-        self.set_state(False)
-        self.pl.add(self.rtmp)
-        self.rtee.link(self.rtmp)
-        self.set_state(True)
+        self.start_output(
+            RtmpOut(
+                "rtmp",
+                durl,
+                on_state=self.on_output_gui,
+                skip=self.params.skip,
+            )
+        )
 
-    def stop_broadcast(self, forced: bool = False) -> None:
+    def stop_broadcast(self) -> None:
         print("stop broadcast")
-        if self.rtmp.get_state(0).state is Gst.State.PLAYING:
-            print("was playing, unlink and reset rtmp sink, forced", forced)
-            self.set_state(None if forced else False)
-            self.rtee.unlink(self.rtmp)
-            self.pl.remove(self.rtmp)
-            self.rtmp.set_state(Gst.State.NULL)
-            self.set_state(True)
+        self.stop_output("rtmp")
+
+    def start_output(self, output: Output) -> None:
+        """
+        Start sending encoded stream to the output. All outputs are fed
+        from the same encoder, and fail and reconnect independently.
+        """
+        self.stop_output(output.name)
+        output.start()
+        self.outputs = {**self.outputs, output.name: output}
+        # The stream has to start with a keyframe to be useful.
+        self.flvsnk.get_static_pad("sink").push_event(
+            Gst.Event.new_custom(
+                Gst.EventType.CUSTOM_UPSTREAM,
+                Gst.Structure.new_from_string(KEYUNIT),
+            )
+        )
+
+    def stop_output(self, name: str) -> None:
+        outputs = self.outputs.copy()
+        output = outputs.pop(name, None)
+        self.outputs = outputs
+        if output is not None:
+            output.stop()
+
+    def stop_outputs(self) -> None:
+        for name in self.outputs:
+            self.stop_output(name)
+
+    def on_flv_sample(self, sink: Gst.Element) -> Any:
+        sample = sink.emit("pull-sample")
+        for output in self.outputs.values():
+            output.push(sample.get_buffer(), sample.get_caps())
+        return Gst.FlowReturn.OK
 
     def set_monitor(self, on: bool) -> None:
         print("Set monitor state to", on)
-        self.set_state(False)
         if on:
-            self.pl.add(self.labin)
-            self.latee.link(self.labin)
-            self.labin.set_state(Gst.State.PLAYING)
+            add_branch(self.pl, self.latee, self.labin)
         else:
-            self.latee.unlink(self.labin)
-            self.pl.remove(self.labin)
-            self.labin.set_state(Gst.State.NULL)
-        self.set_state(True)
+            drop_branch(self.pl, self.latee, self.labin)
+
+    def set_profile(self, profile: str) -> None:
+        """
+        Replace the encoder with one configured per profile. Preset can
+        only be set on a stopped encoder, so the old one is drained and
+        the new one is linked in while the converter's output is blocked.
+        """
+        print("Set encoder profile", profile)
+        new = make_encoder(profile, self.params)
+
+        def done() -> None:
+            self.timers["x264enc"].attach(new)
+            self.tracer.watch("x264enc", new.get_static_pad("src"))
+            self.x264 = new
+            self.encprofile = profile
+
+        swap_encoder(self.pl, self.x264, new, done)
+
+    def check_encoder(self) -> bool:
+        """Step down the profile if encoding takes longer than a frame"""
+        hist = self.timers["x264enc"].window()
+        if hist.count and hist.quantile(0.95) > self.params.framedur:
+            nxt = step_down(self.encprofile)
+            if nxt != self.encprofile:
+                self.stepdowns += 1
+                self.set_profile(nxt)
+        return True  # Keep the timer running
 
     def get_adelay(self) -> int:
-        return self.adelay // 1_000_000
-
-    def set_adelay(self, delay_ms: int) -> None:
-        print("set_adelay", delay_ms, "ms")
-        self.adelay = delay_ms * 1_000_000
-        self.set_state(False)
-        self.delayq.unlink(self.alvl)
-        self.delay_pad.set_offset(self.adelay)
-        self.delayq.link(self.alvl)
-        self.set_state(True)
+        return self.avsync.delay // 1_000_000
 
     def on_eos(self, _bus: Gst.Bus, _msg: Gst.Message) -> None:
         print("End of stream")
-        self.stop_broadcast(forced=True)
+        self.stop_outputs()
 
     def on_error(self, _bus: Gst.Bus, msg: Gst.Message) -> None:
         error, debug = msg.parse_error()
-        if msg.src is self.rtmp:
-            print("RTMP ERROR", error, "DEBUG", debug)
-            self.stop_broadcast(forced=True)
-        else:
-            print("Non RTMP ERROR", error, "DEBUG", debug)
+        print("ERROR", error, "DEBUG", debug)
+        self.stop_outputs()
         self.on_error_gui(error.message)
 
     def on_level(self, _bus: Gst.Bus, msg: Gst.Message) -> None:
@@ -342,8 +643,57 @@ class Pipe:
         else:
             self.signal.on_enough_data(source)
 
+    def show_still(self, buf: Optional[Gst.Buffer]) -> None:
+        """Repeat the frame at IDLE_FPS until replaced, or None to stop"""
+        self.still = buf
+        if buf is not None:
+            self.push_still(buf)
+
+    def keepalive(self) -> bool:
+        if (buf := self.still) is not None:
+            self.push_still(buf)
+        return True  # Keep the timer running
+
+    def push_still(self, buf: Gst.Buffer) -> None:
+        if self.src.get_clock() is None:  # Not playing yet
+            return
+        frame = buf.copy()  # Shares the memory, only metadata is new
+        frame.pts = self.src.get_current_clock_time()
+        frame.duration = 1_000_000_000 // IDLE_FPS
+        self.src.emit("push-buffer", frame)
+
+    def occupancy(self) -> int:
+        """Estimate of the number of frames in flight downstream"""
+        # Both branches of the tee hold the same buffers, count the
+        # longer one of the queues.
+        return int(
+            self.src.get_property("current-level-buffers")
+            + max(
+                q.get_property("current-level-buffers") for q in self.vqueues
+            )
+            + INFLIGHT
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Time spent in measured elements, buffer pool usage"""
+        return {
+            **{name: tmr.summary() for name, tmr in self.timers.items()},
+            "encoder": {
+                "profile": self.encprofile,
+                "auto": self.autoenc,
+                "stepdowns": self.stepdowns,
+            },
+            "outgaps": self.outgaps.summary(),
+            "latency": self.tracer.summary(),
+            "avsync": self.avsync.stats(),
+            "pool": self.pool.stats(),
+            "outputs": {
+                name: output.stats() for name, output in self.outputs.items()
+            },
+        }
+
     def register_signal(self, signal: Signal) -> None:
         self.signal = signal
 
     def listmaker(self) -> BufList:
-        return BufList(self.pool, self.src)
+        return BufList(self.pool, self.src, self.tracer)
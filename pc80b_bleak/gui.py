@@ -1,8 +1,11 @@
 """GTK GUI"""
 
 from __future__ import annotations
+from datetime import datetime
+from os import path
 from typing import Any, Dict, List, Literal
 import gi  # type: ignore [import-untyped]
+import numpy as np
 from cairo import Context, Surface  # pylint: disable=no-name-in-module
 
 gi.require_version("Gtk", "4.0")
@@ -13,19 +16,20 @@ gi.require_version("Adw", "1")
 from gi.repository import (  # type: ignore [import-untyped]
     Adw,
     Gdk,
+    GLib,
     Gtk,
     GObject,
 )
 
+from .cfg import VALS_PER_SEC, Params
 from .sgn import Signal
 from .gst import Pipe
+from .out import FileOut, RtmpOut
+from .src import use_glib_loop
 
 # pylint: disable=missing-function-docstring
 # pylint: disable=too-many-arguments,too-many-positional-arguments
 
-CRT_W = 720
-CRT_H = 480
-
 CSS = """
 .onair {
     font-weight: bold;
@@ -38,6 +42,10 @@ CSS = """
 }
 """
 
+HIST_SECS = 60.0  # Initially shown in the history strip
+HIST_ZOOM = (1.0, 4 * 3600.0)  # Limits of the history span, seconds
+HIST_MS = 500  # Refresh period of the history strip
+
 Gtk.init()
 
 
@@ -63,9 +71,14 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         self.connect("close-request", self.on_close)
 
         self.level_data: Dict[str, List[float]] = {}
-        self.signal = Signal(CRT_W, CRT_H)
+        params = Params.from_opts(kwargs)
+        self.signal = Signal(params)
         self.pipe = Pipe(
-            CRT_W, CRT_H, on_level=self.on_level, on_error=self.on_gst_error
+            params,
+            on_level=self.on_level,
+            on_error=self.on_gst_error,
+            on_output=self.on_output,
+            on_adelay=self.on_adelay,
         )
         self.signal.register_pipe(self.pipe)
         self.pipe.register_signal(self.signal)
@@ -83,7 +96,7 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
 
         self.monda = Gtk.DrawingArea()
-        self.monda.set_size_request(40, CRT_H // 2)
+        self.monda.set_size_request(40, 240)
         self.monda.set_halign(Gtk.Align.CENTER)
         self.monda.set_valign(Gtk.Align.CENTER)
         self.monda.set_draw_func(self.draw_mon, None)
@@ -94,13 +107,8 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         testswitch.set_valign(Gtk.Align.CENTER)
         testswitch.set_active(False)
         testswitch.connect("state-set", self.on_testswitch)
-        delaybtn = Gtk.SpinButton(orientation=Gtk.Orientation.VERTICAL)
-        delaybtn.props.adjustment = Gtk.Adjustment(
-            lower=0, upper=2000, step_increment=20, page_increment=200
-        )
-        delaybtn.set_numeric(True)
-        delaybtn.set_value(self.pipe.get_adelay())
-        delaybtn.connect("value-changed", self.on_adelay)
+        # Audio delay is calibrated by the pipeline, only shown here
+        self.delaylbl = Gtk.Label(label=str(self.pipe.get_adelay()))
         lbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         spacepad(lbox)
         lbox.append(Gtk.Label(label="Test"))
@@ -108,7 +116,7 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         lbox.append(Gtk.Label(label="Vol"))
         lbox.append(monframe)
         lbox.append(Gtk.Label(label="Delay"))
-        lbox.append(delaybtn)
+        lbox.append(self.delaylbl)
         lbox.append(Gtk.Label(label="(ms)"))
         hbox.append(lbox)
 
@@ -119,10 +127,27 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         frame = Gtk.Frame()
         frame.set_child(picture)
         crtbox = Gtk.Box()
-        crtbox.set_size_request(CRT_W, CRT_H)
+        # Keep the preview at the size of the default geometry
+        crtbox.set_size_request(720, 720 * params.crt_h // params.crt_w)
         crtbox.append(frame)
         mbox.append(crtbox)
 
+        # History of the session: wheel zooms, shifted wheel pans
+        self.histspan = HIST_SECS
+        self.histback = 0.0  # Seconds from the right edge to now
+        self.histda = Gtk.DrawingArea()
+        self.histda.set_size_request(720, 80)
+        self.histda.set_draw_func(self.draw_hist, None)
+        sctrl = Gtk.EventControllerScroll.new(
+            Gtk.EventControllerScrollFlags.BOTH_AXES
+        )
+        sctrl.connect("scroll", self.on_hist_scroll)
+        self.histda.add_controller(sctrl)
+        histframe = Gtk.Frame()
+        histframe.set_child(self.histda)
+        mbox.append(histframe)
+        self.histtimer = GLib.timeout_add(HIST_MS, self.tick_hist)
+
         model = Gtk.ListStore(GObject.TYPE_STRING)
         for el in (
             "rtmp://abuser.cardiobasel.ch/stream/live",
@@ -198,6 +223,13 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
         monswitch.connect("state-set", self.on_monswitch)
         rbox.append(Gtk.Label(label="\U0001f3a7"))
         rbox.append(monswitch)
+        self.recswitch = Gtk.Switch()
+        self.recswitch.set_halign(Gtk.Align.CENTER)
+        self.recswitch.set_valign(Gtk.Align.CENTER)
+        self.recswitch.set_active(False)
+        self.recswitch.connect("state-set", self.on_recswitch)
+        rbox.append(Gtk.Label(label="Rec"))
+        rbox.append(self.recswitch)
         hbox.append(rbox)
 
         vbox.append(hbox)
@@ -237,15 +269,76 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
             c.rectangle(10 + lr * 14, 10 + maxh - lvl, 10, lvl)
             c.fill()
 
+    def draw_hist(
+        self,
+        _histda: Gtk.DrawingArea,
+        c: Context[Surface],
+        w: int,
+        h: int,
+        _udata: Literal[None],
+    ) -> None:
+        c.set_source_rgb(0, 0, 0)
+        c.paint()
+        if w <= 0:
+            return
+        history = self.signal.history
+        end = history.nsamp - self.histback * VALS_PER_SEC
+        lo, hi = history.query(end - self.histspan * VALS_PER_SEC, end, w)
+        yscale = h / 2 / self.signal.drw.range
+        c.set_source_rgb(0, 1, 0)
+        c.set_line_width(1)
+        for x in np.flatnonzero(~np.isnan(lo)).tolist():
+            c.move_to(x + 0.5, h / 2 - hi[x] * yscale)
+            c.line_to(x + 0.5, h / 2 - lo[x] * yscale + 1)
+        c.stroke()
+        c.set_source_rgb(0.6, 0.6, 0.6)
+        c.move_to(5, h - 5)
+        c.show_text(
+            f"{self.histspan:.0f} s"
+            + (f", {self.histback:.0f} s ago" if self.histback else "")
+        )
+
+    def on_hist_scroll(
+        self, ctrl: Gtk.EventControllerScroll, dx: float, dy: float
+    ) -> bool:
+        if ctrl.get_current_event_state() & Gdk.ModifierType.SHIFT_MASK:
+            dx, dy = dy, 0.0
+        if dx:
+            self.histback = max(self.histback - dx * self.histspan / 10, 0)
+        elif dy:
+            self.histspan = min(
+                max(self.histspan * 2**dy, HIST_ZOOM[0]), HIST_ZOOM[1]
+            )
+        self.histda.queue_draw()
+        return True
+
+    def tick_hist(self) -> bool:
+        self.histda.queue_draw()
+        return True  # Keep the timer running
+
     def on_testswitch(self, _switch: Gtk.Widget, state: bool) -> None:
         self.signal.start(state)
 
     def on_monswitch(self, _switch: Gtk.Widget, state: bool) -> None:
         self.pipe.set_monitor(state)
 
-    def on_adelay(self, sbtn: Gtk.Widget) -> None:
-        # print("delay spinbutton", sbtn.get_value_as_int())
-        self.pipe.set_adelay(sbtn.get_value_as_int())
+    def on_recswitch(self, _switch: Gtk.Widget, state: bool) -> None:
+        if state:
+            fname = datetime.now().strftime("pc80b-%Y%m%d-%H%M%S.flv")
+            self.pipe.start_output(
+                FileOut(
+                    "record",
+                    path.join(path.expanduser("~"), fname),
+                    on_state=self.on_output,
+                )
+            )
+            self.label.set_text(f"Recording to {fname}")
+        else:
+            self.pipe.stop_output("record")
+            self.label.set_text("Recording stopped")
+
+    def on_adelay(self, delay_ms: int) -> None:
+        self.delaylbl.set_text(str(delay_ms))
 
     def on_textentry_activate(self, _entry: Gtk.Widget) -> None:
         if not self.bcast.get_active():
@@ -253,13 +346,30 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
 
     def on_bcast(self, _entry: Gtk.Widget, state: bool) -> None:
         # print("bcast switch", state, "url", self.streamurl.get_text())
+        # Additional destinations, full URLs with keys: -o URL1,URL2
+        extra = {
+            f"rtmp{i}": url
+            for i, url in enumerate(self.kwargs.get("-o", "").split(","))
+            if url
+        }
         if state:
             self.pipe.start_broadcast(
                 self.streamurl.get_text(), self.streamkey.get_text()
             )
+            for name, url in extra.items():
+                self.pipe.start_output(
+                    RtmpOut(
+                        name,
+                        url,
+                        on_state=self.on_output,
+                        skip=self.pipe.params.skip,
+                    )
+                )
             self.label.set_text("Broadcast started")
         else:
             self.pipe.stop_broadcast()
+            for name in extra:
+                self.pipe.stop_output(name)
             self.label.set_text("Broadcast stopped")
         self.onairframe.set_child(self.onairlbl if state else self.offairlbl)
 
@@ -281,15 +391,25 @@ class AppWindow(Gtk.ApplicationWindow):  # type: ignore [misc] # no gtk stubs
             entry.get_buffer().set_text("", 0)
 
     def on_close(self, _: Any) -> None:
+        if self.histtimer:
+            GLib.source_remove(self.histtimer)
+            self.histtimer = 0
         self.signal.stop()
+        self.signal.bus.close()
+        print("Signal stats", self.signal.stats())
+        print("Pipeline stats", self.pipe.stats())
         self.pipe.set_state(None)
 
     def on_level(self, **kwargs: List[float]) -> None:
         self.level_data = kwargs
         self.monda.queue_draw()
 
+    def on_output(self, name: str, state: str) -> None:
+        self.label.set_text(f"Output {name}: {state}")
+
     def on_gst_error(self, error: Gtk.Error) -> None:
         self.bcast.set_active(False)
+        self.recswitch.set_active(False)
         self.label.set_text(str(error))
 
 
@@ -299,6 +419,7 @@ class App(Adw.Application):  # type: ignore [misc] # no stubs
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         self.args = args
         self.kwargs = kwargs
+        use_glib_loop()  # Sources run in this thread when it can
         super().__init__()
         self.get_style_manager().set_color_scheme(Adw.ColorScheme.PREFER_DARK)
         css = Gtk.CssProvider()
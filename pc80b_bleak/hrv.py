@@ -0,0 +1,147 @@
+"""Heart rate variability over sliding windows, updated beat by beat"""
+
+from __future__ import annotations
+from collections import deque
+from math import sqrt
+from sys import argv
+from typing import Deque, Dict, Iterable, List, NamedTuple, Tuple
+
+from .cfg import VALS_PER_SEC
+from .qrs import Beat, detect
+from .rec import load
+
+# pylint: disable=missing-function-docstring
+
+WINDOWS = (60, 300, 3600)  # Seconds
+RR_MIN = 0.3  # Seconds, intervals outside of the range are artifacts
+RR_MAX = 2.0
+NN50 = 0.05
+TREND = 60  # Minutes of mean heart rate trend kept
+
+
+class Summary(NamedTuple):
+    """Statistics of one window, intervals in milliseconds"""
+
+    window: int  # Seconds
+    beats: int
+    mean_hr: float
+    sdnn: float
+    rmssd: float
+    pnn50: float  # Percent
+
+
+class Window:  # pylint: disable=too-many-instance-attributes
+    """
+    Running sums of intervals in the last `secs` seconds. Adding a beat
+    and dropping the ones that fell out of the window touch only those
+    beats, so the cost per beat is constant on average, and the memory
+    is bounded by the number of beats in the window.
+    """
+
+    def __init__(self, secs: int) -> None:
+        self.secs = secs
+        # Time, interval, squared successive difference (or -1 if the
+        # previous interval is not known)
+        self.beats: Deque[Tuple[float, float, float]] = deque(
+            maxlen=int(secs / RR_MIN) + 1
+        )
+        self.n = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.ndiff = 0
+        self.sumdiff = 0.0
+        self.nn50 = 0
+
+    def account(self, rr: float, diffsq: float, sign: int) -> None:
+        self.n += sign
+        self.sum += sign * rr
+        self.sumsq += sign * rr * rr
+        if diffsq >= 0:
+            self.ndiff += sign
+            self.sumdiff += sign * diffsq
+            self.nn50 += sign * (diffsq > NN50 * NN50)
+
+    def add(self, time: float, rr: float, diffsq: float) -> None:
+        if len(self.beats) == self.beats.maxlen:
+            self.account(*self.beats[0][1:], -1)
+        self.beats.append((time, rr, diffsq))
+        self.account(rr, diffsq, 1)
+        while self.beats[0][0] < time - self.secs:
+            self.account(*self.beats.popleft()[1:], -1)
+
+    def summary(self) -> Summary:
+        if not self.n:
+            return Summary(self.secs, 0, 0.0, 0.0, 0.0, 0.0)
+        mean = self.sum / self.n
+        var = max(self.sumsq / self.n - mean * mean, 0.0)
+        return Summary(
+            window=self.secs,
+            beats=self.n,
+            mean_hr=60.0 / mean,
+            sdnn=1000 * sqrt(var),
+            rmssd=(
+                1000 * sqrt(self.sumdiff / self.ndiff) if self.ndiff else 0.0
+            ),
+            pnn50=100 * self.nn50 / self.ndiff if self.ndiff else 0.0,
+        )
+
+
+class Hrv:
+    """Statistics of normal to normal intervals, fed with detected beats"""
+
+    def __init__(self) -> None:
+        self.windows = [Window(secs) for secs in WINDOWS]
+        self.prev = 0.0  # Previous accepted interval
+        self.trend: Deque[Tuple[int, float]] = deque(maxlen=TREND)
+        self.minute = 0
+
+    def add(self, beat: Beat) -> None:
+        if not RR_MIN <= beat.rr <= RR_MAX:
+            self.prev = 0.0  # Successive difference is not meaningful
+            return
+        time = beat.sample / VALS_PER_SEC
+        diffsq = (beat.rr - self.prev) ** 2 if self.prev else -1.0
+        self.prev = beat.rr
+        for window in self.windows:
+            window.add(time, beat.rr, diffsq)
+        if int(time // 60) > self.minute:
+            self.minute = int(time // 60)
+            self.trend.append((self.minute, self.windows[0].summary().mean_hr))
+
+    def gap(self) -> None:
+        self.prev = 0.0  # Successive difference is not meaningful
+
+    def feed(self, beats: Iterable[Beat]) -> None:
+        for beat in beats:
+            self.add(beat)
+
+    def summaries(self) -> Tuple[Summary, ...]:
+        return tuple(window.summary() for window in self.windows)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {f"{s.window // 60}min": s._asdict() for s in self.summaries()}
+
+
+def analyse(path: str) -> Hrv:
+    """Statistics over a recorded session"""
+    hrv = Hrv()
+    hrv.feed(detect(load(path)))
+    return hrv
+
+
+def main() -> None:
+    """Print statistics of recordings named on the command line"""
+    for path in argv[1:]:
+        hrv = analyse(path)
+        print(path)
+        lines: List[str] = [
+            f"{s.window // 60:4d} min {s.beats:6d} beats"
+            f" HR {s.mean_hr:5.1f} SDNN {s.sdnn:6.1f} RMSSD {s.rmssd:6.1f}"
+            f" pNN50 {s.pnn50:5.1f}%"
+            for s in hrv.summaries()
+        ]
+        print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
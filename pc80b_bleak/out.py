@@ -0,0 +1,307 @@
+"""Network outputs of the encoded stream, surviving uplink outages"""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import deque
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("Gst", "1.0")
+# pylint: disable=wrong-import-position
+from gi.repository import GLib, Gst  # type: ignore [import-untyped]
+
+# pylint: disable=missing-function-docstring
+
+BACKLOG = 10_000_000_000  # ns of FLV tags kept for the time of an outage
+BACKOFF_MIN = 1  # seconds before the first reconnect attempt
+BACKOFF_MAX = 30
+CONFIRM = 3  # Seconds without error to consider the connection good
+QUEUED = 4_000_000  # Bytes in appsrc beyond which the sink is behind
+
+
+def is_flv_video(buf: Gst.Buffer) -> bool:
+    """True if the buffer is FLV video tag"""
+    return bool(buf.extract_dup(0, 1) == b"\x09")
+
+
+def is_keyframe(buf: Gst.Buffer) -> bool:
+    """True if FLV tag in the buffer is a video keyframe"""
+    head = buf.extract_dup(0, 12)
+    # Tag type 9 is video, high nibble of the first data byte 1 is keyframe
+    return len(head) == 12 and head[0] == 9 and head[11] >> 4 == 1
+
+
+class Output(ABC):  # pylint: disable=too-many-instance-attributes
+    """
+    Destination of the encoded stream in a pipeline of its own, fed with
+    FLV tags from the main pipeline. If the sink fails, the tags
+    accumulate in a ring holding BACKLOG worth of stream, and the sink
+    is restarted with exponential backoff. On restart, either all unsent
+    tags are flushed, or the stream skips to the latest keyframe. A new
+    stream starts from the keyframe preceding the unsent tags. A sink
+    that continues what it already got starts right after it instead,
+    so that nothing is written twice. A tag counts as sent when the sink
+    takes it, not when it is queued in appsrc. Tags are only queued
+    while the sink keeps up (less than QUEUED bytes waiting), otherwise
+    they wait in the ring, and a sink that has not taken the oldest of
+    them for BACKLOG is restarted as if it failed.
+    """
+
+    continues = False  # The restarted sink appends to what was sent
+
+    def __init__(
+        self,
+        name: str,
+        location: str,
+        *,
+        on_state: Callable[[str, str], None],
+        skip: bool = False,
+    ) -> None:
+        self.name = name
+        self.location = location
+        self.on_state = on_state
+        self.skip = skip
+        self.lock = Lock()
+        self.ring: Deque[Tuple[int, Gst.Buffer]] = deque()
+        self.seq = 0  # Sequence number of the last tag received
+        self.queued = 0  # of the last tag pushed to appsrc
+        self.sent = 0  # and of the last tag taken by the sink
+        # Tags in appsrc, in order, None for the headers
+        self.inflight: Deque[Optional[int]] = deque()
+        self.caps: Optional[Gst.Caps] = None
+        self.pl: Optional[Gst.Pipeline] = None
+        self.src: Optional[Gst.Element] = None
+        self.live = False
+        self.stopped = False
+        self.backoff = BACKOFF_MIN
+        self.timer = 0
+        self.up_since = 0.0
+        self.down_since = 0.0
+        self.outages = 0
+        self.outage_secs = 0.0
+        self.attempts = 0
+        self.lost = 0  # Tags that fell out of the ring unsent
+        self.skipped = 0  # Tags not sent because of skip to keyframe
+
+    def start(self) -> None:
+        self.connect()
+
+    def stop(self) -> None:
+        self.stopped = True
+        if self.timer:
+            GLib.source_remove(self.timer)
+            self.timer = 0
+        self.teardown()
+
+    def push(self, buf: Gst.Buffer, caps: Gst.Caps) -> None:
+        """Called from the streaming thread of the main pipeline"""
+        if buf.has_flags(Gst.BufferFlags.HEADER):
+            return  # Stream headers are sent by the sink from the caps
+        with self.lock:
+            self.caps = caps
+            self.seq += 1
+            self.ring.append((self.seq, buf))
+            stalled = False
+            while self.ring and self.ring[0][1].pts + BACKLOG < buf.pts:
+                seq, _ = self.ring.popleft()
+                if seq > self.sent:
+                    self.lost += 1
+                    stalled = stalled or self.live
+            if stalled:  # The sink took nothing for BACKLOG
+                self.live = False
+                GLib.idle_add(self.stall)
+            elif self.live:
+                self.feed()
+
+    def feed(self) -> None:
+        """Queue tags in appsrc while the sink keeps up, with lock held"""
+        assert self.src is not None
+        if not self.ring:
+            return
+        # Sequence numbers in the ring are consecutive
+        for i in range(
+            max(self.queued + 1 - self.ring[0][0], 0), len(self.ring)
+        ):
+            seq, buf = self.ring[i]
+            if self.src.get_property("current-level-bytes") >= QUEUED:
+                break  # The rest waits in the ring
+            self.emit(seq, buf)
+
+    def emit(self, seq: Optional[int], buf: Gst.Buffer) -> None:
+        assert self.src is not None
+        self.inflight.append(seq)
+        if seq is not None:
+            self.queued = seq
+        self.src.emit("push-buffer", buf)
+
+    def taken(self, _pad: Gst.Pad, _info: Gst.PadProbeInfo) -> Any:
+        """Probe on the sink, a tag has left appsrc"""
+        with self.lock:
+            if self.inflight and (seq := self.inflight.popleft()):
+                self.sent = max(self.sent, seq)  # Resent ones come again
+        return Gst.PadProbeReturn.OK
+
+    def connect(self) -> bool:
+        self.timer = 0
+        if self.stopped:
+            return False
+        with self.lock:
+            if self.caps is None:  # Nothing encoded yet, try later
+                self.timer = GLib.timeout_add_seconds(1, self.connect)
+                return False
+            self.attempts += 1
+            self.pl = Gst.Pipeline.new()
+            self.src = Gst.ElementFactory.make("appsrc", None)
+            self.src.set_property("is-live", True)
+            self.src.set_property("format", Gst.Format.TIME)
+            # Not a hard limit, feed() stops queueing at QUEUED
+            self.src.set_property("max-bytes", QUEUED)
+            self.src.set_property("caps", self.caps)
+            sink = self.mksink()
+            sink.set_property("sync", False)
+            sink.get_static_pad("sink").add_probe(
+                Gst.PadProbeType.BUFFER, self.taken
+            )
+            self.pl.add(self.src)
+            self.pl.add(sink)
+            self.src.link(sink)
+            bus = self.pl.get_bus()
+            bus.add_signal_watch()
+            bus.connect("message::error", self.on_error)
+            bus.connect("message::eos", self.on_error)
+            self.pl.set_state(Gst.State.PLAYING)
+            self.inflight.clear()
+            for buf in self.headers():
+                self.emit(None, buf)
+            todo = self.backlog()
+            # Whatever precedes the backlog will not be sent any more
+            self.queued = todo[0][0] - 1 if todo else self.seq
+            self.sent = max(self.sent, self.queued)
+            self.live = True
+            self.feed()
+        # Network sinks connect when they get the first buffer, and there
+        # is no message for success. Absence of error for a while will do.
+        self.up_since = monotonic()
+        self.timer = GLib.timeout_add_seconds(CONFIRM, self.confirm)
+        return False  # Do not repeat the timer
+
+    def confirm(self) -> bool:
+        self.timer = 0
+        if self.down_since:
+            self.outage_secs += self.up_since - self.down_since
+            self.down_since = 0.0
+        self.backoff = BACKOFF_MIN
+        self.on_state(self.name, "Connected")
+        return False
+
+    @abstractmethod
+    def mksink(self) -> Gst.Element: ...
+
+    def headers(self) -> Tuple[Gst.Buffer, ...]:
+        """Stream headers that the sink does not take from the caps"""
+        return ()
+
+    def backlog(self) -> List[Tuple[int, Gst.Buffer]]:
+        """Tags to send on (re)connection, must be called with lock held"""
+        unsent = [(seq, buf) for seq, buf in self.ring if seq > self.sent]
+        if self.continues and (not unsent or unsent[0][0] == self.sent + 1):
+            # Sent tags are already there, and nothing is missing after
+            # them: continue, or skip forward among the unsent ones.
+            tags = unsent
+            start: Optional[int] = None if self.skip else 0
+        else:
+            tags = list(self.ring) if not self.continues else unsent
+            start = None
+        if start is None:
+            for i in range(len(tags) - 1, -1, -1):
+                seq, buf = tags[i]
+                if is_keyframe(buf):
+                    start = i
+                    if self.skip or seq <= self.sent + 1:
+                        break
+        # With no keyframe, the stream will recover on the next one
+        todo = tags[start:] if start is not None else []
+        first = todo[0][0] if todo else self.seq + 1
+        self.skipped += sum(1 for seq, _ in unsent if seq < first)
+        return todo
+
+    def teardown(self) -> None:
+        with self.lock:
+            self.live = False
+            pl, self.pl, self.src = self.pl, None, None
+        if pl is not None:
+            pl.get_bus().remove_signal_watch()
+            pl.set_state(Gst.State.NULL)
+
+    def on_error(self, _bus: Gst.Bus, msg: Gst.Message) -> None:
+        if msg.type == Gst.MessageType.ERROR:
+            error, debug = msg.parse_error()
+            print(self.name, "ERROR", error, "DEBUG", debug)
+        else:
+            print(self.name, "EOS")
+        self.restart()
+
+    def stall(self) -> bool:
+        print(self.name, "STALLED")
+        self.restart()
+        return False  # Do not repeat
+
+    def restart(self) -> None:
+        self.teardown()
+        if self.timer:  # Failed before confirmation
+            GLib.source_remove(self.timer)
+        if self.stopped:
+            return
+        if not self.down_since:
+            self.down_since = monotonic()
+            self.outages += 1
+        self.on_state(self.name, f"Failed, retry in {self.backoff} s")
+        self.timer = GLib.timeout_add_seconds(self.backoff, self.connect)
+        self.backoff = min(2 * self.backoff, BACKOFF_MAX)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            unsent = sum(1 for seq, _ in self.ring if seq > self.sent)
+            ring_bytes = sum(buf.get_size() for _, buf in self.ring)
+        down = monotonic() - self.down_since if self.down_since else 0.0
+        return {
+            "live": self.live,
+            "outages": self.outages,
+            "outage_secs": self.outage_secs + down,
+            "attempts": self.attempts,
+            "backlog_tags": unsent,
+            "ring_bytes": ring_bytes,
+            "lost": self.lost,
+            "skipped": self.skipped,
+        }
+
+
+class RtmpOut(Output):
+    """Stream to RTMP server"""
+
+    def mksink(self) -> Gst.Element:
+        sink = Gst.ElementFactory.make("rtmpsink", None)
+        sink.set_property("location", f"{self.location} live=1")
+        return sink
+
+
+class FileOut(Output):
+    """Record FLV file"""
+
+    continues = True  # Appended to after an error
+
+    def mksink(self) -> Gst.Element:
+        sink = Gst.ElementFactory.make("filesink", None)
+        sink.set_property("location", self.location)
+        sink.set_property("append", True)  # when restarted after error
+        return sink
+
+    def headers(self) -> Tuple[Gst.Buffer, ...]:
+        if self.attempts > 1 or self.caps is None:
+            return ()
+        return tuple(
+            self.caps.get_structure(0).get_value("streamheader") or ()
+        )
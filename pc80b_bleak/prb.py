@@ -0,0 +1,229 @@
+"""Pad probes measuring time that buffers spend in pipeline elements"""
+
+from __future__ import annotations
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic_ns, perf_counter_ns
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("Gst", "1.0")
+# pylint: disable=wrong-import-position
+from gi.repository import Gst  # type: ignore [import-untyped]
+
+# pylint: disable=missing-function-docstring
+
+NBUCKETS = 32  # Power-of-two microsecond buckets, up to ~35 minutes
+MAXPENDING = 256
+MAXSTAMPS = 512
+CAPTURE = Gst.Caps.from_string("timestamp/x-pc80b-capture")
+
+
+class Histogram:
+    """Log2 histogram of durations in nanoseconds, constant memory"""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * NBUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns: int) -> None:
+        ns = max(ns, 0)
+        self.buckets[min((ns // 1000).bit_length(), NBUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+        self.max = max(self.max, ns)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> int:
+        """
+        Estimate of q-th quantile, in ns, interpolated linearly within
+        the bucket that contains it, as if its durations were spread
+        evenly between the bounds. Never more than the maximum.
+        """
+        need = q * self.count
+        acc = 0
+        for i, n in enumerate(self.buckets):
+            if n and acc + n >= need:
+                lo = (1 << i - 1) * 1000 if i else 0
+                hi = min((1 << i) * 1000, self.max)
+                return round(lo + (hi - lo) * max(need - acc, 0) / n)
+            acc += n
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Statistics in milliseconds"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean / 1e6,
+            "p50": self.quantile(0.5) / 1e6,
+            "p95": self.quantile(0.95) / 1e6,
+            "max": self.max / 1e6,
+        }
+
+
+def buffers(info: Gst.PadProbeInfo) -> Iterator[Gst.Buffer]:
+    """Buffers carried by probe info, whether it is a buffer or a list"""
+    if info.type & Gst.PadProbeType.BUFFER_LIST:
+        lst = info.get_buffer_list()
+        for i in range(lst.length()):
+            yield lst.get(i)
+    else:
+        yield info.get_buffer()
+
+
+class StageTimer:
+    """
+    Measure wall time between a buffer entering the element's sink pad
+    and leaving its src pad. Buffers are matched by their pts, which is
+    preserved by converters and (with zero latency tuning) by encoders.
+    """
+
+    def __init__(self, element: Gst.Element) -> None:
+        self.hist = Histogram()
+        self.recent = Histogram()  # Since the last call to window()
+        self.pending: OrderedDict[int, int] = OrderedDict()
+        self.attach(element)
+
+    def attach(self, element: Gst.Element) -> None:
+        """Start measuring (possibly replaced) element"""
+        mask = Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST
+        element.get_static_pad("sink").add_probe(mask, self.on_enter)
+        element.get_static_pad("src").add_probe(mask, self.on_leave)
+
+    def on_enter(self, _pad: Gst.Pad, info: Gst.PadProbeInfo) -> Any:
+        now = perf_counter_ns()
+        for buf in buffers(info):
+            self.pending[buf.pts] = now
+        while len(self.pending) > MAXPENDING:
+            self.pending.popitem(last=False)
+        return Gst.PadProbeReturn.OK
+
+    def on_leave(self, _pad: Gst.Pad, info: Gst.PadProbeInfo) -> Any:
+        now = perf_counter_ns()
+        for buf in buffers(info):
+            start = self.pending.pop(buf.pts, None)
+            if start is not None:
+                self.hist.add(now - start)
+                self.recent.add(now - start)
+        return Gst.PadProbeReturn.OK
+
+    def summary(self) -> Dict[str, float]:
+        return self.hist.summary()
+
+    def window(self) -> Histogram:
+        """Measurements since the previous call"""
+        recent, self.recent = self.recent, Histogram()
+        return recent
+
+
+class GapMeter:
+    """
+    Measure wall time intervals between buffers passing the pad, to see
+    if reconfiguration of the pipeline causes gaps in the output stream.
+    """
+
+    def __init__(self, pad: Gst.Pad) -> None:
+        self.hist = Histogram()
+        self.last = 0
+        pad.add_probe(
+            Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST,
+            self.on_buffer,
+        )
+
+    def on_buffer(self, _pad: Gst.Pad, _info: Gst.PadProbeInfo) -> Any:
+        now = perf_counter_ns()
+        if self.last:
+            self.hist.add(now - self.last)
+        self.last = now
+        return Gst.PadProbeReturn.OK
+
+    def summary(self) -> Dict[str, float]:
+        return self.hist.summary()
+
+
+class LatencyTracer:
+    """
+    Latency from the capture of samples (arrival of BLE notification,
+    on the monotonic clock) to points in the pipeline. Capture time of
+    the newest sample in the frame travels with the buffer as reference
+    timestamp meta. Where it gets lost (in the muxer), it is looked up
+    by the buffer's pts.
+    """
+
+    def __init__(self) -> None:
+        self.hists: Dict[str, Histogram] = {}
+        self.recent: Dict[str, Histogram] = {}  # Since window(stage)
+        self.lock = Lock()
+        self.pts: List[int] = []  # increasing
+        self.captured: List[int] = []
+
+    def record(self, stage: str, captured: int, now: int = 0) -> None:
+        lat = (now or monotonic_ns()) - captured
+        with self.lock:
+            if stage not in self.hists:
+                self.hists[stage] = Histogram()
+                self.recent[stage] = Histogram()
+            self.hists[stage].add(lat)
+            self.recent[stage].add(lat)
+
+    def window(self, stage: str) -> Histogram:
+        """Measurements at the stage since the previous call"""
+        with self.lock:
+            recent = self.recent.get(stage, Histogram())
+            self.recent[stage] = Histogram()
+        return recent
+
+    def stamp(self, buf: Gst.Buffer, captured: int, pts: int) -> None:
+        """
+        Attach capture time to the buffer that is being pushed. The pts
+        converted to the monotonic clock is recorded as "timestamp".
+        """
+        buf.add_reference_timestamp_meta(
+            CAPTURE, captured, Gst.CLOCK_TIME_NONE
+        )
+        with self.lock:
+            self.pts.append(buf.pts)
+            self.captured.append(captured)
+            if len(self.pts) > MAXSTAMPS:
+                del self.pts[: MAXSTAMPS // 2]
+                del self.captured[: MAXSTAMPS // 2]
+        self.record("render", captured)
+        self.record("timestamp", captured, pts)
+
+    def lookup(self, buf: Gst.Buffer) -> Optional[int]:
+        meta = buf.get_reference_timestamp_meta(CAPTURE)
+        if meta is not None:
+            return int(meta.timestamp)
+        with self.lock:
+            i = bisect_right(self.pts, buf.pts) - 1
+            return self.captured[i] if i >= 0 else None
+
+    def watch(
+        self,
+        stage: str,
+        pad: Gst.Pad,
+        accept: Callable[[Gst.Buffer], bool] = lambda _: True,
+    ) -> None:
+        """Record latency of (accepted) buffers passing the pad"""
+
+        def probe(_pad: Gst.Pad, info: Gst.PadProbeInfo) -> Any:
+            for buf in buffers(info):
+                if accept(buf) and (captured := self.lookup(buf)):
+                    self.record(stage, captured)
+            return Gst.PadProbeReturn.OK
+
+        pad.add_probe(
+            Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST, probe
+        )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: hist.summary() for stage, hist in self.hists.items()}
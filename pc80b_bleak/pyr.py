@@ -0,0 +1,146 @@
+"""Min/max pyramid of the whole session, for the history view"""
+
+from threading import Lock
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+# pylint: disable=missing-function-docstring
+
+FAN = 4  # Entries of a level combined into one entry of the next level
+LEVELS = 10  # The top one has an entry per 4^9 samples, ~30 minutes
+CAPACITY = 1 << 17  # Entries per level, the bottom one is ~15 minutes
+
+Pair = Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]
+
+
+class Level:
+    """Ring of min/max entries, each covering a fixed number of samples"""
+
+    def __init__(self, span: int) -> None:
+        self.span = span  # Samples per entry
+        self.lo = np.zeros(CAPACITY)
+        self.hi = np.zeros(CAPACITY)
+        self.count = 0  # Entries ever added, entry i is at i % CAPACITY
+        self.pending: Pair = (np.empty(0), np.empty(0))
+
+    def add(
+        self, lo: npt.NDArray[np.float64], hi: npt.NDArray[np.float64]
+    ) -> Pair:
+        """Store entries, return completed entries of the next level"""
+        idx = np.arange(self.count, self.count + len(lo)) % CAPACITY
+        self.lo[idx] = lo
+        self.hi[idx] = hi
+        self.count += len(lo)
+        plo = np.concatenate((self.pending[0], lo))
+        phi = np.concatenate((self.pending[1], hi))
+        full = len(plo) // FAN * FAN
+        self.pending = (plo[full:], phi[full:])
+        return (
+            plo[:full].reshape(-1, FAN).min(axis=1),
+            phi[:full].reshape(-1, FAN).max(axis=1),
+        )
+
+    @property
+    def first(self) -> int:
+        """Oldest entry still in the ring"""
+        return max(self.count - CAPACITY, 0)
+
+    def at(self, ids: npt.NDArray[np.int64]) -> Pair:
+        """Entries at ids, NaN where not (or no longer) kept"""
+        have = (ids >= self.first) & (ids < self.count)
+        lo = np.full(len(ids), np.nan)
+        hi = np.full(len(ids), np.nan)
+        lo[have] = self.lo[ids[have] % CAPACITY]
+        hi[have] = self.hi[ids[have] % CAPACITY]
+        return lo, hi
+
+    def fold(
+        self,
+        lo: npt.NDArray[np.float64],
+        hi: npt.NDArray[np.float64],
+        e0: npt.NDArray[np.int64],
+        e1: npt.NDArray[np.int64],
+    ) -> None:
+        """Combine entries from e0 to e1 into lo and hi, per column"""
+        for i in range(int((e1 - e0).max(initial=0))):
+            use = e0 + i < e1
+            elo, ehi = self.at(e0[use] + i)
+            lo[use] = np.fmin(lo[use], elo)
+            hi[use] = np.fmax(hi[use], ehi)
+
+
+class Pyramid:
+    """
+    History of the session at resolutions from one sample up to FAN^9
+    samples per entry. Each level is a ring of CAPACITY entries, so the
+    memory is bounded, and the coarse levels reach back further than the
+    fine ones. It is built incrementally, a packet at a time. A query
+    covers each column with the coarsest entries that fit in it, and
+    finer ones at its edges and at the incomplete end, at most FAN - 1
+    of them per level and edge. So it costs in proportion to the number
+    of pixels, whatever the range. It is added to by the thread of the
+    source and queried by the GUI, hence the lock.
+    """
+
+    def __init__(self) -> None:
+        self.levels: List[Level] = [Level(FAN**k) for k in range(LEVELS)]
+        self.lock = Lock()
+
+    @property
+    def nsamp(self) -> int:
+        """Samples added so far"""
+        return self.levels[0].count
+
+    def add(self, vals: npt.NDArray[np.float64]) -> None:
+        lo = hi = np.asarray(vals, dtype=np.float64)
+        with self.lock:
+            for level in self.levels:
+                if not lo.size:
+                    break
+                lo, hi = level.add(lo, hi)
+
+    def query(  # pylint: disable=too-many-locals
+        self, start: float, end: float, npix: int
+    ) -> Pair:
+        """
+        Minimum and maximum for npix columns evenly covering samples
+        from start to end (counted from the start of the session), NaN
+        for the columns with no data. Each column takes exactly the
+        samples that it overlaps, except where the finer levels no
+        longer keep them and coarser entries stand in. Zoomed in beyond
+        one sample per pixel, columns repeat the samples.
+        """
+        with self.lock:
+            bounds = start + (end - start) / npix * np.arange(npix + 1)
+            first = np.floor(bounds[:-1])
+            # Entries of the current level that each column still needs
+            e0 = np.clip(first, 0, self.nsamp).astype(np.int64)
+            e1 = np.clip(
+                np.maximum(np.ceil(bounds[1:]), first + 1), 0, self.nsamp
+            ).astype(np.int64)
+            lo = np.full(npix, np.nan)
+            hi = np.full(npix, np.nan)
+            for k, level in enumerate(self.levels):
+                if k == len(self.levels) - 1:  # The rest from the top level
+                    level.fold(lo, hi, e0, e1)
+                    break
+                # Entries that the next level has combined are left to it,
+                # as far as they are aligned with its entries
+                done = self.levels[k + 1].count * FAN
+                up = -(-e0 // FAN) * FAN
+                down = np.minimum(e1, done) // FAN * FAN
+                # Where this level no longer has the edges, the next one
+                # covers a little more than the column
+                up = np.where(e0 < level.first, e0 // FAN * FAN, up)
+                down = np.where(
+                    down < level.first,
+                    np.minimum(-(-e1 // FAN) * FAN, done),
+                    down,
+                )
+                mid = np.minimum(up, e1)
+                level.fold(lo, hi, e0, mid)
+                level.fold(lo, hi, np.maximum(down, mid), e1)
+                e0, e1 = up // FAN, np.maximum(down, up) // FAN
+            return lo, hi
@@ -0,0 +1,202 @@
+"""Streaming QRS detector and heart rate, after Pan and Tompkins"""
+
+from collections import deque
+from sys import argv
+from typing import Deque, List, NamedTuple, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from .cfg import VALS_PER_SEC
+from .flt import Filter, highpass, lowpass
+from .rec import load
+
+# pylint: disable=missing-function-docstring
+
+FS = VALS_PER_SEC
+BAND = (5.0, 15.0)  # Hz, where the energy of QRS is
+MWI = 22  # Moving integration window, 150 ms
+LOCATE = 40  # R peak is searched for this far before the MWI peak
+REFRACTORY = 30  # 200 ms
+TWAVE = 54  # Within 360 ms of a beat, a peak may be a T wave
+LEARN = 2 * FS  # Thresholds are initialised from the first 2 seconds
+SEARCHBACK = 1.66  # Look for a missed beat after this many RR intervals
+RRAVG = 8  # Beats in the average
+ASYSTOLE = 3 * FS  # No heart rate without a beat for 3 seconds
+
+Array = npt.NDArray[np.float64]
+
+
+class Beat(NamedTuple):
+    """Detected R peak"""
+
+    sample: int  # Sample number from the start of the stream
+    rr: float  # Seconds since the previous beat, zero for the first one
+    hr: float  # Beats per minute, average over the last RRAVG intervals
+
+
+class Candidate(NamedTuple):
+    """Peak of the integrated signal"""
+
+    peak: float
+    rpos: int  # R peak in the band-passed signal
+    slope: float  # Maximum of the derivative around it
+
+
+class Detector:  # pylint: disable=too-many-instance-attributes
+    """
+    Band-pass, derivative, squaring and moving window integration are
+    done on the whole packet with array operations, carrying the tails
+    of the intermediate signals between packets. Only the local maxima
+    of the integrated signal, a few per packet, go through the adaptive
+    thresholds with refractory period, T wave rejection and searchback.
+    State is bounded, and the latency of a beat is about the length of
+    the integration window.
+    """
+
+    def __init__(self) -> None:
+        self.bp = Filter([highpass(BAND[0]), lowpass(BAND[1])])
+        tail = LOCATE + 2
+        self.bptail = np.zeros(tail)
+        self.dtail = np.zeros(tail)
+        self.sqtail = np.zeros(MWI - 1)
+        self.mtail = np.zeros(2)
+        self.n = 0  # Samples processed
+        self.learnmax = 0.0
+        self.learnsum = 0.0
+        self.spki = 0.0
+        self.npki = 0.0
+        self.last: Optional[Candidate] = None  # The last beat
+        self.best: Optional[Candidate] = None  # for searchback
+        self.rrs: Deque[int] = deque(maxlen=RRAVG)
+
+    @property
+    def threshold(self) -> float:
+        return self.npki + 0.25 * (self.spki - self.npki)
+
+    @property
+    def hr(self) -> float:
+        """Average heart rate, zero if not known or not beating"""
+        if self.last is None or self.n - self.last.rpos > ASYSTOLE:
+            return 0.0
+        return self.rravg_hr()
+
+    def rravg_hr(self) -> float:
+        return 60.0 * FS * len(self.rrs) / sum(self.rrs) if self.rrs else 0.0
+
+    def feed(  # pylint: disable=too-many-locals
+        self, vals: Array
+    ) -> List[Beat]:
+        """Process a packet of samples, return beats detected in it"""
+        n0 = self.n
+        tail = len(self.bptail)
+        bpx = np.concatenate((self.bptail, self.bp(vals)))
+        d = (
+            2 * bpx[tail:]
+            + bpx[tail - 1 : -1]
+            - bpx[tail - 3 : -3]
+            - 2 * bpx[tail - 4 : -4]
+        ) / 8
+        dx = np.concatenate((self.dtail, d))
+        sqx = np.concatenate((self.sqtail, d * d))
+        csum = np.cumsum(np.concatenate(((0.0,), sqx)))
+        mwi = (csum[MWI:] - csum[:-MWI]) / MWI
+        mx = np.concatenate((self.mtail, mwi))
+        self.bptail = bpx[-tail:]
+        self.dtail = dx[-tail:]
+        self.sqtail = sqx[-(MWI - 1) :]
+        self.mtail = mx[-2:]
+        self.n += len(vals)
+        if n0 < LEARN:
+            self.learn(mwi[: LEARN - n0])
+        # Local maxima, the last sample is checked with the next packet
+        peaks = np.flatnonzero((mx[1:-1] > mx[:-2]) & (mx[1:-1] >= mx[2:])) + 1
+        beats = []
+        for j in peaks.tolist():
+            k = n0 - 2 + j  # Sample number of the peak
+            if k < LEARN:
+                continue
+            # Positions in bpx and dx
+            lo, hi = k - LOCATE + 1 - (n0 - tail), k + 1 - (n0 - tail)
+            cand = Candidate(
+                peak=float(mx[j]),
+                rpos=k - LOCATE + 1 + int(np.argmax(np.abs(bpx[lo:hi]))),
+                slope=float(np.max(np.abs(dx[lo:hi]))),
+            )
+            if (beat := self.classify(cand)) is not None:
+                beats.append(beat)
+        if (beat := self.searchback()) is not None:
+            beats.append(beat)
+        return beats
+
+    def gap(self) -> None:
+        """Samples were lost: the next interval is not an RR interval"""
+        self.last = None
+        self.best = None
+
+    def learn(self, mwi: Array) -> None:
+        self.learnmax = max(self.learnmax, float(mwi.max(initial=0.0)))
+        self.learnsum += float(mwi.sum())
+        if self.n >= LEARN:
+            self.spki = self.learnmax / 3
+            self.npki = self.learnsum / LEARN / 2
+
+    def classify(self, cand: Candidate) -> Optional[Beat]:
+        if self.last is not None:
+            since = cand.rpos - self.last.rpos
+            if since < REFRACTORY:
+                return None
+            if since < TWAVE and cand.slope < self.last.slope / 2:
+                self.npki += 0.125 * (cand.peak - self.npki)
+                return None
+        if cand.peak > self.threshold:
+            self.spki += 0.125 * (cand.peak - self.spki)
+            return self.beat(cand)
+        self.npki += 0.125 * (cand.peak - self.npki)
+        if cand.peak > self.threshold / 2 and (
+            self.best is None or cand.peak > self.best.peak
+        ):
+            self.best = cand
+        return None
+
+    def searchback(self) -> Optional[Beat]:
+        """Take the best of rejected peaks if a beat seems to be missed"""
+        if self.last is None or self.best is None or not self.rrs:
+            return None
+        rravg = sum(self.rrs) / len(self.rrs)
+        if self.n - self.last.rpos < SEARCHBACK * rravg:
+            return None
+        cand = self.best
+        self.spki += 0.25 * (cand.peak - self.spki)
+        return self.beat(cand)
+
+    def beat(self, cand: Candidate) -> Beat:
+        rr = 0
+        if self.last is not None:
+            rr = cand.rpos - self.last.rpos
+            self.rrs.append(rr)
+        self.last = cand
+        self.best = None
+        return Beat(sample=cand.rpos, rr=rr / FS, hr=self.rravg_hr())
+
+
+def detect(vals: Array, packet: int = 1024) -> List[Beat]:
+    """Beats in a recorded session, processed in big packets"""
+    det = Detector()
+    return [
+        beat
+        for i in range(0, len(vals), packet)
+        for beat in det.feed(vals[i : i + packet])
+    ]
+
+
+def main() -> None:
+    """Print beats found in recordings named on the command line"""
+    for path in argv[1:]:
+        print(path)
+        for beat in detect(load(path)):
+            print(f"{beat.sample / FS:10.3f} {beat.rr:6.3f} {beat.hr:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
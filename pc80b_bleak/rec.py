@@ -0,0 +1,15 @@
+"""Recorded sessions, for running analysis over them offline"""
+
+import numpy as np
+import numpy.typing as npt
+
+# pylint: disable=missing-function-docstring
+
+
+def load(path: str) -> npt.NDArray[np.float64]:
+    """
+    Samples from a text recording like those in sample-data: one sample
+    per line, time in seconds and value in millivolts, then two unused
+    columns.
+    """
+    return np.loadtxt(path, usecols=1, ndmin=1, dtype=np.float64)
@@ -0,0 +1,81 @@
+"""Vertical scale following the amplitude of the signal"""
+
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from .cfg import VALS_PER_SEC
+
+# pylint: disable=missing-function-docstring
+
+RANGES = (0.5, 1.0, 2.5, 5.0)  # mV from the middle to the edge
+DEFAULT = 2.5
+QUANTILE = 0.999  # of absolute values, "the peaks" ignoring spikes
+HALFLIFE = 10 * VALS_PER_SEC  # Samples, for the weight in the sketch
+HEADROOM = 1.25  # Peaks should take no more than 80% of the range
+HOLD = 5 * VALS_PER_SEC  # Samples the new range must persist to switch
+SKETCH_MIN = 0.001  # mV, the lowest bin
+OCTAVES = 17
+PER_OCTAVE = 8  # Bins, relative error of a quantile under 9%
+
+
+class Sketch:
+    """
+    Histogram of absolute values in logarithmic bins, with old samples
+    fading out exponentially. Adding a sample and taking a quantile both
+    cost the same whatever the history.
+    """
+
+    def __init__(self) -> None:
+        self.bins = np.zeros(OCTAVES * PER_OCTAVE)
+
+    def add(self, vals: npt.NDArray[np.float64]) -> None:
+        self.bins *= 0.5 ** (len(vals) / HALFLIFE)
+        idx = np.log2(np.maximum(np.abs(vals), SKETCH_MIN) / SKETCH_MIN)
+        np.add.at(
+            self.bins,
+            np.minimum(
+                (idx * PER_OCTAVE).astype(np.int64), len(self.bins) - 1
+            ),
+            1.0,
+        )
+
+    def quantile(self, q: float) -> float:
+        acc = np.cumsum(self.bins)
+        if not acc[-1]:
+            return 0.0
+        i = int(np.searchsorted(acc, q * acc[-1]))
+        return float(SKETCH_MIN * 2 ** ((i + 1) / PER_OCTAVE))  # upper edge
+
+
+class AutoRange:  # pylint: disable=too-few-public-methods
+    """
+    Choose the smallest of RANGES that fits the recent peaks with some
+    headroom. A different range is taken only when it has been the
+    choice for HOLD samples, so the grid does not jump with every beat.
+    """
+
+    def __init__(self, current: float = DEFAULT) -> None:
+        self.sketch = Sketch()
+        self.current = current
+        self.candidate = current
+        self.held = 0
+
+    def feed(self, vals: npt.NDArray[np.float64]) -> Optional[float]:
+        """Add samples, return new range if it is time to switch"""
+        self.sketch.add(vals)
+        peak = self.sketch.quantile(QUANTILE) * HEADROOM
+        want = next((r for r in RANGES if r >= peak), RANGES[-1])
+        if want == self.current:
+            self.held = 0
+            return None
+        if want != self.candidate:
+            self.candidate = want
+            self.held = 0
+        self.held += len(vals)
+        if self.held < HOLD:
+            return None
+        self.current = want
+        self.held = 0
+        return want
@@ -1,158 +0,0 @@
-"""One second worth of ECG samples to generate test stream"""
-
-from typing import Tuple
-
-__all__ = ("sample",)
-
-sample: Tuple[float, ...] = (
-    0,
-    0,
-    0,
-    0.00322,
-    0.00322,
-    0.00322,
-    -0.00162,
-    -0.00644,
-    -0.00644,
-    -0.00322,
-    0,
-    0,
-    -0.00162,
-    0,
-    0,
-    0,
-    0,
-    0,
-    0,
-    0,
-    0,
-    0.00484,
-    0.01128,
-    0.0129,
-    0.00968,
-    0.00968,
-    0.0129,
-    0.01934,
-    0.02096,
-    0.01612,
-    0.00484,
-    0,
-    -0.00322,
-    -0.00806,
-    -0.0129,
-    -0.01774,
-    -0.01934,
-    -0.01612,
-    -0.00484,
-    0.00484,
-    -0.00484,
-    -0.03546,
-    -0.03868,
-    0.07898,
-    0.35142,
-    0.65448,
-    0.77214,
-    0.59644,
-    0.23858,
-    -0.06448,
-    -0.16926,
-    -0.11122,
-    -0.0274,
-    0.00644,
-    -0.00322,
-    -0.01612,
-    -0.01612,
-    -0.00968,
-    -0.00322,
-    0,
-    0.00322,
-    0.00322,
-    0.00322,
-    0.00322,
-    0.00644,
-    0.0129,
-    0.01934,
-    0.02418,
-    0.0258,
-    0.02902,
-    0.03386,
-    0.03868,
-    0.04514,
-    0.0532,
-    0.06448,
-    0.07898,
-    0.09672,
-    0.11446,
-    0.13218,
-    0.1467,
-    0.15958,
-    0.17732,
-    0.20472,
-    0.23536,
-    0.2676,
-    0.28854,
-    0.29984,
-    0.30466,
-    0.30628,
-    0.3095,
-    0.3079,
-    0.29822,
-    0.27404,
-    0.2289,
-    0.17248,
-    0.11122,
-    0.0532,
-    0.03708,
-    0.03062,
-    0.00484,
-    -0.00806,
-    -0.01934,
-    -0.0274,
-    -0.03386,
-    -0.03708,
-    -0.03546,
-    -0.03386,
-    -0.03224,
-    -0.03224,
-    -0.03062,
-    -0.0274,
-    -0.0258,
-    -0.0258,
-    -0.02418,
-    -0.02256,
-    -0.02256,
-    -0.02418,
-    -0.0258,
-    -0.02418,
-    -0.02096,
-    -0.01774,
-    -0.01774,
-    -0.01774,
-    -0.02096,
-    -0.02256,
-    -0.02256,
-    -0.01774,
-    -0.01128,
-    -0.00806,
-    -0.00968,
-    -0.0145,
-    -0.01934,
-    -0.01934,
-    -0.01612,
-    -0.0145,
-    -0.0145,
-    -0.0129,
-    -0.01128,
-    -0.00968,
-    -0.00968,
-    -0.0129,
-    -0.0145,
-    -0.01128,
-    -0.00644,
-    0.00162,
-    0.00322,
-    0.00162,
-    -0.00162,
-    -0.00322,
-    0,
-)
@@ -1,26 +1,34 @@
 """Conduit for passing received data to the consumer"""
 
-from collections import deque
+from collections import OrderedDict
 from datetime import datetime
-from itertools import repeat
+from sys import stderr
 from time import time_ns
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple, Union
 from cairo import (  # pylint: disable=no-name-in-module
     Context,
     ImageSurface,
     FORMAT_ARGB32,
 )
+import numpy as np
+import numpy.typing as npt
 
 import gi  # type: ignore [import-untyped]
 
+gi.require_version("GLib", "2.0")
 gi.require_version("Gst", "1.0")
 # pylint: disable=wrong-import-position
-from gi.repository import Gst  # type: ignore [import-untyped]
+from gi.repository import GLib, Gst  # type: ignore [import-untyped]
 
-from .src import Source
+from .alr import Alerts
+from .bus import Bus, Overflow
+from .cfg import Params, Stress
+from .shm import ProcSource
+from .src import LoopSource, Source, glib_loop, open_source
 from .datatypes import (
     Channel,
     Event,
+    EventCrcError,
     EventPc80bContData,
     EventPc80bFastData,
     EventPc80bHeartbeat,
@@ -29,18 +37,20 @@ from .datatypes import (
     MStage,
 )
 from .drw import Drw, FrameMeta
-from .gst import Pipe
+from .flt import make_filter
+from .gst import Pipe, still_frame
+from .pyr import Pyramid
+from .hrv import Hrv, Summary
+from .qrs import Detector
+from .rng import AutoRange
 
 # pylint: disable=missing-function-docstring
 
-FRAMES_PER_SEC = 30
-VALS_PER_SEC = 150
-SECS_ON_SCREEN = 3
+BLINK = 30  # Samples, for how long the heart is shown after a beat
 
-VALS_ON_SCREEN = VALS_PER_SEC * SECS_ON_SCREEN
-VALS_PER_FRAME = VALS_PER_SEC // FRAMES_PER_SEC
-SAMPDUR = 1_000_000_000 // VALS_PER_SEC
-FRAMEDUR = 1_000_000_000 // FRAMES_PER_SEC
+STANDBY_CACHE = 8  # Distinct status messages kept as ready frames
+
+REPORT_SECS = 5  # How often the stress test prints how downstream keeps up
 
 
 class Signal:
@@ -48,38 +58,168 @@ class Signal:
 
     # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, crt_w: int, crt_h: int) -> None:
-        self.crt_w = crt_w
-        self.crt_h = crt_h
-        self.datathread: Optional[Source] = None
+    def __init__(self, params: Params) -> None:
+        self.params = params
+        self.crt_w = params.crt_w
+        self.crt_h = params.crt_h
+        self.datathread: Optional[Union[Source, LoopSource, ProcSource]] = None
+        # Sources report to the bus, and the bus to this and any other
+        # subscribers, each in its own thread. Analysis needs continuous
+        # data: if it falls behind, it gets the queued events, then the
+        # gap is reported, and what comes after it. When sources run in
+        # the GLib main loop, this is called by them directly.
+        self.bus = Bus()
+        self.bus.subscribe(
+            "render",
+            self,
+            overflow=Overflow.drop_newest,
+            inline=glib_loop() is not None and not params.process,
+        )
+        self.switching = False  # Stopping a source lets GUI handlers run
+        self.gaps = 0  # Data events dropped before they got here
+        self.others = 0  # Events of other devices, not analysed
+        self.reporter = 0
         self.status = (False, "Uninitialised")
-        self.data = deque(repeat(0.0, VALS_ON_SCREEN), maxlen=VALS_ON_SCREEN)
-        self.samppos = 0
+        # Ring of samples on screen, position in it is the screen column
+        self.data = np.zeros(params.vals_on_screen)
+        self.stored = 0  # Samples put in the ring, modulo is the position
+        self.filter = make_filter(params)
+        self.qrs = Detector()
+        self.hrv = Hrv()
+        self.hrvsum: Tuple[Summary, ...] = ()  # Updated on beats only
+        self.alerts = Alerts()
+        self.autorange = AutoRange() if params.autorange else None
+        # Beats are known with the delay of the detector, the heart is
+        # shown from the first sample of the packet where one was found.
+        self.lastbeat = -BLINK
+        self.history = Pyramid()  # The whole session, for looking back
+        self.nsamp = 0  # Samples received, to split them between frames
         self.battery = 0
         self.dtime = datetime.now()
         self.last_data = 0
+        # Set by appsrc "enough-data", cleared by "need-data". While set,
+        # samples still go to the trace, but frames are not rendered.
+        self.congested = False
+        self.frames = 0
+        self.dropped = 0
+        self.standby: OrderedDict[str, Gst.Buffer] = OrderedDict()
 
     def cleardata(self) -> None:
-        self.samppos = 0
+        self.stored = 0
+        self.drw.redraw()
+
+    def store(self, vals: npt.NDArray[np.float64]) -> None:
+        pos = self.stored
+        np.put(self.data, range(pos, pos + len(vals)), vals, mode="wrap")
+        self.stored = pos + len(vals)
 
     def start(self, state: bool) -> None:
-        if self.datathread is not None:
-            self.datathread.stop()
-            self.datathread.join()
-        self.datathread = Source(self, test=state)
-        self.datathread.start()
+        self.switch(state)
 
     def stop(self) -> None:
+        self.switch(None)
+
+    def switch(self, state: Optional[bool]) -> None:
+        """Stop the source, and start a test or BLE one unless None"""
+        if self.switching:
+            print("Source is being switched, ignoring", state)
+            return
+        self.switching = True
+        try:
+            self.halt()
+            if state is not None:
+                self.restart(state)
+        finally:
+            self.switching = False
+
+    def restart(self, state: bool) -> None:
+        self.filter.reset()
+        self.qrs = Detector()
+        self.hrv = Hrv()
+        self.hrvsum = ()
+        self.lastbeat = -BLINK
+        self.nsamp = 0
+        self.alerts.idle()  # Durations count samples of this acquisition
+        self.datathread = open_source(
+            self.bus,
+            test=state,
+            process=self.params.process,
+            stress=self.params.stress,
+        )
+        self.datathread.start()
+        if state and self.params.stress != Stress():
+            self.reporter = GLib.timeout_add_seconds(REPORT_SECS, self.report)
+
+    def halt(self) -> None:
+        if self.reporter:
+            GLib.source_remove(self.reporter)
+            self.reporter = 0
         if self.datathread is not None:
-            self.datathread.stop()  # it joins
+            self.datathread.stop()  # returns when the source is finished
             self.datathread = None
+        # Nothing of this session is handled after this point
+        self.bus.flush("render")
+
+    def report_gap(self, dropped: int) -> None:
+        """Samples are missing here, do not analyse across them"""
+        self.gaps += dropped
+        self.filter.reset()
+        self.qrs.gap()
+        self.hrv.gap()
+
+    def report(self) -> bool:
+        """One line of the stress test: source, bus and rendering"""
+        stats = self.stats()
+        print(
+            "STRESS",
+            stats.get("source"),
+            "bus",
+            stats["bus"],
+            "frames",
+            stats["frames"],
+            "dropped",
+            stats["dropped"],
+            file=stderr,
+        )
+        return True
 
     def report_status(self, receiving: bool, details: str) -> None:
         self.status = (receiving, details)
-        if not receiving:
-            self.clearscreen(details)
+        if receiving:
+            self.pipe.show_still(None)
+        else:
+            self.alerts.idle()
+            self.pipe.show_still(self.standby_frame(details))
+
+    def analyse(
+        self,
+        vals: npt.NDArray[np.float64],
+        fmeta: FrameMeta,
+        fin: bool,
+        rxtime: int,
+    ) -> FrameMeta:
+        """Feed filtered samples to the analysis, add results to fmeta"""
+        self.history.add(vals)
+        if self.autorange is not None and (mv := self.autorange.feed(vals)):
+            self.drw.set_range(mv)
+        if beats := self.qrs.feed(vals):
+            self.lastbeat = self.nsamp
+            self.hrv.feed(beats)
+            self.hrvsum = self.hrv.summaries()
+        if not fmeta.hr:  # Device does not always report it
+            fmeta = fmeta._replace(hr=round(self.qrs.hr))
+        if not fin:
+            self.alerts.data(
+                fmeta.leadoff, fmeta.hr, self.nsamp + len(vals), rxtime
+            )
+        return fmeta._replace(hrv=self.hrvsum, alerts=self.alerts.messages())
 
     def report_data(self, event: Event) -> None:
+        if event.device:
+            # Other emulated devices of the stress test load the source
+            # and the bus, but are not spliced into this one's signal.
+            self.others += 1
+            return
         if isinstance(event, (EventPc80bContData, EventPc80bFastData)):
             self.last_data = time_ns()
             if event.fin:
@@ -103,13 +243,24 @@ class Signal:
                     },
                 },
             )
+            vals = self.filter(np.asarray(event.ecgFloats))
+            fmeta = self.analyse(vals, fmeta, event.fin, event.rxtime)
+            framedur = self.params.framedur
+            # With frame rate not dividing the sample rate, frames take
+            # uneven number of samples. Boundaries are counted from the
+            # start of acquisition, so that there is no accumulated drift.
+            frame0 = self.params.frames_until(self.nsamp)
+            nframes = self.params.frames_until(self.nsamp + len(vals)) - frame0
             with self.pipe.listmaker() as dispense:
-                for i in range(len(event.ecgFloats) // VALS_PER_FRAME):
-                    o = i * VALS_PER_FRAME
-                    self.data.extend(event.ecgFloats[o : o + VALS_PER_FRAME])
-                    self.samppos += VALS_PER_FRAME
-                    if self.samppos >= VALS_ON_SCREEN:
-                        self.samppos = 0
+                o = 0
+                for i in range(nframes):
+                    e = self.params.samples_until(frame0 + i + 1) - self.nsamp
+                    self.store(vals[o:e])
+                    o = e
+                    if self.congested:
+                        self.dropped += 1
+                        continue
+                    self.frames += 1
                     with dispense() as (mem, setts):
                         image = ImageSurface.create_for_data(
                             mem, FORMAT_ARGB32, self.crt_w, self.crt_h
@@ -117,16 +268,27 @@ class Signal:
                         c = Context(image)
                         try:
                             self.drw.drawcurve(
-                                c, fmeta, self.data, self.samppos
+                                c,
+                                fmeta._replace(
+                                    beat=self.nsamp + e - self.lastbeat < BLINK
+                                ),
+                                self.data,
+                                self.stored,
                             )
                         finally:
                             del c
                             del image
-                        setts(FRAMEDUR, i * FRAMEDUR)
-                        # print("buf", i, "with ts", i * FRAMEDUR)
+                        setts(framedur, i * framedur, event.rxtime)
+                        # print("buf", i, "with ts", i * framedur)
+                # Leftover samples go to the screen with the next packet
+                self.store(vals[o:])
+                self.nsamp += len(vals)
             # print("buflist sent")
         elif isinstance(event, EventPc80bHeartbeat):
             self.battery = event.batt
+            self.alerts.battery(event.batt)
+        elif isinstance(event, EventCrcError):
+            self.alerts.crc_error(event.rxtime)
         elif isinstance(event, EventPc80bTime):
             self.dtime = event.datetime
             print("time event", self.dtime)
@@ -136,11 +298,15 @@ class Signal:
     def register_pipe(self, pipe: Pipe) -> None:
         # pylint: disable=attribute-defined-outside-init
         self.pipe = pipe
-        self.drw = Drw(self.crt_w, self.crt_h, VALS_ON_SCREEN, VALS_PER_SEC)
+        self.drw = Drw(self.params)
+        self.report_status(*self.status)
 
-    def clearscreen(self, msg: str) -> None:
-        with self.pipe.listmaker() as dispense:
-            with dispense() as (mem, setts):
+    def standby_frame(self, msg: str) -> Gst.Buffer:
+        """Frame with the message, rendered once while it stays cached"""
+        buf = self.standby.pop(msg, None)
+        if buf is None:
+
+            def paint(mem: memoryview) -> None:
                 image = ImageSurface.create_for_data(
                     mem, FORMAT_ARGB32, self.crt_w, self.crt_h
                 )
@@ -150,12 +316,35 @@ class Signal:
                 finally:
                     del c
                     del image
-                setts(FRAMEDUR, 0)
+
+            buf = still_frame(self.params.frame_bytes, paint)
+        self.standby[msg] = buf  # Most recently used go to the end
+        while len(self.standby) > STANDBY_CACHE:
+            self.standby.popitem(last=False)
+        return buf
 
     def on_need_data(self, _source: Gst.Element, _amount: int) -> None:
-        if not self.status[0]:
-            self.clearscreen(self.status[1])
-        # During acquisition, ignore need_data events
+        if self.congested:
+            print("Resuming after", self.dropped, "dropped frames total")
+            self.congested = False
+        # Standby frame is repeated by the pipeline at a low rate, and
+        # frames are pushed as data arrives, nothing to render here.
 
     def on_enough_data(self, _source: Gst.Element) -> None:
-        print("Uh-oh, got 'enough-data'")
+        # Downstream does not keep up. Stop rendering until appsrc queue
+        # drains, so that latency stays within the budget of the queue.
+        self.congested = True
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "gaps": self.gaps,
+            "others": self.others,
+            "hrv": self.hrv.stats(),
+            "hr_trend": list(self.hrv.trend),
+            "bus": self.bus.stats(),
+        }
+        if self.datathread is not None:
+            stats["source"] = self.datathread.stats()
+        return stats
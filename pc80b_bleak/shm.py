@@ -0,0 +1,262 @@
+"""Acquisition in a child process, passing data through shared memory"""
+
+from __future__ import annotations
+from asyncio import CancelledError, create_task, get_running_loop, run
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+from typing import Any, Dict, Iterator, Optional
+
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("GLib", "2.0")
+# pylint: disable=wrong-import-position
+from gi.repository import GLib  # type: ignore [import-untyped]
+
+from .ble import BleSrc
+from .bus import Consumer
+from .cfg import Stress
+from .datatypes import Event
+from .tst import TestSrc
+
+# pylint: disable=missing-function-docstring
+
+SIZE = 1 << 20  # Bytes of records, minutes of data at ~1 kB per packet
+POLL_MS = 20  # The parent drains the ring this often
+JOIN_SECS = 5  # Time for the child to disconnect before it is killed
+# Offsets in the header: the positions written by the two sides are in
+# separate cache lines.
+WPOS, DROPPED, RPOS, HEADER = 0, 8, 64, 128
+POS = Struct("<Q")
+LEN = Struct("<I")
+
+
+class Ring:
+    """
+    Single producer, single consumer ring of byte records in shared
+    memory. Positions are byte counters that only grow, the producer
+    writes the write position and the consumer the read position, each
+    after the record has been copied, so no lock is needed. Aligned
+    8 byte stores are atomic on the platforms we run on. When there is
+    no room, the producer drops the record and counts it: it must never
+    wait for the consumer.
+    """
+
+    def __init__(self, shm: SharedMemory, owner: bool) -> None:
+        self.shm = shm
+        self.owner = owner
+        assert shm.buf is not None
+        self.buf: memoryview = shm.buf
+        self.cap = shm.size - HEADER
+        self.wpos = self.load(WPOS)
+        self.rpos = self.load(RPOS)
+
+    @classmethod
+    def create(cls, size: int = SIZE) -> Ring:
+        # New shared memory is zero filled, that is an empty ring
+        return cls(SharedMemory(create=True, size=HEADER + size), True)
+
+    @classmethod
+    def attach(cls, name: str) -> Ring:
+        return cls(SharedMemory(name=name), False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def dropped(self) -> int:
+        return self.load(DROPPED)
+
+    @property
+    def depth(self) -> int:
+        return self.load(WPOS) - self.load(RPOS)
+
+    def load(self, off: int) -> int:
+        (val,) = POS.unpack_from(self.buf, off)
+        return int(val)
+
+    def store(self, off: int, val: int) -> None:
+        POS.pack_into(self.buf, off, val)
+
+    def write(self, pos: int, data: bytes) -> None:
+        i = pos % self.cap
+        first = min(len(data), self.cap - i)
+        self.buf[HEADER + i : HEADER + i + first] = data[:first]
+        self.buf[HEADER : HEADER + len(data) - first] = data[first:]
+
+    def read(self, pos: int, size: int) -> bytes:
+        i = pos % self.cap
+        first = min(size, self.cap - i)
+        return bytes(self.buf[HEADER + i : HEADER + i + first]) + bytes(
+            self.buf[HEADER : HEADER + size - first]
+        )
+
+    def put(self, rec: bytes) -> bool:
+        """Producer side. Return False if the record was dropped."""
+        size = LEN.size + len(rec)
+        if self.wpos + size - self.load(RPOS) > self.cap:
+            self.store(DROPPED, self.load(DROPPED) + 1)
+            return False
+        self.write(self.wpos, LEN.pack(len(rec)))
+        self.write(self.wpos + LEN.size, rec)
+        self.wpos += size
+        self.store(WPOS, self.wpos)  # Publish after the copy
+        return True
+
+    def get(self) -> Optional[bytes]:
+        """Consumer side, None if empty"""
+        if self.rpos == self.load(WPOS):
+            return None
+        (size,) = LEN.unpack(self.read(self.rpos, LEN.size))
+        rec = self.read(self.rpos + LEN.size, size)
+        self.rpos += LEN.size + size
+        self.store(RPOS, self.rpos)  # Release the room after the copy
+        return rec
+
+    def drain(self) -> Iterator[bytes]:
+        while (rec := self.get()) is not None:
+            yield rec
+
+    def close(self) -> None:
+        del self.buf
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingFeed:
+    """Consumer in the child: data to the ring, status to the pipe"""
+
+    def __init__(self, ring: Ring, conn: Connection) -> None:
+        self.ring = ring
+        self.conn = conn
+
+    def report_status(self, receiving: bool, details: str) -> None:
+        self.conn.send((receiving, details))
+
+    def report_data(self, event: Event) -> None:
+        self.ring.put(dumps(event, HIGHEST_PROTOCOL))
+
+
+async def serve(
+    feed: RingFeed, test: bool, device: Optional[str], stress: Stress
+) -> None:
+    task = create_task(
+        TestSrc(feed, stress).acquire()
+        if test
+        else BleSrc(feed, device).acquire()
+    )
+    loop = get_running_loop()
+
+    def on_stop() -> None:
+        # Anything from the parent means stop. Read it and stop watching
+        # the pipe, so that the task is cancelled once, and its cleanup
+        # (disconnecting the device) is not interrupted.
+        try:
+            feed.conn.recv()
+        except EOFError:
+            pass  # The parent is gone, stop all the same
+        loop.remove_reader(feed.conn.fileno())
+        task.cancel()
+
+    loop.add_reader(feed.conn.fileno(), on_stop)
+    try:
+        await task
+    except CancelledError:
+        pass
+    finally:
+        loop.remove_reader(feed.conn.fileno())
+
+
+def child(
+    name: str,
+    conn: Connection,
+    test: bool,
+    device: Optional[str],
+    stress: Stress,
+) -> None:
+    """Entry point of the acquisition process"""
+    ring = Ring.attach(name)
+    try:
+        run(serve(RingFeed(ring, conn), test, device, stress))
+    finally:
+        ring.close()
+        conn.close()
+
+
+class ProcSource:
+    """
+    Source running in a child process, so that the timing of BLE does
+    not depend on the load of rendering in this one. Decoded events come
+    through the shared memory ring, status changes and the stop request
+    through a pipe. Both are drained by a timer of the main loop, and
+    passed on to the consumer.
+    """
+
+    def __init__(
+        self,
+        consumer: Consumer,
+        test: bool,
+        device: Optional[str] = None,
+        stress: Stress = Stress(),
+    ) -> None:
+        self.consumer = consumer
+        self.ring = Ring.create()
+        ctx = get_context("spawn")  # Nothing of GTK in the child
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(
+            target=child,
+            args=(self.ring.name, child_conn, test, device, stress),
+            name="acquisition",
+            daemon=True,
+        )
+        self.timer = 0
+        self.received = 0
+
+    def start(self) -> None:
+        self.proc.start()
+        self.timer = GLib.timeout_add(POLL_MS, self.poll)
+
+    def poll(self) -> bool:
+        alive = True
+        try:
+            while self.conn.poll():
+                self.consumer.report_status(*self.conn.recv())
+        except (EOFError, OSError):
+            alive = False
+        for rec in self.ring.drain():
+            self.received += 1
+            self.consumer.report_data(loads(rec))
+        if not alive and self.timer:  # Not stopped by us
+            self.timer = 0
+            self.consumer.report_status(False, "Acquisition process exited")
+        return alive
+
+    def stop(self) -> None:
+        print("Source stop called")
+        if self.timer:
+            GLib.source_remove(self.timer)
+            self.timer = 0
+        if self.proc.is_alive():
+            self.conn.send(None)
+            self.proc.join(JOIN_SECS)
+        if self.proc.is_alive():
+            print("Acquisition process did not stop, killing")
+            self.proc.kill()
+            self.proc.join()
+        try:
+            self.poll()  # What came before the stop
+        finally:
+            self.conn.close()
+            self.ring.close()
+        print("Source process joined")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "dropped": self.ring.dropped,
+            "depth_bytes": self.ring.depth,
+        }
@@ -1,32 +1,161 @@
 """Source of samples: either BLE receiver or test source"""
 
 from __future__ import annotations
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Task,
+    get_event_loop_policy,
+    new_event_loop,
+    set_event_loop_policy,
+)
+from threading import Event as TEvent, Thread
+from typing import Any, Dict, Optional, Union
 
-from threading import Thread
-from typing import TYPE_CHECKING
+import gi  # type: ignore [import-untyped]
+
+gi.require_version("GLib", "2.0")
+# pylint: disable=wrong-import-position
+from gi.repository import GLib  # type: ignore [import-untyped]
+
+try:
+    from gi.events import GLibEventLoopPolicy  # type: ignore [import-untyped]
+except ImportError:  # PyGObject older than 3.50
+    GLibEventLoopPolicy = None  # pylint: disable=invalid-name
 
 from .ble import BleSrc
+from .bus import Consumer
+from .cfg import Stress
+from .shm import ProcSource
 from .tst import TestSrc
 
-if TYPE_CHECKING:
-    from .sgn import Signal
-
 # pylint: disable=missing-function-docstring
 
 
+def use_glib_loop() -> bool:
+    """
+    Make asyncio run on the GLib main context, if PyGObject supports it.
+    Must be called before the application runs. Return True if it does.
+    """
+    if GLibEventLoopPolicy is None:
+        return False
+    if not isinstance(get_event_loop_policy(), GLibEventLoopPolicy):
+        set_event_loop_policy(GLibEventLoopPolicy())
+    return True
+
+
+def glib_loop() -> Optional[AbstractEventLoop]:
+    """Event loop of the GLib main context, None if not in use"""
+    policy = get_event_loop_policy()
+    if GLibEventLoopPolicy is None or not isinstance(
+        policy, GLibEventLoopPolicy
+    ):
+        return None
+    loop: AbstractEventLoop = policy.get_event_loop()
+    return loop
+
+
+def make_src(
+    consumer: Consumer, test: bool, stress: Stress
+) -> Union[BleSrc, TestSrc]:
+    return TestSrc(consumer, stress) if test else BleSrc(consumer)
+
+
+def src_stats(src: Union[BleSrc, TestSrc]) -> Dict[str, Any]:
+    return src.stats() if isinstance(src, TestSrc) else {}
+
+
 class Source(Thread):
-    """Thread that submits samples, from BLE or test"""
+    """
+    Thread that runs the source in its own event loop. The loop and the
+    task belong to that thread: stop() only hands the cancellation over
+    with call_soon_threadsafe() and joins. Data leaves the thread through
+    the bus, that never blocks.
+    """
 
-    def __init__(self, signal: Signal, test: bool) -> None:
-        super().__init__()
-        self.src = TestSrc(signal) if test else BleSrc(signal)
+    def __init__(
+        self, consumer: Consumer, test: bool, stress: Stress = Stress()
+    ) -> None:
+        super().__init__(name="source")
+        self.src = make_src(consumer, test, stress)
+        self.loop = new_event_loop()
+        self.task: Optional[Task[Any]] = None
+        self.started = TEvent()
 
     def run(self) -> None:
-        self.src.run()
-        print("asyncio.run finished")
+        self.task = self.loop.create_task(self.src.acquire())
+        self.started.set()
+        try:
+            self.loop.run_until_complete(self.task)
+        except CancelledError:
+            pass
+        finally:
+            self.loop.close()
+        print("Source loop finished")
 
     def stop(self) -> None:
         print("Source stop called")
-        self.src.stop()
+        self.started.wait()
+        assert self.task is not None
+        self.loop.call_soon_threadsafe(self.task.cancel)
         self.join()
         print("Source thread joined")
+
+    def stats(self) -> Dict[str, Any]:
+        return src_stats(self.src)
+
+
+class LoopSource:
+    """
+    Source running as a task in the asyncio loop of the GLib main
+    context, i.e. in the thread of the GUI. Subscribers that are
+    subscribed inline get the events in this thread too, with no
+    handoff; others still get them through their bus threads. stop()
+    iterates the main context until the task is done, so that the device
+    is disconnected before a new source starts. Handlers of the GUI can
+    run in the meanwhile, the caller must not be re-entered.
+    """
+
+    def __init__(
+        self,
+        consumer: Consumer,
+        test: bool,
+        loop: AbstractEventLoop,
+        stress: Stress = Stress(),
+    ) -> None:
+        self.src = make_src(consumer, test, stress)
+        self.loop = loop
+        self.task: Optional[Task[Any]] = None
+
+    def start(self) -> None:
+        self.task = self.loop.create_task(self.src.acquire())
+
+    def stop(self) -> None:
+        print("Source stop called")
+        if self.task is None:
+            return
+        self.task.cancel()
+        context = GLib.MainContext.default()
+        while not self.task.done():
+            context.iteration(True)
+        print("Source task finished")
+
+    def stats(self) -> Dict[str, Any]:
+        return src_stats(self.src)
+
+
+def open_source(
+    consumer: Consumer,
+    test: bool,
+    process: bool = False,
+    stress: Stress = Stress(),
+) -> Union[Source, LoopSource, ProcSource]:
+    """
+    Source in a child process if asked for, otherwise in the GLib loop
+    if it runs asyncio, in a thread if it does not.
+    """
+    if process:
+        return ProcSource(consumer, test, stress=stress)
+    if (loop := glib_loop()) is not None:
+        return LoopSource(consumer, test, loop, stress)
+    return Source(consumer, test, stress)
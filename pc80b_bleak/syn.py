@@ -0,0 +1,204 @@
+"""Synthetic ECG with variable heart rate, noise and artifacts"""
+
+from sys import argv
+from typing import NamedTuple, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .cfg import VALS_PER_SEC
+
+# pylint: disable=missing-function-docstring
+
+FS = VALS_PER_SEC
+PRE = 0.35  # Seconds of the beat before the R peak
+POST = 0.75  # and after it
+OFFSETS = np.arange(round(-PRE * FS), round(POST * FS))  # Samples around R
+BATCH = 64  # Beats generated at once
+RESP = 0.25  # Hz, breathing, modulates the rate and the baseline
+ECTOPIC_RR = (0.65, 1.35)  # Premature beat and the compensatory pause
+LEADOFF_SECS = 6  # Duration of a lead-off episode, long enough to alert
+# Gaussian waves, after ECGSYN: time from R at 60 bpm (s), amplitude
+# (mV), width (s). P and T move with the square root of RR interval.
+NORMAL = np.array(
+    [
+        (-0.20, 0.10, 0.025),  # P
+        (-0.03, -0.08, 0.010),  # Q
+        (0.00, 0.80, 0.012),  # R
+        (0.035, -0.17, 0.012),  # S
+        (0.30, 0.22, 0.060),  # T
+    ]
+)
+ECTOPIC = np.array(
+    [
+        (-0.20, 0.00, 0.025),  # No P
+        (-0.05, -0.15, 0.025),
+        (0.00, 1.10, 0.035),  # Wide QRS
+        (0.07, -0.40, 0.035),
+        (0.34, -0.30, 0.080),  # Discordant T
+    ]
+)
+SCALED = np.array([True, False, False, False, True])
+
+Array = npt.NDArray[np.float64]
+
+
+class Synth(NamedTuple):
+    """Parameters of the synthetic signal"""
+
+    hr: float = 60.0  # Mean heart rate, beats per minute
+    sdnn: float = 50.0  # Standard deviation of RR intervals, ms
+    noise: float = 0.01  # Standard deviation of white noise, mV
+    wander: float = 0.05  # Amplitude of baseline wander, mV
+    ectopic: float = 0.0  # Probability that a beat is premature ventricular
+    leadoff: float = 0.0  # Lead-off episodes per minute, on average
+    seed: int = 0
+
+
+class Ecg:  # pylint: disable=too-many-instance-attributes
+    """
+    Endless signal, produced in blocks of any length. Beats are planned
+    in batches: RR intervals get respiratory modulation, random spread
+    and ectopic beats, all drawn as arrays. Every beat is then a sum of
+    Gaussian waves, added to a buffer of samples ahead with a single
+    scattered addition per block. Noise, wander and lead-off episodes are
+    computed for the whole block. The same seed gives the same signal,
+    whatever the block lengths.
+    """
+
+    def __init__(self, synth: Synth = Synth()) -> None:
+        self.synth = synth
+        # Separate streams, so that the signal does not depend on how
+        # the draws of beats and of samples interleave
+        seeds = np.random.SeedSequence(synth.seed).spawn(3)
+        self.beatrng, self.noiserng, self.offrng = (
+            np.random.default_rng(seed) for seed in seeds
+        )
+        self.pos = 0  # Samples produced
+        self.ahead = np.zeros(0)  # Rendered beats, from pos on
+        self.beats = np.zeros(0)  # Planned R peaks, sample positions
+        self.rrs = np.zeros(0)  # Intervals before them, seconds
+        self.kinds = np.zeros(0, dtype=bool)  # Which of them are ectopic
+        self.last = PRE * FS  # The last planned R peak
+        self.pause = False  # The last planned beat was ectopic
+        self.offleft = 0  # Samples of lead-off carried to the next block
+
+    def plan(self) -> None:
+        """Add a batch of beats"""
+        s = self.synth
+        rr = np.full(BATCH, 60.0 / s.hr)
+        times = self.last / FS + np.cumsum(rr)
+        # Half of the variance is respiratory, half is random
+        spread = s.sdnn / 1000 / np.sqrt(2)
+        rr += spread * np.sqrt(2) * np.sin(2 * np.pi * RESP * times)
+        rr += self.beatrng.normal(0.0, spread, BATCH)
+        kinds = self.beatrng.random(BATCH) < s.ectopic
+        kinds[0] &= not self.pause  # No two in a row
+        kinds[1:] &= ~kinds[:-1]
+        follows = np.concatenate(((self.pause,), kinds[:-1]))
+        rr[kinds] *= ECTOPIC_RR[0]
+        rr[follows] *= ECTOPIC_RR[1]
+        rr = np.maximum(rr, 0.25)
+        peaks = self.last + np.cumsum(rr) * FS
+        self.beats = np.concatenate((self.beats, peaks))
+        self.rrs = np.concatenate((self.rrs, rr))
+        self.kinds = np.concatenate((self.kinds, kinds))
+        self.last = float(peaks[-1])
+        self.pause = bool(kinds[-1])
+
+    def render(self, end: int) -> None:
+        """Add to the buffer all beats that start before sample `end`"""
+        while not self.beats.size or self.beats[-1] + OFFSETS[0] < end:
+            self.plan()
+        n = int(np.searchsorted(self.beats + OFFSETS[0], end))
+        peaks, rr, kinds = self.beats[:n], self.rrs[:n], self.kinds[:n]
+        self.beats, self.rrs = self.beats[n:], self.rrs[n:]
+        self.kinds = self.kinds[n:]
+        if not n:
+            return
+        waves = np.where(kinds[:, None, None], ECTOPIC, NORMAL)  # n,5,3
+        centre = waves[:, :, 0] * np.where(SCALED, np.sqrt(rr)[:, None], 1.0)
+        idx = np.floor(peaks).astype(np.int64)[:, None] + OFFSETS  # n,L
+        t = (idx - peaks[:, None]) / FS
+        vals = (
+            waves[:, None, :, 1]
+            * np.exp(
+                -((t[:, :, None] - centre[:, None, :]) ** 2)
+                / (2 * waves[:, None, :, 2] ** 2)
+            )
+        ).sum(axis=2)
+        idx -= self.pos
+        if (size := int(idx.max()) + 1) > len(self.ahead):
+            self.ahead = np.concatenate(
+                (self.ahead, np.zeros(size - len(self.ahead)))
+            )
+        self.ahead += np.bincount(
+            idx.ravel(), weights=vals.ravel(), minlength=len(self.ahead)
+        )
+
+    def episodes(self, n: int) -> npt.NDArray[np.bool_]:
+        """Lead-off mask for the next n samples"""
+        starts = np.flatnonzero(
+            self.offrng.random(n) < self.synth.leadoff / 60 / FS
+        )
+        ends = starts + LEADOFF_SECS * FS
+        edges = np.zeros(n + 1)
+        if carry := min(self.offleft, n):
+            edges[0] += 1
+            edges[carry] -= 1
+        np.add.at(edges, starts, 1)
+        np.add.at(edges, np.minimum(ends, n), -1)
+        self.offleft = max(self.offleft - n, int(ends.max(initial=0)) - n, 0)
+        return np.cumsum(edges[:n]) > 0
+
+    def take(self, n: int) -> Tuple[Array, npt.NDArray[np.bool_]]:
+        """Next n samples, in mV, and whether the lead was off for them"""
+        s = self.synth
+        self.render(self.pos + n)
+        if len(self.ahead) < n:
+            self.ahead = np.concatenate(
+                (self.ahead, np.zeros(n - len(self.ahead)))
+            )
+        vals, self.ahead = self.ahead[:n], self.ahead[n:]
+        t = (self.pos + np.arange(n)) / FS
+        vals = (
+            vals
+            + s.wander * np.sin(2 * np.pi * RESP * t)
+            + s.wander / 2 * np.sin(2 * np.pi * 0.05 * t + 1.0)
+            + self.noiserng.normal(0.0, s.noise, n)
+        )
+        off = self.episodes(n)
+        vals[off] = 0.0  # The device sends a flat line
+        self.pos += n
+        return vals, off
+
+
+def generate(secs: float, synth: Synth = Synth()) -> Array:
+    """Signal of given duration, in one piece"""
+    vals, _ = Ecg(synth).take(round(secs * FS))
+    return vals
+
+
+def main() -> None:
+    """
+    Print a recording like those in sample-data: seconds (60 by default),
+    then optionally heart rate and seed
+    """
+    secs = float(argv[1]) if len(argv) > 1 else 60.0
+    synth = Synth()
+    if len(argv) > 2:
+        synth = synth._replace(hr=float(argv[2]))
+    if len(argv) > 3:
+        synth = synth._replace(seed=int(argv[3]))
+    ecg = Ecg(synth)
+    for i in range(0, round(secs * FS), FS):
+        vals, _ = ecg.take(min(FS, round(secs * FS) - i))
+        print(
+            "\n".join(
+                f"{(i + j) / FS:.3f} {v:.5f} 0 0" for j, v in enumerate(vals)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 """Emulated asyncio receiver"""
 
 from __future__ import annotations
-from asyncio import current_task, run, sleep, Task
+from asyncio import gather, sleep
 from asyncio.exceptions import CancelledError
 from datetime import datetime
-from typing import Any, Generator, Optional, Tuple, TYPE_CHECKING
+from time import monotonic_ns
+from typing import Any, Dict, List, Union
 
+from .bus import Consumer
+from .cfg import VALS_PER_SEC, Stress
 from .datatypes import (
     EventPc80bContData,
     EventPc80bFastData,
@@ -15,97 +18,121 @@ from .datatypes import (
     MMode,
     MStage,
 )
-from .sample import sample
-
-if TYPE_CHECKING:
-    from .sgn import Signal
+from .syn import Ecg, Synth
 
 # pylint: disable=missing-function-docstring
 
-
-def _give25() -> Generator[Tuple[float, ...]]:
-    pos = 0
-    while True:
-        npos = pos + 25
-        yield sample[pos:npos]
-        if npos >= 150:
-            pos = 0
-        else:
-            pos = npos
+CYCLE = 121  # Packets in the cycle of modes and heart rate
+# Signal of the test source, with some of everything that can happen
+TEST = Synth(hr=66.0, ectopic=0.02, leadoff=0.5)
 
 
-give25 = _give25()
+def packet(
+    device: int, step: int, values: List[float], leadoff: bool
+) -> Union[EventPc80bContData, EventPc80bFastData]:
+    if step < 60:
+        return EventPc80bFastData(
+            None,
+            seqNo=step,
+            fin=False,
+            hr=0,
+            channel=Channel((step // 10) % 3),
+            mmode=MMode((step // 10) % 3),
+            mstage=MStage((step // 10) % 6),
+            leadoff=leadoff,
+            datatype=(step // 10) % 8,
+            gain=0,
+            vol=0,
+            ecgFloats=values,
+            rxtime=monotonic_ns(),
+            device=device,
+        )
+    return EventPc80bContData(
+        None,
+        seqNo=step,
+        fin=False,
+        hr=(step // 20) * 40,
+        leadoff=leadoff,
+        gain=0,
+        vol=0,
+        ecgFloats=values,
+        rxtime=monotonic_ns(),
+        device=device,
+    )
 
 
 class TestSrc:
-    """Warpper for cancellable async task"""
+    """
+    Test signal, run as a cancellable async task. Packets are due at
+    absolute deadlines counted from the start, so the time spent sending
+    does not make the rate drift. A packet that is already late is sent
+    at once, and counted. With stress parameters, it sends faster than
+    real time, in packets of any size, as several devices in parallel.
+    """
 
-    def __init__(self, signal: Signal) -> None:
+    def __init__(self, signal: Consumer, stress: Stress = Stress()) -> None:
         self.signal = signal
-        self.task: Optional[Task[Any]] = None
+        self.stress = stress
+        self.started = 0
+        self.sent = 0  # Packets
+        self.late = 0
+        self.maxlate = 0  # ns
 
-    async def _task(self) -> None:
-        self.task = current_task()
+    async def acquire(self) -> None:
         print("Launched test source")
         self.signal.report_status(True, "Sending test signal")
-        step = 0
+        self.started = monotonic_ns()
         try:
-            while True:
-                if step > 120:
-                    step = 0
-                values = next(give25)
-                # print(step, values)
+            await gather(*(self.device(i) for i in range(self.stress.devices)))
+        except CancelledError:
+            print("Async task got cancelled")
+
+    async def device(self, device: int) -> None:
+        ecg = Ecg(TEST._replace(seed=device))  # Each device is different
+        period = round(
+            1e9 * self.stress.packet / VALS_PER_SEC / self.stress.rate
+        )
+        deadline = self.started
+        seq = 0
+        while True:
+            step = seq % CYCLE
+            vals, off = ecg.take(self.stress.packet)
+            self.signal.report_data(
+                packet(device, step, vals.tolist(), bool(off.any()))
+            )
+            if step % 30 == 0:
                 self.signal.report_data(
-                    EventPc80bFastData(
-                        None,
-                        seqNo=step,
-                        fin=False,
-                        hr=0,
-                        channel=Channel((step // 10) % 3),
-                        mmode=MMode((step // 10) % 3),
-                        mstage=MStage((step // 10) % 6),
-                        leadoff=False,
-                        datatype=(step // 10) % 8,
-                        gain=0,
-                        vol=0,
-                        ecgFloats=list(values),
-                    )
-                    if step < 60
-                    else EventPc80bContData(
-                        None,
-                        seqNo=step,
-                        fin=False,
-                        hr=(step // 20) * 40,
-                        leadoff=step > 90,
-                        gain=0,
-                        vol=0,
-                        ecgFloats=list(values),
+                    EventPc80bHeartbeat(
+                        None, batt=3 - (step // 30), device=device
                     )
                 )
-                if step % 30 == 0:
-                    self.signal.report_data(
-                        EventPc80bHeartbeat(None, batt=3 - (step // 30))
-                    )
-                if step == 0:
-                    self.signal.report_data(
-                        EventPc80bTime(None, datetime=datetime.now())
+            if step == 0:
+                self.signal.report_data(
+                    EventPc80bTime(
+                        None, datetime=datetime.now(), device=device
                     )
-                step += 1
-                await sleep(0.166666666)
-        except CancelledError:
-            print("Async task got cancelled")
-            self.task = None
-
-    # pylint: disable=duplicate-code
-
-    def run(self) -> None:
-        if self.task is None:
-            run(self._task())
-        else:
-            print("Async task already running")
+                )
+            self.sent += 1
+            seq += 1
+            deadline += period
+            delay = deadline - monotonic_ns()
+            if delay > 0:
+                await sleep(delay / 1e9)
+            else:
+                self.late += 1
+                self.maxlate = max(self.maxlate, -delay)
+                await sleep(0)  # Let the other devices run
 
-    def stop(self) -> None:
-        if self.task is not None:
-            self.task.cancel()
-        else:
-            print("Trying to cancel non-running task")
+    def stats(self) -> Dict[str, Any]:
+        elapsed = (monotonic_ns() - self.started) / 1e9
+        return {
+            "sent": self.sent,
+            "late": self.late,
+            "maxlate_ms": self.maxlate / 1e6,
+            # Samples sent, as a multiple of one device in real time
+            "realtime_x": (
+                self.sent * self.stress.packet / VALS_PER_SEC / elapsed
+                if self.started
+                else 0.0
+            ),
+        }
@@ -0,0 +1,117 @@
+"""Library interface: batching and dropping for a slow reader"""
+
+from asyncio import create_task, run, sleep
+from typing import Any, List
+from unittest import main, TestCase
+
+from pc80b_bleak.api import Feed, Samples, Status, stream
+from pc80b_bleak.datatypes import EventPc80bContData, EventPc80bHeartbeat
+
+# pylint: disable=missing-function-docstring
+
+PACKET = 25
+
+
+def packet(seq: int) -> EventPc80bContData:
+    """Data packet whose samples are their own numbers"""
+    vals = [float(seq * PACKET + i) for i in range(PACKET)]
+    return EventPc80bContData(
+        None, seqNo=seq, hr=60, leadoff=False, ecgFloats=vals, rxtime=seq
+    )
+
+
+class FeedCheck(TestCase):
+    """Merging and trimming of the queue, fed directly"""
+
+    def test_merge(self) -> None:
+        async def check() -> List[Any]:
+            feed = Feed()
+            for seq in range(4):
+                feed.report_data(packet(seq))
+            feed.report_data(EventPc80bHeartbeat(None, batt=2))
+            feed.report_data(packet(4))
+            feed.finish()
+            return [await feed.get() for _ in range(4)]
+
+        block, beat, last, end = run(check())
+        self.assertIsInstance(block, Samples)
+        self.assertEqual(block.vals.tolist(), list(range(4 * PACKET)))
+        self.assertEqual((block.first, block.rxtime), (0, 3))
+        self.assertIsInstance(beat, EventPc80bHeartbeat)
+        self.assertEqual(last.first, 4 * PACKET)
+        self.assertIsNone(end)
+
+    def test_maxsamples(self) -> None:
+        async def check() -> List[Any]:
+            feed = Feed(maxsamples=3 * PACKET)
+            for seq in range(10):
+                feed.report_data(packet(seq))
+            self.assertEqual(feed.dropped, 7 * PACKET)
+            got = [await feed.get()]
+            for seq in range(10, 12):
+                feed.report_data(packet(seq))
+            got.append(await feed.get())
+            return got
+
+        before, after = run(check())
+        # The oldest were dropped, the first sample number shows the gap
+        self.assertEqual(before.first, 7 * PACKET)
+        self.assertEqual(before.vals[0], before.first)
+        self.assertEqual(len(before.vals), 3 * PACKET)
+        self.assertEqual(after.first, 10 * PACKET)
+
+    def test_batch(self) -> None:
+        async def check() -> Any:
+            feed = Feed()
+            feed.report_data(packet(0))
+            getter = create_task(feed.get(3 * PACKET))
+            for seq in range(1, 3):
+                await sleep(0.01)
+                self.assertFalse(getter.done(), "delivered before batch")
+                feed.report_data(packet(seq))
+            return await getter
+
+        block = run(check())
+        self.assertEqual(len(block.vals), 3 * PACKET)
+
+
+class StreamCheck(TestCase):
+    """The test signal through stream(), as a library user sees it"""
+
+    def test_batch(self) -> None:
+        async def collect() -> List[Any]:
+            items: List[Any] = []
+            async for item in stream(test=True, batch=60):
+                items.append(item)
+                if sum(isinstance(i, Samples) for i in items) == 4:
+                    break
+            return items
+
+        items = run(collect())
+        self.assertIsInstance(items[0], Status)
+        blocks = [i for i in items if isinstance(i, Samples)]
+        for i, item in enumerate(items[:-1]):
+            if isinstance(item, Samples) and len(item.vals) < 60:
+                # Only cut short by something else that came after it
+                self.assertNotIsInstance(items[i + 1], Samples)
+        for prev, cur in zip(blocks, blocks[1:]):
+            self.assertEqual(cur.first, prev.first + len(prev.vals))
+
+    def test_slow_reader(self) -> None:
+        async def collect() -> List[Samples]:
+            blocks: List[Samples] = []
+            async for item in stream(test=True, maxsamples=50):
+                if isinstance(item, Samples):
+                    blocks.append(item)
+                    if len(blocks) == 2:
+                        break
+                    await sleep(1.0)  # Meanwhile ~150 samples arrive
+            return blocks
+
+        first, second = run(collect())
+        self.assertLessEqual(len(second.vals), 50)
+        self.assertGreater(second.first, first.first + len(first.vals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Bounded queues of the bus behind a consumer that does not keep up"""
+
+from threading import Event as TEvent
+from time import monotonic, sleep
+from typing import Any, List, Tuple
+from unittest import main, TestCase
+
+from pc80b_bleak.bus import Bus, Overflow
+from pc80b_bleak.datatypes import Event, EventPc80bHeartbeat
+from pc80b_bleak.datatypes import TestData as Packet
+
+# pylint: disable=missing-function-docstring
+
+MAXSIZE = 5
+
+
+class Slow:
+    """Consumer that stops on the first event until it is released"""
+
+    def __init__(self) -> None:
+        self.got: List[Tuple[str, Any]] = []
+        self.stuck = TEvent()
+        self.release = TEvent()
+        self.done = TEvent()
+
+    def report_status(self, receiving: bool, details: str) -> None:
+        self.got.append(("status", (receiving, details)))
+        if details == "end":
+            self.done.set()
+
+    def report_data(self, event: Event) -> None:
+        if not self.stuck.is_set():
+            self.stuck.set()
+            self.release.wait(5)
+        if isinstance(event, Packet):
+            self.got.append(("data", event.ecgFloats[0]))
+        elif isinstance(event, EventPc80bHeartbeat):
+            self.got.append(("tick", event.batt))
+
+    def report_gap(self, dropped: int) -> None:
+        self.got.append(("gap", dropped))
+
+
+class BusCheck(TestCase):
+    """Producer never waits, queue stays bounded, gaps are accounted"""
+
+    def setUp(self) -> None:
+        self.bus = Bus()
+        self.slow = Slow()
+
+    def tearDown(self) -> None:
+        self.bus.close()
+
+    def run_bus(self, overflow: Overflow, *items: Any) -> List[Any]:
+        """Put items behind a stuck consumer, and what it gets after"""
+        self.bus.subscribe(
+            "slow", self.slow, maxsize=MAXSIZE, overflow=overflow
+        )
+        sub: Any = self.bus.subs["slow"]
+        self.bus.report_data(Packet([-1.0]))
+        self.assertTrue(self.slow.stuck.wait(5))
+        begin = monotonic()
+        for item in items:
+            if isinstance(item, str):
+                self.bus.report_status(True, item)
+            elif item is None:
+                self.bus.report_data(EventPc80bHeartbeat(bytes((50,))))
+            else:
+                self.bus.report_data(Packet([float(item)]))
+            self.assertLessEqual(len(sub.queue), MAXSIZE)
+        self.assertLess(monotonic() - begin, 1.0, "producer was held up")
+        self.slow.release.set()
+        while sub.queue and monotonic() - begin < 5:
+            sleep(0.01)
+        self.bus.report_status(False, "end")
+        self.assertTrue(self.slow.done.wait(5))
+        return self.slow.got[1:-1]
+
+    def test_drop_oldest(self) -> None:
+        got = self.run_bus(Overflow.drop_oldest, *range(20))
+        self.assertEqual(
+            got,
+            [("gap", 16), ("data", 16.0)]
+            + [("data", float(i)) for i in range(17, 20)],
+        )
+
+    def test_drop_newest(self) -> None:
+        got = self.run_bus(Overflow.drop_newest, *range(20))
+        self.assertEqual(
+            got, [("data", float(i)) for i in range(4)] + [("gap", 16)]
+        )
+
+    def test_status_kept(self) -> None:
+        for overflow in Overflow:
+            with self.subTest(overflow=overflow):
+                self.setUp()
+                items = [*range(10), "a", *range(10, 20), "b", 20]
+                got = self.run_bus(overflow, *items)
+                self.bus.close()
+                self.assertEqual(
+                    [w for k, w in got if k == "status"],
+                    [(True, "a"), (True, "b")],
+                )
+                data = [w for k, w in got if k == "data"]
+                gaps = [w for k, w in got if k == "gap"]
+                self.assertEqual(len(data) + sum(gaps), 21)
+
+    def test_heartbeats(self) -> None:
+        """Heartbeats make room for data, and are dropped without a gap"""
+        for overflow in Overflow:
+            with self.subTest(overflow=overflow):
+                self.setUp()
+                got = self.run_bus(overflow, 0, None, 1, None, 2, None, 3)
+                self.bus.close()
+                self.assertNotIn("gap", [k for k, _ in got])
+                self.assertEqual(
+                    [w for k, w in got if k == "data"],
+                    [0.0, 1.0, 2.0, 3.0],
+                )
+
+
+if __name__ == "__main__":
+    main()
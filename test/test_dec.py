@@ -0,0 +1,64 @@
+"""Column envelope against min/max over the samples of each column"""
+
+from unittest import main, TestCase
+
+import numpy as np
+import numpy.typing as npt
+
+from pc80b_bleak.dec import MinMax
+
+# pylint: disable=missing-function-docstring
+
+Array = npt.NDArray[np.float64]
+
+
+class MinMaxCheck(TestCase):
+    """Envelope follows a sweep that overwrites the ring in pieces"""
+
+    def sweep(self, nsamp: int, ncols: int) -> None:
+        rng = np.random.default_rng(nsamp)
+        mm = MinMax(nsamp, ncols)
+        ring = np.zeros(nsamp)
+        col = np.arange(nsamp) * ncols // nsamp
+        pos = sweeps = 0
+        while sweeps < 3:
+            end = min(pos + int(rng.integers(1, 40)), nsamp)
+            ring[pos:end] = rng.normal(size=end - pos)
+            c0, c1 = mm.update(ring, pos, end)
+            self.assertEqual((c0, c1), (col[pos], col[end - 1] + 1))
+            for c in range(c0, c1):
+                # Samples after the end are from the previous sweep
+                seg = ring[(col == c) & (np.arange(nsamp) < end)]
+                self.assertEqual(mm.lo[c], seg.min())
+                self.assertEqual(mm.hi[c], seg.max())
+            pos = end % nsamp
+            sweeps += pos == 0
+        self.whole(mm, ring)
+
+    def whole(self, mm: MinMax, ring: Array) -> None:
+        """After a whole sweep, every column covers all of its samples"""
+        ncols = len(mm.lo)
+        col = np.arange(len(ring)) * ncols // len(ring)
+        lo = np.array([ring[col == c].min() for c in range(ncols)])
+        hi = np.array([ring[col == c].max() for c in range(ncols)])
+        np.testing.assert_array_equal(mm.lo, lo)
+        np.testing.assert_array_equal(mm.hi, hi)
+        cols, vals = mm.vertices(0, ncols)
+        np.testing.assert_array_equal(cols, np.repeat(np.arange(ncols), 2))
+        np.testing.assert_array_equal(vals[0::2], hi)
+        np.testing.assert_array_equal(vals[1::2], lo)
+
+    def test_sizes(self) -> None:
+        for nsamp, ncols in ((1500, 640), (4500, 1280), (1001, 1000)):
+            with self.subTest(nsamp=nsamp, ncols=ncols):
+                self.sweep(nsamp, ncols)
+
+    def test_whole_ring(self) -> None:
+        mm = MinMax(1000, 300)
+        data = np.sin(np.arange(1000) * 0.37)
+        self.assertEqual(mm.update(data, 0, 1000), (0, 300))
+        self.whole(mm, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Streaming filter against a sample by sample reference"""
+
+from typing import List, Tuple
+from unittest import main, TestCase
+
+import numpy as np
+
+from pc80b_bleak.cfg import Params
+from pc80b_bleak.flt import (
+    Biquad,
+    Filter,
+    highpass,
+    lowpass,
+    make_filter,
+    notch,
+)
+
+# pylint: disable=missing-function-docstring
+
+SECTIONS = [highpass(0.5), notch(50.0), lowpass(40.0)]
+
+
+def reference(sections: List[Biquad], u: List[float]) -> List[float]:
+    """
+    Cascade of biquads in transposed direct form II, one sample at a
+    time, starting in the steady state for the first input value
+    """
+    state: List[Tuple[float, float]] = []
+    x = u[0]
+    for (b0, b1, b2), (a1, a2) in sections:
+        y = x * (b0 + b1 + b2) / (1 + a1 + a2)
+        z2 = b2 * x - a2 * y
+        state.append((b1 * x - a1 * y + z2, z2))
+        x = y
+    out = []
+    for x in u:
+        for i, ((b0, b1, b2), (a1, a2)) in enumerate(sections):
+            z1, z2 = state[i]
+            y = b0 * x + z1
+            state[i] = (b1 * x - a1 * y + z2, b2 * x - a2 * y)
+            x = y
+        out.append(x)
+    return out
+
+
+class FilterCheck(TestCase):
+    """Block processing gives the same output as the plain recursion"""
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.u = 1.0 + np.cumsum(rng.normal(0.0, 0.1, 2000))
+        self.ref = np.array(reference(SECTIONS, self.u.tolist()))
+
+    def test_block_splits(self) -> None:
+        rng = np.random.default_rng(1)
+        for _ in range(5):
+            flt = Filter(SECTIONS)
+            cuts = np.sort(rng.choice(len(self.u), 40, replace=False))
+            out = np.concatenate(
+                [flt(part) for part in np.split(self.u, cuts)]
+            )
+            np.testing.assert_allclose(out, self.ref, atol=1e-9)
+
+    def test_single_samples(self) -> None:
+        flt = Filter(SECTIONS)
+        out = np.concatenate([flt(self.u[i : i + 1]) for i in range(300)])
+        np.testing.assert_allclose(out, self.ref[:300], atol=1e-9)
+
+    def test_reset(self) -> None:
+        flt = Filter(SECTIONS)
+        flt(self.u[:500])
+        flt.reset()
+        np.testing.assert_allclose(flt(self.u), self.ref, atol=1e-9)
+
+    def test_response(self) -> None:
+        """Hum and drift are removed, the band of ECG is kept"""
+        t = np.arange(3000) / 150.0
+        flt = make_filter(Params(mains=50))
+
+        def gain(freq: float) -> float:
+            flt.reset()
+            wave = np.sin(2 * np.pi * freq * t)
+            return float(np.std(flt(wave)[1500:]) / np.std(wave[1500:]))
+
+        self.assertLess(gain(50.0), 0.05)
+        self.assertLess(gain(0.05), 0.05)
+        self.assertAlmostEqual(gain(10.0), 1.0, delta=0.05)
+
+    def test_passthrough(self) -> None:
+        flt = Filter([])
+        np.testing.assert_array_equal(flt(self.u), self.u)
+
+
+if __name__ == "__main__":
+    main()
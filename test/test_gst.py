@@ -0,0 +1,89 @@
+"""Replacing the encoder of a running pipeline"""
+
+from typing import Any, List
+from unittest import main, skipIf, TestCase
+
+try:
+    import gi  # type: ignore [import-untyped]
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst  # type: ignore [import-untyped]
+
+    Gst.init(None)
+    from pc80b_bleak.cfg import Params
+    from pc80b_bleak.enc import make_encoder
+    from pc80b_bleak.gst import swap_encoder
+
+    HAVE_X264 = Gst.ElementFactory.find("x264enc") is not None
+except (ImportError, ValueError):
+    HAVE_X264 = False
+
+# pylint: disable=missing-function-docstring
+
+PIPELINE = (
+    "videotestsrc is-live=true num-buffers={frames}"
+    " ! video/x-raw,format=I420,width=320,height=240,framerate=30/1"
+    " ! queue ! x264enc name=enc tune=zerolatency key-int-max=300"
+    " ! flvmux streamable=true ! appsink name=sink sync=false"
+)
+FRAMES = 90
+
+
+@skipIf(not HAVE_X264, "GStreamer with x264enc is not available")
+class SwapCheck(TestCase):
+    """Encoder swap through flvmux"""
+
+    def test_swap(self) -> None:
+        pl = Gst.parse_launch(PIPELINE.format(frames=FRAMES))
+        old = pl.get_by_name("enc")
+        tags: List[bytes] = []
+        mark: List[int] = []  # Tags out when the swap was done
+        encoded = [0]
+
+        def count(_pad: Gst.Pad, _info: Gst.PadProbeInfo) -> Any:
+            encoded[0] += 1
+            return Gst.PadProbeReturn.OK
+
+        def done() -> None:
+            mark.append(len(tags))
+
+        def on_sample(appsink: Gst.Element) -> Any:
+            buf = appsink.emit("pull-sample").get_buffer()
+            tags.append(buf.extract_dup(0, buf.get_size()))
+            if len(tags) == FRAMES // 3:
+                new = make_encoder("low-cpu", Params(crt_w=320, crt_h=240))
+                new.get_static_pad("sink").add_probe(
+                    Gst.PadProbeType.BUFFER, count
+                )
+                swap_encoder(pl, old, new, done)
+            return Gst.FlowReturn.OK
+
+        old.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, count)
+        sink = pl.get_by_name("sink")
+        sink.set_property("emit-signals", True)
+        sink.connect("new-sample", on_sample)
+        pl.set_state(Gst.State.PLAYING)
+        msg = pl.get_bus().timed_pop_filtered(
+            10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR
+        )
+        pl.set_state(Gst.State.NULL)
+        self.assertIsNotNone(msg, "stream did not finish")
+        self.assertEqual(msg.type, Gst.MessageType.EOS, "error in pipeline")
+        self.assertTrue(mark, "encoder was not replaced")
+        self.check(tags, mark[0], encoded[0])
+
+    def check(self, tags: List[bytes], mark: int, encoded: int) -> None:
+        video = [t for t in tags if t[:1] == b"\x09" and len(t) > 12]
+        frames = [t for t in video if t[12] == 1]  # AVC NALU
+        # Nothing held by the old encoder was lost on the way
+        self.assertEqual(len(frames), encoded)
+        # The new codec data went into the stream, before a keyframe
+        after = [t for t in tags[mark:] if t in video]
+        headers = [i for i, t in enumerate(after) if t[12] == 0]
+        self.assertTrue(headers, "no AVC sequence header after the swap")
+        nxt = after[headers[0] + 1]
+        self.assertEqual(nxt[11] >> 4, 1, "not a keyframe after the header")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Windowed HRV statistics against direct computation"""
+
+from typing import List
+from unittest import main, TestCase
+
+import numpy as np
+
+from pc80b_bleak.hrv import NN50, RR_MAX, RR_MIN, WINDOWS, Hrv, Summary
+from pc80b_bleak.qrs import Beat
+from pc80b_bleak.syn import FS, Synth
+
+from .test_qrs import run
+
+# pylint: disable=missing-function-docstring
+
+
+def direct(secs: int, times: List[float], rrs: List[float]) -> Summary:
+    """Statistics of the last `secs` seconds, computed from scratch"""
+    t = np.array(times)
+    rr = np.array(rrs)
+    ok = (rr >= RR_MIN) & (rr <= RR_MAX)
+    # Successive difference where the previous interval was accepted too
+    diff = np.full(len(rr), np.nan)
+    diff[1:] = np.where(ok[:-1], rr[1:] - rr[:-1], np.nan)
+    inside = ok & (t >= t[ok][-1] - secs)
+    rr, diff = rr[inside], diff[inside]
+    diff = diff[~np.isnan(diff)]
+    return Summary(
+        window=secs,
+        beats=len(rr),
+        mean_hr=60.0 / rr.mean(),
+        sdnn=1000 * rr.std(),
+        rmssd=1000 * np.sqrt(np.mean(diff**2)),
+        pnn50=100 * np.mean(np.abs(diff) > NN50),
+    )
+
+
+class WindowCheck(TestCase):
+    """Running sums give the same as the statistics over the window"""
+
+    def test_intervals(self) -> None:
+        rng = np.random.default_rng(0)
+        hrv = Hrv()
+        sample = 0
+        times: List[float] = []
+        rrs: List[float] = []
+        for i in range(8000):
+            rr = rng.normal(0.8, 0.08)
+            if i % 500 == 499:
+                rr = 2.5  # Missed beat, rejected as an artifact
+            sample += round(rr * FS)
+            rr = round(rr * FS) / FS
+            times.append(sample / FS)
+            rrs.append(rr)
+            hrv.add(Beat(sample, rr, 60.0 / rr))
+            if i % 1000 == 999:
+                for got in hrv.summaries():
+                    want = direct(got.window, times, rrs)
+                    with self.subTest(beat=i, window=got.window):
+                        self.assertEqual(got.beats, want.beats)
+                        np.testing.assert_allclose(got, want, rtol=1e-6)
+
+    def test_empty(self) -> None:
+        self.assertEqual([s.beats for s in Hrv().summaries()], [0, 0, 0])
+
+    def test_trend(self) -> None:
+        hrv = Hrv()
+        for i in range(1, 300):
+            hrv.add(Beat(i * FS, 1.0, 60.0))
+        self.assertEqual([m for m, _ in hrv.trend], [1, 2, 3, 4])
+        self.assertEqual({hr for _, hr in hrv.trend}, {60.0})
+
+
+class SyntheticCheck(TestCase):
+    """Detected beats give the variability the signal was made with"""
+
+    def test_synthetic(self) -> None:
+        for hr in (50.0, 72.0, 110.0):
+            with self.subTest(hr=hr):
+                beats, peaks = run(Synth(hr=hr, seed=5), WINDOWS[1])
+                hrv = Hrv()
+                hrv.feed(beats)
+                got = hrv.summaries()[1]
+                rr = np.diff(peaks) / FS
+                self.assertAlmostEqual(got.mean_hr, 60.0 / rr.mean(), delta=2)
+                self.assertAlmostEqual(got.sdnn, 1000 * rr.std(), delta=5)
+                self.assertAlmostEqual(got.sdnn, 50.0, delta=15)
+
+
+if __name__ == "__main__":
+    main()
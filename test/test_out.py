@@ -0,0 +1,188 @@
+"""Outputs surviving outages, against a local stand-in for the server"""
+
+from socket import create_server, socket
+from struct import pack, unpack
+from threading import Thread
+from time import monotonic
+from typing import Any, Callable, List, Tuple
+from unittest import main, skipIf, TestCase
+
+try:
+    import gi  # type: ignore [import-untyped]
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import GLib, Gst  # type: ignore [import-untyped]
+
+    Gst.init(None)
+    from pc80b_bleak import out
+except (ImportError, ValueError):
+    out = None  # type: ignore [assignment]
+
+# pylint: disable=missing-function-docstring
+
+KEYINT = 10  # Tags from one keyframe to the next
+TAGDUR = 100_000_000  # ns of stream per tag
+
+
+def flvtag(seq: int, size: int = 16) -> Any:
+    """FLV video tag with the sequence number in the data"""
+    data = bytes((0x17 if seq % KEYINT == 0 else 0x27,)) + pack(">I", seq)
+    data += bytes(size - len(data))
+    head = b"\x09" + len(data).to_bytes(3, "big") + bytes(7)
+    tag = head + data + pack(">I", len(head) + len(data))
+    buf = Gst.Buffer.new_wrapped(tag)
+    buf.pts = seq * TAGDUR
+    return buf
+
+
+class Server(Thread):
+    """
+    Stand-in for the RTMP server: accepts connections one at a time and
+    records the FLV tags received on each, as (sequence, keyframe).
+    """
+
+    def __init__(self, read: bool = True) -> None:
+        super().__init__(daemon=True)
+        self.listener = create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.read = read
+        self.conns: List[socket] = []
+        self.tags: List[List[Tuple[int, bool]]] = []
+
+    def run(self) -> None:
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            tags: List[Tuple[int, bool]] = []
+            self.tags.append(tags)
+            if not self.read:
+                continue  # Never read, the sender will block
+            rfile = conn.makefile("rb")
+            try:
+                while len(head := rfile.read(11)) == 11:
+                    data = rfile.read(int.from_bytes(head[1:4], "big"))
+                    rfile.read(4)
+                    tags.append(
+                        (unpack(">I", data[1:5])[0], data[0] >> 4 == 1)
+                    )
+            except OSError:
+                pass
+
+    def drop(self) -> None:
+        """Break the current connection"""
+        self.conns[-1].close()
+
+    def close(self) -> None:
+        self.listener.close()
+        for conn in self.conns:
+            conn.close()
+
+
+def until(cond: Callable[[], bool], secs: float) -> bool:
+    """Run the main loop until the condition holds, or time is out"""
+    context = GLib.MainContext.default()
+    end = monotonic() + secs
+    while not cond() and monotonic() < end:
+        context.iteration(False)
+    return cond()
+
+
+@skipIf(out is None, "GStreamer is not available")
+class OutputCheck(TestCase):
+    """Reconnection, skipping and bounded queueing of an output"""
+
+    def mkout(self, port: int, skip: bool) -> Any:
+        class TcpOut(out.Output):  # type: ignore [name-defined,misc]
+            """Output to the stand-in server"""
+
+            def mksink(self) -> Any:
+                sink = Gst.ElementFactory.make("tcpclientsink", None)
+                sink.set_property("host", "127.0.0.1")
+                sink.set_property("port", port)
+                return sink
+
+        return TcpOut("test", "", on_state=lambda *_: None, skip=skip)
+
+    def setUp(self) -> None:
+        self.seq = 0
+        self.caps = Gst.Caps.from_string("video/x-flv")
+        self.levels: List[int] = []
+
+    def feed(self, output: Any, n: int, size: int = 16) -> None:
+        for _ in range(n):
+            self.seq += 1
+            output.push(flvtag(self.seq, size), self.caps)
+            if output.src is not None:
+                self.levels.append(
+                    output.src.get_property("current-level-bytes")
+                )
+            GLib.MainContext.default().iteration(False)
+
+    def outage(self, skip: bool) -> Tuple[List[Tuple[int, bool]], Any]:
+        """Tags received after a broken connection was re-established"""
+        server = Server()
+        server.start()
+        output = self.mkout(server.port, skip)
+        try:
+            self.feed(output, 1)
+            output.start()
+            self.feed(output, 25)
+            self.assertTrue(until(lambda: len(server.tags) == 1, 5))
+            server.drop()
+            # Writes fail once the stand-in has gone, then the output
+            # retries after BACKOFF_MIN.
+            while len(server.tags) < 2 and self.seq < 200:
+                self.feed(output, 1)
+                until(lambda: False, 0.02)
+            self.assertEqual(len(server.tags), 2, "not reconnected")
+            self.feed(output, 5)
+            until(lambda: bool(server.tags[1]), 5)
+            return server.tags[1], output
+        finally:
+            output.stop()
+            server.close()
+
+    def test_skip_to_keyframe(self) -> None:
+        tags, output = self.outage(skip=True)
+        first, key = tags[0]
+        self.assertTrue(key, "resumed stream does not start with keyframe")
+        # The latest keyframe before the reconnection, not an older one
+        self.assertGreater(first, self.seq - 5 - KEYINT - 1)
+        self.assertGreater(output.stats()["skipped"], 0)
+        seqs = [seq for seq, _ in tags]
+        self.assertEqual(seqs, list(range(first, first + len(seqs))))
+
+    def test_flush_backlog(self) -> None:
+        tags, output = self.outage(skip=False)
+        self.assertTrue(
+            tags[0][1], "resumed stream does not start with keyframe"
+        )
+        self.assertEqual(output.stats()["skipped"], 0)
+        seqs = [seq for seq, _ in tags]
+        self.assertEqual(seqs, list(range(seqs[0], seqs[0] + len(seqs))))
+
+    def test_stalled_sink(self) -> None:
+        server = Server(read=False)
+        server.start()
+        saved = out.BACKLOG, out.QUEUED
+        out.BACKLOG, out.QUEUED = 20 * TAGDUR, 200_000
+        output = self.mkout(server.port, skip=True)
+        try:
+            self.feed(output, 1)
+            output.start()
+            # Big tags fill the socket buffers, then appsrc, then the ring
+            self.feed(output, 200, size=65536)
+            self.assertTrue(until(lambda: output.stats()["outages"] > 0, 5))
+            self.assertLess(max(self.levels), out.QUEUED + 65536 + 64)
+            self.assertGreater(output.stats()["lost"], 0)
+        finally:
+            out.BACKLOG, out.QUEUED = saved
+            output.stop()
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""History pyramid against min/max over the samples themselves"""
+
+from typing import Tuple
+from unittest import main, TestCase
+
+import numpy as np
+import numpy.typing as npt
+
+from pc80b_bleak import pyr
+
+# pylint: disable=missing-function-docstring
+
+Array = npt.NDArray[np.float64]
+
+
+def columns(start: float, end: float, npix: int, n: int) -> Tuple[Array, ...]:
+    """Range of samples that each column takes, as the query defines it"""
+    bounds = start + (end - start) / npix * np.arange(npix + 1)
+    first = np.floor(bounds[:-1])
+    a0 = np.clip(first, 0, n)
+    a1 = np.clip(np.maximum(np.ceil(bounds[1:]), first + 1), 0, n)
+    return a0.astype(np.int64), a1.astype(np.int64)
+
+
+class PyramidCheck(TestCase):
+    """Exact where the samples are kept, covering where they are not"""
+
+    def setUp(self) -> None:
+        self.capacity = pyr.CAPACITY
+        self.rng = np.random.default_rng(1)
+
+    def tearDown(self) -> None:
+        pyr.CAPACITY = self.capacity
+
+    def build(self, n: int) -> Tuple[pyr.Pyramid, Array]:
+        pyramid = pyr.Pyramid()
+        x = self.rng.normal(size=n)
+        i = 0
+        while i < n:
+            k = int(self.rng.integers(1, 60))
+            pyramid.add(x[i : i + k])
+            i += k
+        self.assertEqual(pyramid.nsamp, n)
+        return pyramid, x
+
+    def check(self, pyramid: pyr.Pyramid, x: Array, trials: int) -> None:
+        n = len(x)
+        kept = n - pyr.CAPACITY  # Samples from there on are at level 0
+        for _ in range(trials):
+            start = self.rng.uniform(-50, n)
+            end = start + self.rng.uniform(1, n)
+            npix = int(self.rng.integers(1, 300))
+            lo, hi = pyramid.query(start, end, npix)
+            for c, (a0, a1) in enumerate(zip(*columns(start, end, npix, n))):
+                if a0 >= a1:
+                    self.assertTrue(np.isnan(lo[c]) and np.isnan(hi[c]))
+                elif a0 >= kept:
+                    self.assertEqual(lo[c], x[a0:a1].min())
+                    self.assertEqual(hi[c], x[a0:a1].max())
+                else:
+                    self.assertLessEqual(lo[c], x[a0:a1].min())
+                    self.assertGreaterEqual(hi[c], x[a0:a1].max())
+
+    def test_exact(self) -> None:
+        pyramid, x = self.build(100_000)
+        self.check(pyramid, x, 200)
+
+    def test_evicted(self) -> None:
+        pyr.CAPACITY = 64
+        pyramid, x = self.build(5000)
+        self.check(pyramid, x, 200)
+
+    def test_zoomed_in(self) -> None:
+        pyramid, x = self.build(1000)
+        lo, hi = pyramid.query(10.0, 12.0, 8)
+        np.testing.assert_array_equal(lo, np.repeat(x[10:12], 4))
+        np.testing.assert_array_equal(hi, lo)
+
+    def test_empty(self) -> None:
+        lo, hi = pyr.Pyramid().query(0.0, 100.0, 10)
+        self.assertTrue(np.isnan(lo).all() and np.isnan(hi).all())
+
+
+if __name__ == "__main__":
+    main()
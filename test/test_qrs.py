@@ -0,0 +1,92 @@
+"""QRS detector on the synthetic signal, where the beats are known"""
+
+from typing import List, Tuple
+from unittest import main, TestCase
+
+import numpy as np
+import numpy.typing as npt
+
+from pc80b_bleak.qrs import LEARN, Beat, Detector
+from pc80b_bleak.syn import FS, Ecg, Synth
+
+# pylint: disable=missing-function-docstring
+
+SECS = 300
+PACKET = 25
+TOLERANCE = 10  # Samples between a detected and the true R peak
+
+
+class Known(Ecg):
+    """Synthetic signal that remembers where it put the R peaks"""
+
+    def __init__(self, synth: Synth) -> None:
+        self.peaks: List[float] = []
+        super().__init__(synth)
+
+    def plan(self) -> None:
+        n = len(self.beats)
+        super().plan()
+        self.peaks.extend(self.beats[n:].tolist())
+
+
+def run(
+    synth: Synth, secs: int = SECS
+) -> Tuple[List[Beat], npt.NDArray[np.float64]]:
+    """Detected beats, and the true R peaks where they can be detected"""
+    ecg = Known(synth)
+    det = Detector()
+    beats = []
+    for _ in range(secs * FS // PACKET):
+        vals, _ = ecg.take(PACKET)
+        beats.extend(det.feed(vals))
+    end = secs * FS - FS // 2  # The last ones may still be in the works
+    peaks = np.array([p for p in ecg.peaks if LEARN <= p < end])
+    return beats, peaks
+
+
+class DetectorCheck(TestCase):
+    """Every beat found, nothing else, and the rate right"""
+
+    def check(self, synth: Synth) -> None:
+        beats, peaks = run(synth)
+        found = np.array([b.sample for b in beats], dtype=np.float64)
+        lo, hi = peaks[0] - TOLERANCE, peaks[-1] + TOLERANCE
+        found = found[(found >= lo) & (found <= hi)]
+        dist = np.abs(found[:, None] - peaks[None, :])
+        self.assertLessEqual(dist.min(axis=0).max(), TOLERANCE, "missed")
+        self.assertLessEqual(dist.min(axis=1).max(), TOLERANCE, "false")
+        self.assertEqual(len(found), len(peaks))
+        true_hr = 60.0 * FS / np.diff(peaks[-9:]).mean()
+        self.assertAlmostEqual(beats[-1].hr, true_hr, delta=true_hr * 0.03)
+
+    def test_rates(self) -> None:
+        for hr in (45.0, 72.0, 120.0, 160.0):
+            with self.subTest(hr=hr):
+                self.check(Synth(hr=hr, seed=int(hr)))
+
+    def test_noise(self) -> None:
+        self.check(Synth(hr=80.0, noise=0.05, wander=0.3, seed=7))
+
+    def test_packet_size(self) -> None:
+        """Beats do not depend on how the signal is cut into packets"""
+        vals, _ = Ecg(Synth(seed=2)).take(60 * FS)
+        whole = Detector().feed(vals)
+        det = Detector()
+        cut = [
+            b
+            for i in range(0, len(vals), 7)
+            for b in det.feed(vals[i : i + 7])
+        ]
+        self.assertEqual([b.sample for b in cut], [b.sample for b in whole])
+
+    def test_asystole(self) -> None:
+        det = Detector()
+        vals, _ = Ecg(Synth(seed=4)).take(20 * FS)
+        det.feed(vals)
+        self.assertGreater(det.hr, 0.0)
+        det.feed(np.zeros(4 * FS))
+        self.assertEqual(det.hr, 0.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Gaps in the stream while branches of a running pipeline come and go"""
+
+from time import monotonic
+from typing import Any, Callable
+from unittest import main, skipIf, TestCase
+
+try:
+    import gi  # type: ignore [import-untyped]
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import GLib, Gst  # type: ignore [import-untyped]
+
+    Gst.init(None)
+    from pc80b_bleak.gst import add_branch, drop_branch
+    from pc80b_bleak.prb import GapMeter
+
+    HAVE_GST = True
+except (ImportError, ValueError):
+    HAVE_GST = False
+
+# pylint: disable=missing-function-docstring
+
+PIPELINE = (
+    "videotestsrc is-live=true"
+    " ! video/x-raw,width=320,height=240,framerate=30/1"
+    " ! tee name=tee ! queue ! fakesink name=out sync=true"
+)
+FRAME_NS = 1_000_000_000 // 30
+GAP_NS = 3 * FRAME_NS  # Longest interval allowed between output frames
+CYCLES = 10
+
+
+def run_for(secs: float, until: Callable[[], bool] = lambda: False) -> None:
+    context = GLib.MainContext.default()
+    end = monotonic() + secs
+    while not until() and monotonic() < end:
+        context.iteration(False)
+
+
+def detached(element: Any) -> Callable[[], bool]:
+    return lambda: bool(element.get_parent() is None)
+
+
+@skipIf(not HAVE_GST, "GStreamer is not available")
+class ReconfCheck(TestCase):
+    """Attaching and detaching a branch does not stall the others"""
+
+    def test_gaps(self) -> None:
+        pl = Gst.parse_launch(PIPELINE)
+        tee = pl.get_by_name("tee")
+        gaps = GapMeter(pl.get_by_name("out").get_static_pad("sink"))
+        pl.set_state(Gst.State.PLAYING)
+        try:
+            run_for(1.0)
+            for _ in range(CYCLES):
+                branch: Any = Gst.parse_bin_from_description(
+                    "queue ! fakesink sync=true", True
+                )
+                add_branch(pl, tee, branch)
+                run_for(0.2)
+                drop_branch(pl, tee, branch)
+                run_for(0.2, detached(branch))
+                self.assertIsNone(branch.get_parent(), "branch not removed")
+            run_for(0.5)
+        finally:
+            pl.set_state(Gst.State.NULL)
+        summary = gaps.summary()
+        self.assertGreater(summary["count"], CYCLES * 10)
+        self.assertLess(gaps.hist.max, GAP_NS, f"gap too long: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Automatic vertical range on signals of known amplitude"""
+
+from typing import List, Optional, Tuple
+from unittest import main, TestCase
+
+import numpy as np
+import numpy.typing as npt
+
+from pc80b_bleak.rng import HOLD, PER_OCTAVE, AutoRange, Sketch
+from pc80b_bleak.syn import FS
+
+# pylint: disable=missing-function-docstring
+
+PACKET = 25
+
+
+def wave(amp: float, secs: float, start: int = 0) -> npt.NDArray[np.float64]:
+    """Sine at 1.3 Hz, so that the peaks do not fall on the same samples"""
+    t = np.arange(start, start + int(secs * FS)) / FS
+    return amp * np.sin(2 * np.pi * 1.3 * t)
+
+
+def feed(
+    rng: AutoRange, vals: npt.NDArray[np.float64]
+) -> List[Tuple[int, float]]:
+    """Switches made, with the sample number at which each happened"""
+    done = []
+    for i in range(0, len(vals), PACKET):
+        new: Optional[float] = rng.feed(vals[i : i + PACKET])
+        if new is not None:
+            done.append((min(i + PACKET, len(vals)), new))
+    return done
+
+
+class SketchCheck(TestCase):
+    """Quantiles of the sketch are within the width of a bin"""
+
+    def test_quantile(self) -> None:
+        rng = np.random.default_rng(0)
+        sketch = Sketch()
+        vals = rng.normal(0.0, 0.4, 20 * FS)
+        for i in range(0, len(vals), PACKET):
+            sketch.add(vals[i : i + PACKET])
+        for q in (0.5, 0.9, 0.999):
+            want = np.quantile(np.abs(vals), q)
+            got = sketch.quantile(q)
+            with self.subTest(q=q):
+                self.assertGreaterEqual(got, want * 0.9)
+                self.assertLessEqual(got, want * 2 ** (2 / PER_OCTAVE))
+
+    def test_empty(self) -> None:
+        self.assertEqual(Sketch().quantile(0.999), 0.0)
+
+
+class AutoRangeCheck(TestCase):
+    """Smallest range that fits, after it has held for HOLD samples"""
+
+    def test_down_and_up(self) -> None:
+        rng = AutoRange()
+        # 0.3 mV peaks fit in 0.5 mV with the headroom, from the start
+        self.assertEqual(feed(rng, wave(0.3, 20)), [(HOLD, 0.5)])
+        self.assertEqual(rng.current, 0.5)
+        # 3 mV needs 5 mV, which is chosen once the sketch has seen
+        # enough of it, and then held
+        switches = feed(rng, wave(3.0, 20))
+        self.assertEqual([r for _, r in switches], [5.0])
+        self.assertGreaterEqual(switches[0][0], HOLD)
+
+    def test_fits(self) -> None:
+        for amp, want in ((0.3, 0.5), (0.7, 1.0), (1.5, 2.5), (3.5, 5.0)):
+            with self.subTest(amp=amp):
+                rng = AutoRange()
+                feed(rng, wave(amp, 30))
+                self.assertEqual(rng.current, want)
+
+    def test_spikes(self) -> None:
+        """Artifacts rarer than 1 - QUANTILE do not change the range"""
+        rng = AutoRange()
+        vals = wave(0.3, 120)
+        vals[FS * 10 :: FS * 20] = 4.0
+        self.assertEqual(feed(rng, vals), [(HOLD, 0.5)])
+
+    def test_hold_restarts(self) -> None:
+        """A choice that does not last for HOLD samples is forgotten"""
+        rng = AutoRange()
+        self.assertEqual(feed(rng, wave(0.3, HOLD / FS - 1)), [])
+        rng.sketch = Sketch()  # Forget, to change the choice at once
+        self.assertEqual(feed(rng, wave(1.5, 1)), [])
+        rng.sketch = Sketch()
+        self.assertEqual(feed(rng, wave(0.3, 20)), [(HOLD, 0.5)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Synthetic ECG: reproducible, whatever the blocks, and as specified"""
+
+from unittest import main, TestCase
+
+import numpy as np
+
+from pc80b_bleak.syn import FS, LEADOFF_SECS, Ecg, Synth, generate
+
+from .test_qrs import Known
+
+# pylint: disable=missing-function-docstring
+
+SECS = 120
+
+
+class SynthCheck(TestCase):
+    """Properties of the signal that the other tests rely on"""
+
+    def test_block_splits(self) -> None:
+        synth = Synth(ectopic=0.05, leadoff=1.0, seed=3)
+        whole, woff = Ecg(synth).take(SECS * FS)
+        rng = np.random.default_rng(0)
+        ecg = Ecg(synth)
+        cuts = np.sort(rng.choice(SECS * FS, 300, replace=False))
+        parts = [
+            ecg.take(n) for n in np.diff(cuts, prepend=0, append=SECS * FS)
+        ]
+        vals = np.concatenate([v for v, _ in parts])
+        np.testing.assert_allclose(vals, whole, atol=1e-12)
+        np.testing.assert_array_equal(
+            np.concatenate([o for _, o in parts]), woff
+        )
+
+    def test_seed(self) -> None:
+        one = generate(10, Synth(seed=1))
+        np.testing.assert_array_equal(one, generate(10, Synth(seed=1)))
+        self.assertFalse(np.allclose(one, generate(10, Synth(seed=2))))
+
+    def test_rate(self) -> None:
+        for hr in (45.0, 72.0, 150.0):
+            with self.subTest(hr=hr):
+                ecg = Known(Synth(hr=hr, sdnn=40.0, seed=int(hr)))
+                ecg.take(600 * FS)
+                rr = np.diff(ecg.peaks) / FS * 1000
+                self.assertAlmostEqual(60000 / rr.mean(), hr, delta=hr / 50)
+                self.assertAlmostEqual(rr.std(), 40.0, delta=6.0)
+
+    def test_ectopic(self) -> None:
+        ecg = Ecg(Synth(ectopic=0.1, seed=5))
+        for _ in range(20):
+            ecg.plan()
+        ectopic = ecg.kinds
+        self.assertAlmostEqual(ectopic.mean(), 0.09, delta=0.02)
+        self.assertFalse((ectopic[1:] & ectopic[:-1]).any(), "two in a row")
+
+    def test_leadoff(self) -> None:
+        vals, off = Ecg(Synth(leadoff=1.0, seed=6)).take(20 * 60 * FS)
+        self.assertTrue((vals[off] == 0.0).all())
+        self.assertTrue((vals[~off] != 0.0).all())
+        edges = np.diff(off.astype(np.int64), prepend=0, append=0)
+        starts, ends = np.flatnonzero(edges > 0), np.flatnonzero(edges < 0)
+        self.assertGreater(len(starts), 5)
+        self.assertTrue((ends - starts >= LEADOFF_SECS * FS).all())
+        _, none = Ecg(Synth(seed=6)).take(20 * 60 * FS)
+        self.assertFalse(none.any())
+
+
+if __name__ == "__main__":
+    main()